@@ -7,10 +7,14 @@ that takes user input and generates a response using OpenAI's language model.
 
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 
+from batch_runner import BatchStats, run_batch, print_batch_report
+from llm_cache import enable_llm_cache, print_cache_stats
+from llm_clients import get_chat_model, print_client_stats, using_fake_llm
+from streaming import stream_chain
+
 # Load environment variables
 load_dotenv()
 
@@ -19,10 +23,12 @@ def create_simple_chain():
     Create a simple LLM chain that generates creative writing based on a topic.
     """
     # Initialize the language model
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.7,  # Controls creativity (0.0 = deterministic, 1.0 = very creative)
-        max_tokens=150
+        max_tokens=150,
+        streaming=True,  # Emit tokens as they are generated (printed only when a handler is attached)
+        cache=enable_llm_cache()  # Serve repeated prompts from the local response cache
     )
     
     # Create a prompt template
@@ -53,17 +59,21 @@ def run_example():
         "a time-traveling backpack"
     ]
     
-    for i, topic in enumerate(topics, 1):
-        print(f"\n📝 Story {i}: {topic}")
+    # Run the chain for all topics concurrently; results are printed in order
+    stats = BatchStats()
+    for item in run_batch(chain, topics, input_key="topic", stats=stats):
+        print(f"\n📝 Story {item.index + 1}: {topics[item.index]}")
         print("-" * 30)
         
-        try:
-            # Run the chain
-            response = chain.invoke({"topic": topic})
-            print(response)
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        if item.ok:
+            print(item.output)
+        else:
+            print(f"❌ Error: {item.error}")
             print("💡 Make sure you have set up your OpenAI API key in the .env file")
+    
+    print_batch_report(stats)
+    print_cache_stats()
+    print_client_stats()
 
 def interactive_mode():
     """
@@ -88,17 +98,17 @@ def interactive_mode():
         
         try:
             print("🤔 Generating story...")
-            response = chain.invoke({"topic": topic})
-            print(f"📖 {response}")
+            stream_chain(chain, {"topic": topic}, output_key="text", prefix="📖 ")
         except Exception as e:
             print(f"❌ Error: {e}")
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and not using_fake_llm():
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline with the fake model)")
         exit(1)
     
     # Run the example
@@ -0,0 +1,124 @@
+"""
+Token Streaming for Chains
+
+Chains normally hand back their outputs only after every step has finished, so a
+chat UI shows nothing until the whole 300-token answer exists. Here the final LLM
+of a chain is created with `streaming=True` and a callback handler prints its
+tokens as they arrive, while the earlier structured steps (which are not
+streaming) still run to completion first.
+
+Only LLMs created with `streaming=True` emit tokens, so passing the handler to the
+whole chain streams just the answer step. Structured JSON steps that stream for
+early field parsing are tagged with STRUCTURED_OUTPUT_TAG and are not printed.
+An optional `on_output` hook receives each intermediate step's outputs as soon as
+that step finishes, so structured results can be shown before the answer starts. The handler also records:
+- Time to first token (TTFT) from the start of the request
+- TTFT from the start of the streaming LLM call (the model's own latency)
+- Tokens and tokens/second of the streamed answer
+"""
+
+import sys
+import time
+from typing import Dict, Any, Optional, Callable
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+# Tag for streaming LLMs whose tokens are JSON for a parser, not text for the user
+STRUCTURED_OUTPUT_TAG = "structured_output"
+
+class StreamingTokenPrinter(BaseCallbackHandler):
+    """Prints streamed tokens to stdout and measures time to first token"""
+
+    def __init__(self, prefix: str = "", stream=None, on_output: Optional[Callable[[str, Any], None]] = None):
+        self.prefix = prefix
+        self.stream = stream or sys.stdout
+        self.on_output = on_output
+        self.reset()
+
+    def reset(self):
+        """Start timing a new request"""
+        self.request_started_at = time.perf_counter()
+        self.llm_started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+        self.first_token_llm_started_at: Optional[float] = None
+        self.tokens = 0
+        self.reported_keys = set()
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, parent_run_id=None, **kwargs: Any) -> None:
+        # Report each step output once; the top-level chain (no parent) returns everything again
+        if self.on_output is None or parent_run_id is None or not isinstance(outputs, dict):
+            return
+        for key, value in outputs.items():
+            if key not in self.reported_keys:
+                self.reported_keys.add(key)
+                self.on_output(key, value)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, **kwargs: Any) -> None:
+        self.llm_started_at = time.perf_counter()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, **kwargs: Any) -> None:
+        self.llm_started_at = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, *, tags=None, **kwargs: Any) -> None:
+        if STRUCTURED_OUTPUT_TAG in (tags or []):
+            return
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+            self.first_token_llm_started_at = self.llm_started_at
+            self.stream.write(self.prefix)
+        self.last_token_at = now
+        self.tokens += 1
+        self.stream.write(token)
+        self.stream.flush()
+
+    @property
+    def streamed(self) -> bool:
+        return self.first_token_at is not None
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """TTFT from the request and from the streaming call, plus decode speed"""
+        if not self.streamed:
+            return {"ttft_ms": None, "llm_ttft_ms": None, "tokens": 0, "tokens_per_second": None}
+        started = self.first_token_llm_started_at or self.request_started_at
+        decode_seconds = self.last_token_at - self.first_token_at
+        return {
+            "ttft_ms": (self.first_token_at - self.request_started_at) * 1000,
+            "llm_ttft_ms": (self.first_token_at - started) * 1000,
+            "tokens": self.tokens,
+            "tokens_per_second": (self.tokens - 1) / decode_seconds if decode_seconds > 0 else None
+        }
+
+def stream_chain(chain, inputs: Dict[str, Any], output_key: str, prefix: str = "",
+                 on_output: Optional[Callable[[str, Any], None]] = None,
+                 printer: Optional[StreamingTokenPrinter] = None) -> Dict[str, Any]:
+    """Invoke a chain, streaming its `output_key` LLM to stdout as it is generated"""
+    def report_step(key: str, value: Any):
+        # The streamed output is already on screen
+        if key != output_key:
+            on_output(key, value)
+
+    printer = printer or StreamingTokenPrinter(prefix=prefix, on_output=report_step if on_output else None)
+    printer.reset()
+    result = chain.invoke(inputs, config={"callbacks": [printer]})
+
+    if printer.streamed:
+        printer.stream.write("\n")
+    else:
+        # Cached responses arrive whole, without token callbacks
+        printer.stream.write(f"{prefix}{result[output_key]}\n")
+    printer.stream.flush()
+    print_stream_stats(printer)
+    return result
+
+def print_stream_stats(printer: StreamingTokenPrinter):
+    """Print time to first token and streaming speed for the last request"""
+    stats = printer.stats()
+    if stats["ttft_ms"] is None:
+        print(f"⏱️  No tokens streamed (served from cache) in "
+              f"{(time.perf_counter() - printer.request_started_at) * 1000:.0f}ms")
+        return
+    speed = f", {stats['tokens_per_second']:.0f} tokens/s" if stats["tokens_per_second"] else ""
+    print(f"⏱️  First token after {stats['ttft_ms']:.0f}ms "
+          f"({stats['llm_ttft_ms']:.0f}ms after the answer call started), {stats['tokens']} tokens{speed}")
@@ -0,0 +1,135 @@
+"""
+Accuracy vs. Latency: Four-step vs. Fused Customer Service Pipeline
+
+Runs both `create_customer_service_chain` modes over a labeled local dataset and
+compares how often they agree with the labels against how long each message takes
+and how many LLM calls it needs:
+
+- four_step: understanding → classification → routing → response (4 LLM calls)
+- fused: one structured triage call → response (2 LLM calls)
+
+Each line of the dataset is a JSON object with `customer_message` and the expected
+`category`, `department`, `urgency_level` and `customer_emotion`.
+
+Usage: python compare_modes.py [labeled_inquiries.jsonl] [max_concurrency]
+"""
+
+import os
+import sys
+import json
+import threading
+from typing import Dict, List, Any
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+from batch_runner import BatchStats, run_batch
+from customer_service_fixed import create_customer_service_chain
+from llm_clients import using_fake_llm
+from streaming_json import JSONOutputError, parse_json_output
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "labeled_inquiries.jsonl")
+
+# Labeled field -> (pipeline output holding it, key inside that JSON object)
+SCORED_FIELDS = {
+    "category": ("classification", "category"),
+    "department": ("routing", "department"),
+    "urgency_level": ("understanding", "urgency_level"),
+    "customer_emotion": ("understanding", "customer_emotion")
+}
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts LLM calls made through the chains it is attached to"""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized, prompts, **kwargs: Any) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs: Any) -> None:
+        with self._lock:
+            self.calls += 1
+
+def load_labeled_dataset(path: str) -> List[Dict[str, str]]:
+    """Read the labeled JSONL dataset"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def score_result(output: Dict[str, Any], labels: Dict[str, str]) -> Dict[str, bool]:
+    """Compare one pipeline result with its labels, field by field; unparseable output scores as wrong"""
+    scores = {}
+    for field, (output_key, json_key) in SCORED_FIELDS.items():
+        try:
+            parsed = parse_json_output(output.get(output_key, ""))
+        except JSONOutputError:
+            parsed = {}
+        predicted = parsed.get(json_key, "") if isinstance(parsed, dict) else ""
+        scores[field] = str(predicted).strip().lower() == labels[field].lower()
+    return scores
+
+def evaluate_mode(mode: str, dataset: List[Dict[str, str]], max_concurrency: int = 4) -> Dict[str, Any]:
+    """Run one pipeline mode over the dataset and collect accuracy, latency and call counts"""
+    # Semantic caching and the rule-based fast path would hide the per-message cost being measured
+    chain = create_customer_service_chain(semantic_cache=False, mode=mode, fast_path=False)
+    chain.verbose = False
+    counter = LLMCallCounter()
+    stats = BatchStats()
+    correct = {field: 0 for field in SCORED_FIELDS}
+
+    messages = [{"customer_message": row["customer_message"]} for row in dataset]
+    for item in run_batch(chain, messages, max_concurrency=max_concurrency, stats=stats,
+                          config={"callbacks": [counter]}):
+        if not item.ok:
+            print(f"❌ {mode} #{item.index}: {item.error}")
+            continue
+        for field, ok in score_result(item.output, dataset[item.index]).items():
+            correct[field] += ok
+
+    total = len(dataset)
+    return {
+        "mode": mode,
+        "accuracy": {field: count / total for field, count in correct.items()},
+        "overall_accuracy": sum(correct.values()) / (total * len(SCORED_FIELDS)),
+        "latency_p50_ms": stats.percentile_ms(0.5),
+        "latency_p95_ms": stats.percentile_ms(0.95),
+        "llm_calls_per_message": counter.calls / total,
+        "failed": stats.failed
+    }
+
+def print_comparison(reports: List[Dict[str, Any]]):
+    """Print accuracy and latency side by side"""
+    print("\n⚖️  Accuracy vs. Latency")
+    print("=" * 70)
+    header = f"{'':<28}" + "".join(f"{report['mode']:>16}" for report in reports)
+    print(header)
+    print("-" * len(header))
+    for field in SCORED_FIELDS:
+        print(f"{field + ' accuracy':<28}" + "".join(f"{report['accuracy'][field]:>16.0%}" for report in reports))
+    rows = [
+        ("overall accuracy", "overall_accuracy", "{:>16.0%}"),
+        ("latency p50 (ms)", "latency_p50_ms", "{:>16.0f}"),
+        ("latency p95 (ms)", "latency_p95_ms", "{:>16.0f}"),
+        ("LLM calls/message", "llm_calls_per_message", "{:>16.1f}"),
+        ("failed", "failed", "{:>16d}")
+    ]
+    for label, key, fmt in rows:
+        print(f"{label:<28}" + "".join(fmt.format(report[key]) for report in reports))
+
+if __name__ == "__main__":
+    # Measure real model calls, not the local response cache
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+    if not os.getenv("OPENAI_API_KEY") and not using_fake_llm():
+        print("❌ Error: OPENAI_API_KEY not found in environment variables")
+        print("   (or set LLM_BACKEND=fake to run offline with the fake model)")
+        exit(1)
+
+    dataset_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATASET
+    max_concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    dataset = load_labeled_dataset(dataset_path)
+    print(f"📊 Comparing pipeline modes on {len(dataset)} labeled messages from {dataset_path}")
+
+    reports = [evaluate_mode(mode, dataset, max_concurrency) for mode in ("four_step", "fused")]
+    print_comparison(reports)
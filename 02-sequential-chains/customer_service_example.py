@@ -7,7 +7,6 @@ We'll process customer inquiries through a 4-step workflow.
 
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain, SequentialChain
 from langchain.output_parsers import PydanticOutputParser
@@ -15,6 +14,10 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 from enum import Enum
 
+from llm_cache import enable_llm_cache, print_cache_stats
+from llm_clients import get_chat_model, print_client_stats, using_fake_llm
+from streaming import stream_chain
+
 # Load environment variables
 load_dotenv()
 
@@ -55,10 +58,11 @@ class RoutingDecision(BaseModel):
 
 def create_understanding_chain():
     """Create a chain to understand the customer inquiry"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.2,  # Low temperature for consistent understanding
-        max_tokens=200
+        max_tokens=200,
+        cache=enable_llm_cache()
     )
     
     parser = PydanticOutputParser(pydantic_object=CustomerInquiry)
@@ -83,10 +87,11 @@ Please understand:
 
 def create_classification_chain():
     """Create a chain to classify the inquiry"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.3,
-        max_tokens=150
+        max_tokens=150,
+        cache=enable_llm_cache()
     )
     
     parser = PydanticOutputParser(pydantic_object=Classification)
@@ -111,10 +116,11 @@ Please classify:
 
 def create_routing_chain():
     """Create a chain to determine routing"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.2,
-        max_tokens=150
+        max_tokens=150,
+        cache=enable_llm_cache()
     )
     
     parser = PydanticOutputParser(pydantic_object=RoutingDecision)
@@ -140,10 +146,12 @@ Please determine:
 
 def create_response_chain():
     """Create a chain to generate appropriate response"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.7,  # Higher temperature for more natural responses
-        max_tokens=300
+        max_tokens=300,
+        streaming=True,  # Stream the answer token by token when a handler is attached
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -227,6 +235,19 @@ def run_customer_service_example():
             
         except Exception as e:
             print(f"❌ Error: {e}")
+    
+    print_cache_stats()
+    print_client_stats()
+
+def print_step_output(key: str, value: str):
+    """Print one structured step as soon as it finishes"""
+    headers = {
+        "understanding": "\n🔍 UNDERSTANDING:\nMain Issue: ",
+        "classification": "\n🏷️  CLASSIFICATION:\nCategory: ",
+        "routing": "\n🔄 ROUTING:\nDepartment: "
+    }
+    if key in headers:
+        print(f"{headers[key]}{value}")
 
 def interactive_customer_service():
     """Run the customer service chain in interactive mode"""
@@ -249,19 +270,9 @@ def interactive_customer_service():
         
         try:
             print("🤔 Processing customer inquiry...")
-            result = chain.invoke({"customer_message": message})
-            
-            print(f"\n🔍 UNDERSTANDING:")
-            print(f"Main Issue: {result['understanding']}")
-            
-            print(f"\n🏷️  CLASSIFICATION:")
-            print(f"Category: {result['classification']}")
-            
-            print(f"\n🔄 ROUTING:")
-            print(f"Department: {result['routing']}")
-            
-            print(f"\n💬 RESPONSE:")
-            print(result['response'])
+            # Structured steps are shown as each finishes; the response streams after them
+            stream_chain(chain, {"customer_message": message}, output_key="response",
+                         prefix="\n💬 RESPONSE:\n", on_output=print_step_output)
             
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -306,10 +317,11 @@ def demonstrate_manual_workflow():
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and not using_fake_llm():
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline with the fake model)")
         exit(1)
     
     # Run the main example
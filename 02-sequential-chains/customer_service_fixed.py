@@ -5,16 +5,29 @@ This version fixes the Pydantic parsing issues and improves emotion detection.
 """
 
 import os
+import sys
 import json
+import time
+import threading
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain, SequentialChain
+from langchain.chains import LLMChain, TransformChain
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List
 from enum import Enum
 
+from batch_runner import (DEFAULT_MAX_CONCURRENCY, BatchStats, run_batch, iter_jsonl, write_results_jsonl,
+                          print_batch_report)
+from dag_chain import ConcurrentSequentialChain
+from llm_cache import enable_llm_cache, print_cache_stats
+from llm_clients import get_chat_model, print_client_stats, using_fake_llm
+from semantic_cache import with_semantic_cache, print_semantic_cache_stats
+from streaming import STRUCTURED_OUTPUT_TAG
+from streaming_json import (JSONOutputError, EarlyDispatchChain, parse_json_output, parse_json_or_warn,
+                            print_early_dispatch_stats)
+from tiered_router import TieredRouterChain, with_fast_path, print_fast_path_stats
+
 # Load environment variables
 load_dotenv()
 
@@ -55,10 +68,11 @@ class RoutingDecision(BaseModel):
 
 def create_understanding_chain():
     """Create a chain to understand the customer inquiry with improved parsing"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.3,  # Slightly higher for better parsing
-        max_tokens=200
+        max_tokens=200,
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -95,10 +109,11 @@ JSON Response:"""
 
 def create_classification_chain():
     """Create a chain to classify the inquiry"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.3,
-        max_tokens=150
+        max_tokens=150,
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -129,10 +144,13 @@ JSON Response:"""
 
 def create_routing_chain():
     """Create a chain to determine routing"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.2,
-        max_tokens=150
+        max_tokens=150,
+        streaming=True,  # Stream the JSON so the handoff starts as soon as the department is known
+        tags=[STRUCTURED_OUTPUT_TAG],
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -164,10 +182,12 @@ JSON Response:"""
 
 def create_response_chain():
     """Create a chain to generate appropriate response"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.7,  # Higher temperature for more natural responses
-        max_tokens=300
+        max_tokens=300,
+        streaming=True,  # Stream the answer token by token when a handler is attached
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -191,39 +211,198 @@ Response:"""
     
     return LLMChain(llm=llm, prompt=prompt, output_key="response")
 
-def create_customer_service_chain():
-    """Create the complete customer service workflow"""
+def create_triage_chain():
+    """Create one chain that understands, classifies and routes the inquiry in a single call"""
+    llm = get_chat_model(
+        model="gpt-3.5-turbo",
+        temperature=0.2,
+        max_tokens=450,
+        streaming=True,  # Stream the JSON so the handoff starts as soon as the department is known
+        tags=[STRUCTURED_OUTPUT_TAG],
+        cache=enable_llm_cache()
+    )
+    
+    prompt = PromptTemplate(
+        input_variables=["customer_message"],
+        template="""Analyze, classify and route the following customer inquiry.
+
+Customer Message: {customer_message}
+
+Emotion Detection Guidelines:
+- Frustrated: "nothing works", "ridiculous", "trying for hours", multiple exclamations
+- Happy: "thanks", "appreciate", "great service", positive feedback
+- Confused: "I don't understand", "why is this", questioning language
+- Angry: "this is ridiculous", "useless", strong negative language
+- Stressed: "deadline", "urgent", "meeting soon", time pressure
+
+Urgency Indicators:
+- Low: general inquiries, no time pressure
+- Medium: some concern, seeking information
+- High: immediate need, significant problem
+- Critical: deadline, urgent meeting, system down
+
+Categories:
+- Technical: password, login, app crashes, system issues
+- Billing: charges, payments, invoices, pricing
+- Sales: upgrades, features, plans, pricing
+- General: general questions, feedback, complaints
+
+Departments:
+- technical: system issues, login problems, app crashes
+- billing: payment issues, charges, invoices
+- sales: upgrades, features, plans
+- general: general inquiries, feedback
+- escalation: urgent issues, complex problems
+
+Return a JSON object with this exact format:
+{{
+  "routing": {{
+    "department": "technical/billing/sales/general/escalation",
+    "priority": "low/medium/high/urgent",
+    "agent_requirements": ["skill1", "skill2"],
+    "sla_target": "time target"
+  }},
+  "understanding": {{
+    "main_issue": "brief description of the main problem",
+    "customer_emotion": "frustrated/happy/confused/angry/stressed",
+    "urgency_level": "low/medium/high/critical",
+    "context": ["key detail 1", "key detail 2"]
+  }},
+  "classification": {{
+    "category": "technical/billing/sales/general",
+    "subcategory": "specific subcategory",
+    "complexity": "simple/moderate/complex",
+    "estimated_resolution_time": "time estimate",
+    "requires_escalation": true/false
+  }}
+}}
+
+JSON Response:"""
+    )
+    
+    return LLMChain(llm=llm, prompt=prompt, output_key="triage")
+
+HANDOFF_LATENCY_SECONDS = float(os.getenv("HANDOFF_LATENCY_MS", "300")) / 1000
+_handoff_queues: Dict[str, int] = {}
+_handoff_lock = threading.Lock()
+
+def hand_off_to_department(department: str) -> str:
+    """Queue the ticket with a department (stand-in for a call to the ticketing system)"""
+    time.sleep(HANDOFF_LATENCY_SECONDS)
+    with _handoff_lock:
+        position = _handoff_queues[department] = _handoff_queues.get(department, 0) + 1
+    return f"queued with {department} (position {position})"
+
+def split_triage_output(inputs: dict) -> dict:
+    """Split the fused triage JSON into the outputs the four-step pipeline produces"""
+    try:
+        triage = parse_json_output(inputs["triage"])
+    except JSONOutputError:
+        # Pass the raw text on; parsing it again downstream reports the error
+        triage = None
+    outputs = {}
+    for key in ["understanding", "classification", "routing"]:
+        if isinstance(triage, dict) and isinstance(triage.get(key), dict):
+            outputs[key] = json.dumps(triage[key])
+        else:
+            # Keep the raw text, as the separate steps would on unparseable output
+            outputs[key] = inputs["triage"]
+    return outputs
+
+def create_customer_service_chain(semantic_cache: bool = True, mode: str = "four_step", fast_path: bool = True):
+    """Create the complete customer service workflow
+    
+    mode="four_step" makes one LLM call per step; mode="fused" gets the understanding,
+    classification and routing from a single structured call, then streams the response.
+    With fast_path, confident templated messages (e.g. "where is my order") skip the LLMs.
+    """
+    if mode == "fused":
+        chain = create_fused_customer_service_chain(semantic_cache)
+    elif mode == "four_step":
+        chain = create_four_step_customer_service_chain(semantic_cache)
+    else:
+        raise ValueError(f"Unknown customer service mode: {mode} (expected 'four_step' or 'fused')")
+    
+    return with_fast_path(chain) if fast_path else chain
+
+def create_four_step_customer_service_chain(semantic_cache: bool = True):
+    """Create the understand → classify → route → respond workflow"""
     
     # Create individual chains
     understanding_chain = create_understanding_chain()
     classification_chain = create_classification_chain()
-    routing_chain = create_routing_chain()
+    
+    # Reuse understanding/classification for paraphrased messages
+    if semantic_cache:
+        understanding_chain = with_semantic_cache(understanding_chain, "understanding", "customer_message")
+        classification_chain = with_semantic_cache(classification_chain, "classification", "understanding")
+    # The ticket is handed to its department while the rest of the routing JSON streams
+    routing_chain = EarlyDispatchChain(chain=create_routing_chain(), dispatch={"department": hand_off_to_department},
+                                       output_key="handoff")
     response_chain = create_response_chain()
     
-    # Create the sequential chain
-    customer_service_chain = SequentialChain(
+    # Each step reads the previous one's output, so the scheduler runs them one after another
+    # today; any step added later that only needs the message will overlap with them
+    customer_service_chain = ConcurrentSequentialChain(
         chains=[understanding_chain, classification_chain, routing_chain, response_chain],
         input_variables=["customer_message"],
-        output_variables=["understanding", "classification", "routing", "response"],
+        output_variables=["understanding", "classification", "routing", "handoff", "response"],
         verbose=True
     )
     
     return customer_service_chain
 
-def parse_json_output(output_str):
-    """Parse JSON output from LLM"""
-    try:
-        # Try to extract JSON from the output
-        if isinstance(output_str, str):
-            # Find JSON-like content
-            start = output_str.find('{')
-            end = output_str.rfind('}') + 1
-            if start != -1 and end != 0:
-                json_str = output_str[start:end]
-                return json.loads(json_str)
-        return output_str
-    except:
-        return output_str
+def create_fused_customer_service_chain(semantic_cache: bool = True):
+    """Create the two-call workflow: fused triage, then the response"""
+    triage_chain = create_triage_chain()
+    if semantic_cache:
+        triage_chain = with_semantic_cache(triage_chain, "triage", "customer_message")
+    # Routing comes first in the triage JSON, so the handoff starts while the rest is generated
+    triage_chain = EarlyDispatchChain(chain=triage_chain, dispatch={"routing.department": hand_off_to_department},
+                                      output_key="handoff")
+    split_chain = TransformChain(
+        input_variables=["triage"],
+        output_variables=["understanding", "classification", "routing"],
+        transform=split_triage_output
+    )
+    response_chain = create_response_chain()
+    
+    return ConcurrentSequentialChain(
+        chains=[triage_chain, split_chain, response_chain],
+        input_variables=["customer_message"],
+        output_variables=["understanding", "classification", "routing", "handoff", "response"],
+        verbose=True
+    )
+
+def print_customer_service_result(result):
+    """Display one customer service chain result in a structured way"""
+    # Parse JSON outputs
+    understanding = parse_json_or_warn(result["understanding"], "understanding")
+    classification = parse_json_or_warn(result["classification"], "classification")
+    routing = parse_json_or_warn(result["routing"], "routing")
+    
+    print(f"\n🔍 UNDERSTANDING:")
+    print(f"Main Issue: {understanding.get('main_issue', 'N/A')}")
+    print(f"Emotion: {understanding.get('customer_emotion', 'N/A')}")
+    print(f"Urgency: {understanding.get('urgency_level', 'N/A')}")
+    print(f"Context: {understanding.get('context', [])}")
+    
+    print(f"\n🏷️  CLASSIFICATION:")
+    print(f"Category: {classification.get('category', 'N/A')}")
+    print(f"Subcategory: {classification.get('subcategory', 'N/A')}")
+    print(f"Complexity: {classification.get('complexity', 'N/A')}")
+    print(f"Resolution Time: {classification.get('estimated_resolution_time', 'N/A')}")
+    print(f"Escalation: {classification.get('requires_escalation', 'N/A')}")
+    
+    print(f"\n🔄 ROUTING:")
+    print(f"Department: {routing.get('department', 'N/A')}")
+    print(f"Priority: {routing.get('priority', 'N/A')}")
+    print(f"Agent Requirements: {routing.get('agent_requirements', [])}")
+    print(f"SLA Target: {routing.get('sla_target', 'N/A')}")
+    print(f"Handoff: {', '.join(result.get('handoff', {}).values()) or 'none (answered directly)'}")
+    
+    print(f"\n💬 RESPONSE:")
+    print(result["response"])
 
 def run_customer_service_example():
     """Run the customer service example with improved parsing"""
@@ -235,6 +414,7 @@ def run_customer_service_example():
     
     # Test customer messages
     customer_messages = [
+        "Hi, where is my order ORD-1042? It was shipped last week.",
         "I've been trying to reset my password for 2 hours and nothing works! This is ridiculous!",
         "Hi, I'm interested in upgrading my plan. Can you tell me about the premium features?",
         "My bill this month is $200 more than usual. I don't understand why it's so high.",
@@ -242,45 +422,43 @@ def run_customer_service_example():
         "Thanks for the great service! I wanted to let you know how much I appreciate your help."
     ]
     
-    for i, message in enumerate(customer_messages, 1):
-        print(f"\n📧 Customer Message {i}:")
-        print(f"'{message}'")
+    # All messages are processed concurrently; results still arrive in order
+    stats = BatchStats()
+    for item in run_batch(chain, customer_messages, stats=stats):
+        print(f"\n📧 Customer Message {item.index + 1}:")
+        print(f"'{customer_messages[item.index]}'")
         print("=" * 60)
         
-        try:
-            # Run the chain
-            result = chain.invoke({"customer_message": message})
-            
-            # Parse JSON outputs
-            understanding = parse_json_output(result["understanding"])
-            classification = parse_json_output(result["classification"])
-            routing = parse_json_output(result["routing"])
-            
-            # Display results in a structured way
-            print(f"\n🔍 UNDERSTANDING:")
-            print(f"Main Issue: {understanding.get('main_issue', 'N/A')}")
-            print(f"Emotion: {understanding.get('customer_emotion', 'N/A')}")
-            print(f"Urgency: {understanding.get('urgency_level', 'N/A')}")
-            print(f"Context: {understanding.get('context', [])}")
-            
-            print(f"\n🏷️  CLASSIFICATION:")
-            print(f"Category: {classification.get('category', 'N/A')}")
-            print(f"Subcategory: {classification.get('subcategory', 'N/A')}")
-            print(f"Complexity: {classification.get('complexity', 'N/A')}")
-            print(f"Resolution Time: {classification.get('estimated_resolution_time', 'N/A')}")
-            print(f"Escalation: {classification.get('requires_escalation', 'N/A')}")
-            
-            print(f"\n🔄 ROUTING:")
-            print(f"Department: {routing.get('department', 'N/A')}")
-            print(f"Priority: {routing.get('priority', 'N/A')}")
-            print(f"Agent Requirements: {routing.get('agent_requirements', [])}")
-            print(f"SLA Target: {routing.get('sla_target', 'N/A')}")
-            
-            print(f"\n💬 RESPONSE:")
-            print(result["response"])
-            
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        if item.ok:
+            print_customer_service_result(item.output)
+        else:
+            print(f"❌ Error: {item.error}")
+    
+    print_batch_report(stats)
+    if isinstance(chain, TieredRouterChain):
+        print_fast_path_stats(chain)
+    print_cache_stats()
+    print_client_stats()
+    print_semantic_cache_stats()
+    print_early_dispatch_stats()
+
+def run_customer_service_batch(input_path: str, output_path: str, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                               ordered: bool = True):
+    """Reprocess a JSONL file of tickets ({"customer_message": ...} per line) into a results JSONL file"""
+    print(f"📦 Processing {input_path} -> {output_path} (max_concurrency={max_concurrency})")
+    chain = create_customer_service_chain()
+    stats = BatchStats()
+    
+    results = run_batch(chain, iter_jsonl(input_path), max_concurrency=max_concurrency, ordered=ordered, stats=stats)
+    write_results_jsonl(results, output_path)
+    
+    print_batch_report(stats)
+    if isinstance(chain, TieredRouterChain):
+        print_fast_path_stats(chain)
+    print_cache_stats()
+    print_client_stats()
+    print_semantic_cache_stats()
+    print_early_dispatch_stats()
 
 def emotion_analysis_demo():
     """Demonstrate emotion detection with examples"""
@@ -318,12 +496,18 @@ def emotion_analysis_demo():
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and not using_fake_llm():
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline with the fake model)")
         exit(1)
     
+    # Nightly reprocessing: python customer_service_fixed.py batch tickets.jsonl results.jsonl
+    if len(sys.argv) >= 4 and sys.argv[1] == "batch":
+        run_customer_service_batch(sys.argv[2], sys.argv[3])
+        exit(0)
+    
     # Run emotion analysis demo
     emotion_analysis_demo()
     
@@ -0,0 +1,157 @@
+"""
+DAG Scheduler for Sequential Chains
+
+SequentialChain runs its sub-chains strictly in list order, even when a step does not
+depend on the one before it. ConcurrentSequentialChain derives the dependency graph
+from each sub-chain's `input_keys`/`output_keys` and runs every step whose inputs are
+ready at the same time:
+
+    story ─┬─► analysis ─► themes ─► title
+           └─► summary
+
+It accepts the same arguments and returns the same outputs dict as SequentialChain.
+With return_step_timings=True the outputs also carry each step's duration under
+"step_timings" (per call, so a chain shared by concurrent callers reports each run's own).
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Any, Set
+
+from langchain.chains.base import Chain
+from langchain.pydantic_v1 import root_validator
+
+class ConcurrentSequentialChain(Chain):
+    """Drop-in replacement for SequentialChain that runs independent steps concurrently"""
+
+    chains: List[Chain]
+    input_variables: List[str]
+    output_variables: List[str]
+    max_workers: int = 4
+    return_step_timings: bool = False
+
+    @property
+    def input_keys(self) -> List[str]:
+        return self.input_variables
+
+    @property
+    def output_keys(self) -> List[str]:
+        return self.output_variables + (["step_timings"] if self.return_step_timings else [])
+
+    @root_validator(pre=True)
+    def validate_dependencies(cls, values: Dict) -> Dict:
+        """Same checks as SequentialChain: every input is produced before it is needed"""
+        known: Set[str] = set(values["input_variables"])
+        for chain in values["chains"]:
+            missing = set(chain.input_keys) - known
+            if missing:
+                raise ValueError(f"Missing required input keys: {missing}, only had {known}")
+            overlapping = known & set(chain.output_keys)
+            if overlapping:
+                raise ValueError(f"Chain returned keys that already exist: {overlapping}")
+            known |= set(chain.output_keys)
+        missing_outputs = set(values["output_variables"]) - known
+        if missing_outputs:
+            raise ValueError(f"Expected output variables that were not found: {missing_outputs}")
+        return values
+
+    def dependencies(self) -> Dict[int, Set[int]]:
+        """Map each step index to the indices of the steps it waits for"""
+        producers = {key: i for i, chain in enumerate(self.chains) for key in chain.output_keys}
+        return {
+            i: {producers[key] for key in chain.input_keys if key in producers}
+            for i, chain in enumerate(self.chains)
+        }
+
+    def stages(self) -> List[List[str]]:
+        """Group steps into stages that can run concurrently (for display)"""
+        deps = self.dependencies()
+        level: Dict[int, int] = {}
+        for i in range(len(self.chains)):
+            # The validator guarantees producers appear earlier in the list
+            level[i] = 1 + max((level[d] for d in deps[i]), default=-1)
+        stages: List[List[str]] = [[] for _ in range(max(level.values(), default=-1) + 1)]
+        for i, chain in enumerate(self.chains):
+            stages[level[i]].append(",".join(chain.output_keys))
+        return stages
+
+    def _call(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        known_values = dict(inputs)
+        deps = self.dependencies()
+        pending = set(range(len(self.chains)))
+        completed: Set[int] = set()
+        running = {}
+        callbacks = run_manager.get_child() if run_manager else None
+        step_timings: Dict[str, float] = {}
+
+        def run_step(i: int, step_inputs: Dict[str, Any]):
+            chain = self.chains[i]
+            start = time.perf_counter()
+            result = chain.invoke(step_inputs, config={"callbacks": callbacks})
+            outputs = {key: result[key] for key in chain.output_keys}
+            return outputs, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Start every step whose producers have all finished
+                for i in sorted(pending):
+                    if deps[i] <= completed:
+                        pending.discard(i)
+                        step_inputs = {key: known_values[key] for key in self.chains[i].input_keys}
+                        running[executor.submit(run_step, i, step_inputs)] = i
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    outputs, elapsed = future.result()
+                    known_values.update(outputs)
+                    completed.add(i)
+                    step_timings[",".join(self.chains[i].output_keys)] = elapsed
+                    if run_manager:
+                        run_manager.on_text(f"Finished {', '.join(outputs)} in {elapsed:.2f}s\n",
+                                            verbose=self.verbose)
+
+        outputs = {key: known_values[key] for key in self.output_variables}
+        if self.return_step_timings:
+            outputs["step_timings"] = step_timings
+        return outputs
+
+def demonstrate_concurrent_schedule(step_latency: float = 0.5):
+    """Compare SequentialChain with the DAG scheduler on the story pipeline, offline"""
+    from langchain.chains import SequentialChain, TransformChain
+
+    def slow_step(inputs_keys: List[str], output_key: str) -> TransformChain:
+        def transform(inputs: Dict[str, Any]) -> Dict[str, Any]:
+            time.sleep(step_latency)  # Stand-in for one LLM round trip
+            return {output_key: f"{output_key}({', '.join(inputs[key] for key in inputs_keys)})"}
+        return TransformChain(input_variables=inputs_keys, output_variables=[output_key], transform=transform)
+
+    def build_steps() -> List[Chain]:
+        return [
+            slow_step(["topic"], "story"),
+            slow_step(["story"], "analysis"),
+            slow_step(["analysis"], "themes"),
+            slow_step(["story"], "summary"),
+            slow_step(["story", "themes"], "title")
+        ]
+
+    print("\n🕸️  DAG Scheduler Demo")
+    print("=" * 40)
+
+    results = {}
+    for name, chain_class in [("SequentialChain", SequentialChain), ("ConcurrentSequentialChain", ConcurrentSequentialChain)]:
+        options = {"return_step_timings": True} if chain_class is ConcurrentSequentialChain else {}
+        chain = chain_class(chains=build_steps(), input_variables=["topic"],
+                            output_variables=["story", "analysis", "summary", "title"], **options)
+        start = time.perf_counter()
+        results[name] = chain.invoke({"topic": "a time-traveling chef"})
+        print(f"⏱️  {name}: {time.perf_counter() - start:.2f}s")
+        if isinstance(chain, ConcurrentSequentialChain):
+            print(f"📋 Stages: {' -> '.join('[' + ', '.join(stage) + ']' for stage in chain.stages())}")
+            timings = results[name].pop("step_timings")
+            print(f"   Step times: {', '.join(f'{step} {elapsed:.2f}s' for step, elapsed in timings.items())}")
+
+    print(f"✅ Identical outputs: {results['SequentialChain'] == results['ConcurrentSequentialChain']}")
+
+if __name__ == "__main__":
+    demonstrate_concurrent_schedule()
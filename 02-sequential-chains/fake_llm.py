@@ -0,0 +1,480 @@
+"""
+Offline Fake Chat Model with Latency and Token-Rate Profiles
+
+None of the examples can run without OPENAI_API_KEY, so nothing can be load-tested
+in CI or on an air-gapped perf box. `FakeChatModel` is a drop-in chat model that
+never touches the network:
+
+- Responses: scripted (a list replayed in order), a custom responder function, or
+  templated from the prompt - valid JSON for the "Return a JSON object with this
+  exact format" prompts of Examples 2 and 3 and for PydanticOutputParser schemas,
+  ReAct-style replies for the agents, and plain text for everything else
+- Latency: time to first token drawn from a fixed, uniform or lognormal distribution
+- Streaming: tokens are emitted at the profile's tokens/second (streaming=True)
+- Faults: random API errors at `error_rate` and a process-wide requests/minute limit
+  that raises rate-limit errors; both are retried `max_retries` times like the SDK
+
+Set LLM_BACKEND=fake and every `get_chat_model()` call (and so every `create_*`
+function) returns a FakeChatModel. FAKE_LLM_PROFILE picks a profile from PROFILES;
+FAKE_LLM_FIRST_TOKEN_MS, FAKE_LLM_TOKENS_PER_SECOND, FAKE_LLM_ERROR_RATE,
+FAKE_LLM_RATE_LIMIT_RPM and FAKE_LLM_SEED override single values.
+
+Run `python fake_llm.py` to see templated outputs and each profile's timings.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import threading
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Callable, Iterator
+
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+@dataclass
+class LatencyProfile:
+    """Timing and fault behaviour of the fake model"""
+    first_token_ms: float = 0.0
+    distribution: str = "lognormal"  # fixed, uniform or lognormal
+    spread: float = 0.3  # lognormal sigma, or +/- fraction for uniform
+    tokens_per_second: float = 0.0  # 0 = the whole reply at once
+    error_rate: float = 0.0
+    requests_per_minute: float = 0.0  # 0 = no rate limit
+
+    def sample_first_token_seconds(self, rng: random.Random) -> float:
+        """Draw one time to first token"""
+        if self.first_token_ms <= 0:
+            return 0.0
+        if self.distribution == "fixed":
+            return self.first_token_ms / 1000
+        if self.distribution == "uniform":
+            return rng.uniform(1 - self.spread, 1 + self.spread) * self.first_token_ms / 1000
+        # first_token_ms is the median of the lognormal distribution
+        return rng.lognormvariate(0.0, self.spread) * self.first_token_ms / 1000
+
+PROFILES = {
+    "instant": LatencyProfile(),
+    "gpt-3.5-turbo": LatencyProfile(first_token_ms=350, spread=0.35, tokens_per_second=70),
+    "gpt-4": LatencyProfile(first_token_ms=800, spread=0.4, tokens_per_second=25),
+    "degraded": LatencyProfile(first_token_ms=1500, spread=0.8, tokens_per_second=15, error_rate=0.05,
+                               requests_per_minute=60)
+}
+
+def profile_from_env() -> LatencyProfile:
+    """Profile named by FAKE_LLM_PROFILE with single values overridden from the environment"""
+    name = os.getenv("FAKE_LLM_PROFILE", "instant")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown FAKE_LLM_PROFILE: {name} (expected one of {', '.join(PROFILES)})")
+    overrides = {}
+    for field_name, env_name in [("first_token_ms", "FAKE_LLM_FIRST_TOKEN_MS"),
+                                 ("tokens_per_second", "FAKE_LLM_TOKENS_PER_SECOND"),
+                                 ("error_rate", "FAKE_LLM_ERROR_RATE"),
+                                 ("requests_per_minute", "FAKE_LLM_RATE_LIMIT_RPM")]:
+        if os.getenv(env_name):
+            overrides[field_name] = float(os.getenv(env_name))
+    return replace(PROFILES[name], **overrides)
+
+class FakeLLMError(RuntimeError):
+    """Simulated API error"""
+
+class FakeRateLimitError(FakeLLMError):
+    """Simulated 429 response"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"simulated rate limit exceeded, retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Token bucket refilled at `requests_per_minute`, shared like an account-wide limit"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests_per_minute = 0.0
+        self._tokens = 0.0
+        self._updated = 0.0
+
+    def acquire(self, requests_per_minute: float):
+        """Take one request slot or raise FakeRateLimitError"""
+        if requests_per_minute <= 0:
+            return
+        rate = requests_per_minute / 60
+        burst = max(1.0, requests_per_minute / 10)
+        with self._lock:
+            now = time.monotonic()
+            if requests_per_minute != self.requests_per_minute:
+                self.requests_per_minute, self._tokens = requests_per_minute, burst
+            else:
+                self._tokens = min(burst, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            if self._tokens < 1:
+                raise FakeRateLimitError(retry_after=(1 - self._tokens) / rate)
+            self._tokens -= 1
+
+class FakeLLMStats:
+    """Calls, faults and tokens across every fake model in the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.failed = 0
+        self.output_tokens = 0
+
+    def add(self, **counts: int):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors, "rate_limited": self.rate_limited,
+                    "retries": self.retries, "failed": self.failed, "output_tokens": self.output_tokens}
+
+rate_limiter = RateLimiter()
+fake_llm_stats = FakeLLMStats()
+_script_lock = threading.Lock()
+
+# Keyword heuristics behind the templated JSON answers
+CATEGORY_KEYWORDS = {
+    "technical": ["password", "log in", "login", "crash", "error", "bug", "app", "upload", "locked out", "not working"],
+    "billing": ["bill", "charge", "payment", "refund", "invoice", "price"],
+    "sales": ["upgrade", "premium", "plan", "pricing", "trial", "discount", "feature"]
+}
+EMOTION_KEYWORDS = [
+    ("angry", ["ridiculous", "useless", "unacceptable", "hate", "worst"]),
+    ("frustrated", ["nothing works", "for hours", "trying", "frustrat", "still", "!!"]),
+    ("stressed", ["deadline", "urgent", "asap", "meeting"]),
+    ("happy", ["thanks", "thank you", "appreciate", "great", "love"]),
+    ("confused", ["don't understand", "why", "how do", "confus", "?"])
+]
+URGENCY_KEYWORDS = [
+    ("critical", ["deadline", "urgent", "asap", "system down", "meeting in"]),
+    ("high", ["can't", "cannot", "not working", "crash", "locked out", "charged twice", "nothing works"]),
+    ("medium", ["?", "issue", "problem", "wrong"])
+]
+PRIORITY = {"low": "low", "medium": "medium", "high": "high", "critical": "urgent"}
+RESOLUTION_TIME = {"low": "24 hours", "medium": "4 hours", "high": "2 hours", "critical": "30 minutes"}
+
+# "Customer Message:", "Current Customer Message:", "New input:", "Human:" ...
+MESSAGE_LINE = re.compile(r"^(?:\w+ ){0,2}(?:Message|input|Customer|Human|Question)\s*:\s*(.+)$", re.MULTILINE)
+# ConversationSummaryMemory's prompt: fold new lines into the current summary (the last one, after the example)
+PROGRESSIVE_SUMMARY = re.compile(r"^.*Current summary:\n(.*?)\n+New lines of conversation:\n(.*?)\n+New summary:\s*$",
+                                 re.DOTALL)
+# Retrieved history lines: "- [session 2, relevance 0.61] Customer: ... / Agent: ..."
+PREVIOUS_TURN = re.compile(r"^- \[.*?\] Customer: (.+?)(?: / Agent:|$)", re.MULTILINE)
+TOKEN = re.compile(r"\s*\S+|\s+$")
+
+def extract_message(prompt: str) -> str:
+    """The customer's own words in a prompt (the last message line), or "" when there is none"""
+    matches = MESSAGE_LINE.findall(prompt)
+    return matches[-1].strip() if matches else ""
+
+def _first_match(text: str, table: List, default: str) -> str:
+    for label, keywords in table:
+        if any(keyword in text for keyword in keywords):
+            return label
+    return default
+
+def infer_signals(prompt: str) -> Dict[str, Any]:
+    """Emotion, urgency, category and routing for a prompt, consistent with earlier steps' JSON"""
+    # Later steps see the earlier steps' JSON instead of the message (the format template comes after it)
+    context = prompt.split("exact format")[0]
+    embedded = dict(re.findall(
+        r'"(customer_emotion|urgency_level|category|main_issue|references_previous)"\s*:\s*"([^"/]*)"', context))
+    # Only the customer's words count, not the guidelines listed in the prompt
+    message = extract_message(prompt) or embedded.get("main_issue") or prompt
+    issue = embedded.get("main_issue") or re.split(r"(?<=[.!?])\s", message.strip())[0][:100]
+    text = f"{message.lower()} {issue.lower()}"
+
+    emotion = embedded.get("customer_emotion") or _first_match(text, EMOTION_KEYWORDS, "confused")
+    urgency = embedded.get("urgency_level") if embedded.get("urgency_level") in PRIORITY else \
+        _first_match(text, URGENCY_KEYWORDS, "low")
+    category = embedded.get("category") or _first_match(
+        text, [(name, keywords) for name, keywords in CATEGORY_KEYWORDS.items()], "general")
+    escalate = urgency == "critical" or emotion == "angry"
+    # A follow-up refers to an earlier turn the prompt actually shows (retrieved history)
+    previous = PREVIOUS_TURN.findall(context)
+    references = embedded.get("references_previous") or (previous[0][:100] if previous else "")
+    return {
+        "message": message,
+        "main_issue": issue,
+        "customer_emotion": emotion,
+        "urgency_level": urgency,
+        "category": category,
+        "subcategory": next((keyword for keyword in CATEGORY_KEYWORDS.get(category, []) if keyword in text),
+                            "general inquiry"),
+        "complexity": {"low": "simple", "medium": "simple", "high": "moderate"}.get(urgency, "complex"),
+        "requires_escalation": escalate,
+        "department": "escalation" if escalate else category,
+        "priority": PRIORITY[urgency],
+        "resolution_time": RESOLUTION_TIME[urgency],
+        "references_previous": references
+    }
+
+def _fill(template: Any, signals: Dict[str, Any], key: str = "") -> Any:
+    """Replace the placeholders of a JSON format template with values for this prompt"""
+    if isinstance(template, dict):
+        return {name: _fill(value, signals, name) for name, value in template.items()}
+    fields = {
+        "main_issue": signals["main_issue"],
+        "customer_emotion": signals["customer_emotion"],
+        "urgency_level": signals["urgency_level"],
+        "context": [signals["main_issue"]],
+        "is_followup": bool(signals["references_previous"]),
+        "references_previous": signals["references_previous"],
+        "is_new_issue": not signals["references_previous"],
+        "related_to_previous": signals["references_previous"],
+        "category": signals["category"],
+        "subcategory": signals["subcategory"],
+        "complexity": signals["complexity"],
+        "estimated_resolution_time": signals["resolution_time"],
+        "requires_escalation": signals["requires_escalation"],
+        "department": signals["department"],
+        "priority": signals["priority"],
+        "agent_requirements": [f"{signals['category']} support"],
+        "sla_target": signals["resolution_time"]
+    }
+    if key in fields:
+        return fields[key]
+    if isinstance(template, str) and "/" in template:
+        return template.split("/")[0]
+    return template
+
+def _schema_instance(schema: Dict[str, Any], signals: Dict[str, Any]) -> Dict[str, Any]:
+    """An object that satisfies a PydanticOutputParser JSON schema"""
+    instance = {}
+    for name, spec in schema.get("properties", {}).items():
+        kind = spec.get("type")
+        description = spec.get("description", name)
+        if kind == "array":
+            instance[name] = [f"{description.lower()} {i}" for i in (1, 2)]
+        elif kind in ("integer", "number"):
+            instance[name] = 1
+        elif kind == "boolean":
+            instance[name] = False
+        else:
+            options = re.search(r"\(([^)]*,[^)]*)\)", description)
+            instance[name] = options.group(1).split(",")[0].strip() if options else _fill(description, signals, name)
+    return instance
+
+def _text_reply(prompt: str, signals: Dict[str, Any]) -> str:
+    lower = prompt.lower()
+    story = re.search(r"\bstory\b", lower)
+    topic = re.search(r"story about (.+?)[.\n]", prompt)
+    if "title" in lower and story:
+        return "The Unexpected Journey"
+    if "summar" in lower and story:
+        return "A curious hero sets out, meets an unlikely friend and comes home changed. It is a short tale about courage."
+    if topic:
+        subject = topic.group(1)
+        return (f"Once upon a time there was a story about {subject}. Nobody expected much from it at first.\n\n"
+                f"Then, one bright morning, everything about {subject} changed, and the whole town came to see.\n\n"
+                f"In the end everyone agreed that {subject} had been the best part of the year.")
+    progressive = PROGRESSIVE_SUMMARY.search(prompt)
+    if progressive:
+        # Keep the summary so far and add the customer's new points (the few-shot example is ignored)
+        summary, lines = progressive.groups()
+        points = [re.split(r"(?<=[.!?])\s", line.split(":", 1)[1].strip())[0]
+                  for line in lines.splitlines() if line.startswith("Human:")]
+        sentences = [sentence for sentence in re.split(r"(?<=\.)\s", summary.strip()) if sentence]
+        sentences += [f"The customer then said: {point.rstrip('.')}." for point in points]
+        # Stay short like a real summary: the opening sentence plus the latest points
+        sentences = sentences[:1] + sentences[1:][-2:]
+        return " ".join(sentences) or "The customer and the assistant continued the conversation."
+    if "summar" in lower:
+        return f"The customer contacted support about: {signals['main_issue']}. The assistant is helping them."
+    return (f"Thank you for reaching out. I understand your concern (\"{signals['main_issue'][:80]}\") and "
+            f"how much this matters to you, so I've passed it to our {signals['department']} team, who will "
+            f"follow up within {signals['resolution_time']}. Is there anything else I can help with in the meantime?")
+
+def _agent_reply(prompt: str, signals: Dict[str, Any]) -> str:
+    """Conversational ReAct format: call a tool named in the input once, then answer"""
+    # The format instructions mention "Observation:" too; only the scratchpad counts
+    observations = re.findall(r"Observation: (.+)", prompt.split("New input:")[-1])
+    if observations:
+        return f"Thought: Do I need to use a tool? No\nAI: Here is what I found: {observations[-1].strip()[:200]}"
+    tools = re.findall(r"^> (\w+):", prompt, re.MULTILINE)
+    stems = {word[:6] for word in re.findall(r"[a-z]+", signals["message"].lower())}
+    # Tool whose name parts share the most stems with the input ("calculate" -> calculator); ties go to the first
+    scores = [(sum(part[:6] in stems for part in tool.split("_")), -index, tool) for index, tool in enumerate(tools)]
+    if scores and max(scores)[0]:
+        tool = max(scores)[2]
+        return f"Thought: Do I need to use a tool? Yes\nAction: {tool}\nAction Input: {signals['message']}"
+    return f"Thought: Do I need to use a tool? No\nAI: {_text_reply(prompt, signals)}"
+
+def templated_response(prompt: str) -> str:
+    """Plausible reply for any prompt in the examples: JSON where JSON is asked for, text otherwise"""
+    signals = infer_signals(prompt)
+    if "Do I need to use a tool?" in prompt:
+        return _agent_reply(prompt, signals)
+
+    schema = re.search(r"```\s*(\{.*\})\s*```", prompt, re.DOTALL)
+    if schema and '"properties"' in schema.group(1):
+        return json.dumps(_schema_instance(json.loads(schema.group(1)), signals), indent=2)
+
+    format_start = prompt.find("{", prompt.find("exact format")) if "exact format" in prompt else -1
+    if format_start != -1:
+        template_text = re.sub(r"\btrue/false\b", "false", prompt[format_start:])
+        try:
+            template, _ = json.JSONDecoder().raw_decode(template_text)
+        except json.JSONDecodeError:
+            template = None
+        if isinstance(template, dict):
+            return json.dumps(_fill(template, signals), indent=2)
+    return _text_reply(prompt, signals)
+
+class FakeChatModel(BaseChatModel):
+    """Offline chat model with scripted or templated replies, simulated latency and faults"""
+
+    model_name: str = "gpt-3.5-turbo"
+    temperature: float = 0.7  # Accepted for compatibility; replies are deterministic
+    max_tokens: Optional[int] = None
+    streaming: bool = False
+    responses: Optional[List[str]] = None
+    responder: Optional[Callable[[str], str]] = None
+    profile: Any = None
+    max_retries: int = 2
+    seed: Optional[int] = None
+    rng: Any = None
+    call_count: int = 0
+
+    def __init__(self, **kwargs: Any):
+        if "model" in kwargs:
+            kwargs["model_name"] = kwargs.pop("model")
+        super().__init__(**kwargs)
+        self.profile = self.profile or profile_from_env()
+        seed = self.seed if self.seed is not None else os.getenv("FAKE_LLM_SEED")
+        self.rng = random.Random(seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    def _reply(self, prompt: str) -> str:
+        if self.responses:
+            with _script_lock:
+                content = self.responses[self.call_count % len(self.responses)]
+                self.call_count += 1
+            return content
+        if self.responder is not None:
+            return self.responder(prompt)
+        return templated_response(prompt)
+
+    def _start_call(self, messages, stop: Optional[List[str]]) -> List[str]:
+        """Wait out faults and the first-token latency; returns the reply split into tokens"""
+        profile = self.profile
+        attempt = 0
+        while True:
+            try:
+                rate_limiter.acquire(profile.requests_per_minute)
+                if profile.error_rate and self.rng.random() < profile.error_rate:
+                    fake_llm_stats.add(errors=1)
+                    raise FakeLLMError("simulated API error (HTTP 500)")
+                break
+            except FakeLLMError as e:
+                if isinstance(e, FakeRateLimitError):
+                    fake_llm_stats.add(rate_limited=1)
+                if attempt >= self.max_retries:
+                    fake_llm_stats.add(calls=1, failed=1)
+                    raise
+                attempt += 1
+                fake_llm_stats.add(retries=1)
+                time.sleep(e.retry_after if isinstance(e, FakeRateLimitError) else 0.5 * 2 ** (attempt - 1))
+
+        time.sleep(profile.sample_first_token_seconds(self.rng))
+        content = self._reply("\n".join(str(message.content) for message in messages))
+        for stop_sequence in stop or []:
+            content = content.split(stop_sequence)[0]
+        tokens = TOKEN.findall(content)
+        if self.max_tokens is not None:
+            tokens = tokens[:self.max_tokens]
+        fake_llm_stats.add(calls=1, output_tokens=len(tokens))
+        return tokens
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._start_call(messages, stop)
+        delay = 1 / self.profile.tokens_per_second if self.profile.tokens_per_second else 0.0
+        for index, token in enumerate(tokens):
+            if index and delay:
+                time.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        tokens = self._start_call(messages, stop)
+        if self.profile.tokens_per_second and len(tokens) > 1:
+            time.sleep((len(tokens) - 1) / self.profile.tokens_per_second)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))],
+            llm_output={"model_name": self.model_name, "token_usage": {"completion_tokens": len(tokens)}}
+        )
+
+def print_fake_llm_stats():
+    """Print what the fake backend served"""
+    report = fake_llm_stats.report()
+    if not report["calls"]:
+        return
+    print(f"🧪 Fake LLM: {report['calls']} calls, {report['output_tokens']} tokens, {report['errors']} injected "
+          f"errors, {report['rate_limited']} rate-limited, {report['retries']} retries, {report['failed']} failed")
+
+def demonstrate_fake_llm(calls: int = 24, max_concurrency: int = 8):
+    """Show a templated reply, then each profile's latency, token rate and fault behaviour"""
+    prompt = ("Analyze the following customer inquiry.\n\nCustomer Message: I was charged twice this month!!\n\n"
+              "Return a JSON object with this exact format:\n{\n  \"main_issue\": \"brief description\",\n"
+              "  \"customer_emotion\": \"frustrated/happy/confused/angry/stressed\",\n"
+              "  \"urgency_level\": \"low/medium/high/critical\",\n  \"requires_escalation\": true/false\n}\n\n"
+              "JSON Response:")
+    print("\n🧪 Fake LLM Demo")
+    print("=" * 60)
+    print(f"Templated JSON reply:\n{FakeChatModel(profile=PROFILES['instant']).invoke(prompt).content}\n")
+
+    for name, profile in PROFILES.items():
+        fake_llm_stats.reset()
+        llm = FakeChatModel(profile=profile, streaming=True, max_retries=1, seed=7)
+
+        def timed_call(_) -> Optional[Dict[str, float]]:
+            start = time.perf_counter()
+            first_token_at = None
+            tokens = 0
+            try:
+                for chunk in llm.stream("Customer Message: Hello, where is my order?"):
+                    first_token_at = first_token_at or time.perf_counter()
+                    tokens += 1
+            except FakeLLMError:
+                return None
+            decode = time.perf_counter() - first_token_at
+            return {"ttft_ms": (first_token_at - start) * 1000,
+                    "tokens_per_second": (tokens - 1) / decode if decode > 0 else 0.0}
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            results = [result for result in executor.map(timed_call, range(calls)) if result]
+        elapsed = time.perf_counter() - start
+        ttfts = sorted(result["ttft_ms"] for result in results) or [0.0]
+        speeds = [result["tokens_per_second"] for result in results if result["tokens_per_second"]]
+        speed = f"{sum(speeds) / len(speeds):.0f} tokens/s" if speeds and profile.tokens_per_second else "instant"
+        report = fake_llm_stats.report()
+        print(f"{name:<14} TTFT p50={ttfts[len(ttfts) // 2]:.0f}ms max={ttfts[-1]:.0f}ms, {speed}, "
+              f"{calls} calls in {elapsed:.1f}s: {report['errors']} errors, {report['rate_limited']} rate-limited, "
+              f"{report['retries']} retries, {report['failed']} failed")
+
+if __name__ == "__main__":
+    demonstrate_fake_llm()
@@ -0,0 +1,202 @@
+"""
+Persistent LLM Response Cache
+
+Identical prompts sent with identical model settings get identical treatment: the
+first response is stored in a local SQLite file and every later request is served
+from it without touching the network. Regression suites that replay the same
+prompts thousands of times run in microseconds per call after the first pass.
+
+- Key: SHA-256 of the model + parameters string and the rendered prompt
+- Storage: SQLite (WAL mode) with a small in-process LRU in front of it
+- Eviction: least recently used entries are deleted once the file exceeds a byte budget;
+  hits (from RAM or disk) record their access time in batches of TOUCH_BATCH, not with
+  a write per read, and pending access times are written before anything is evicted
+- Stats: hits, misses, evictions, entry count and stored bytes
+
+Enable it by passing `cache=enable_llm_cache()` to ChatOpenAI, which installs the
+shared cache as LangChain's global LLM cache. Configure it with the
+LLM_CACHE_ENABLED, LLM_CACHE_PATH and LLM_CACHE_MAX_MB environment variables.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Sequence
+
+from langchain.load.dump import dumps
+from langchain.load.load import loads
+from langchain.globals import set_llm_cache
+from langchain.schema import Generation
+from langchain.schema.cache import BaseCache
+
+DEFAULT_CACHE_PATH = ".llm_cache.sqlite"
+DEFAULT_MAX_MB = 256
+TOUCH_BATCH = 256  # Hits whose access time is written to SQLite in one transaction
+
+class PersistentLLMCache(BaseCache):
+    """Exact-match response cache stored in SQLite with size-based LRU eviction"""
+
+    def __init__(self, database_path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 memory_entries: int = 1024):
+        self.database_path = database_path
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Sequence[Generation]]" = OrderedDict()
+        self._touched: Dict[str, float] = {}  # Keys hit since their last_access was last written -> hit time
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        self._conn = sqlite3.connect(database_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                   key TEXT PRIMARY KEY,
+                   llm_string TEXT NOT NULL,
+                   response TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """Hash of the model/parameter string and the rendered prompt"""
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, value: Sequence[Generation]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = self.make_key(prompt, llm_string)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._touch(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return self._memory[key]
+
+            row = self._conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._touch(key)
+            value = [loads(generation) for generation in loads(row[0])]
+            self._remember(key, value)
+            self._stats["hits"] += 1
+            return value
+
+    def _touch(self, key: str):
+        """Note a hit; the access times are written once TOUCH_BATCH have piled up (caller holds the lock)"""
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_BATCH:
+            self._write_touches()
+            self._conn.commit()
+
+    def _write_touches(self):
+        if self._touched:
+            self._conn.executemany("UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = self.make_key(prompt, llm_string)
+        response = dumps([dumps(generation) for generation in return_val])
+        size = len(response.encode("utf-8"))
+
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, response, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, llm_string, response, size, time.time())
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._stats["writes"] += 1
+            self._touched.pop(key, None)
+            self._evict()
+            self._conn.commit()
+            self._remember(key, list(return_val))
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits its byte budget"""
+        if self._total_bytes > self.max_bytes:
+            self._write_touches()  # Recent hits, including RAM-only ones, must not look cold
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                self._total_bytes -= size
+                self._stats["evictions"] += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._memory.clear()
+            self._touched.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus the current size of the cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            stats["bytes"] = self._total_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+# One cache per process, shared by every chain
+_llm_cache: Optional[PersistentLLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> Optional[PersistentLLMCache]:
+    """Return the shared cache, or None when LLM_CACHE_ENABLED is false"""
+    global _llm_cache
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("false", "0", "no"):
+        return None
+
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = PersistentLLMCache(
+                database_path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+            )
+        return _llm_cache
+
+def enable_llm_cache() -> bool:
+    """Install the shared cache globally and return the value for ChatOpenAI's `cache` flag"""
+    cache = get_llm_cache()
+    if cache is None:
+        return False
+    set_llm_cache(cache)
+    return True
+
+def print_cache_stats():
+    """Print the shared cache's hit/miss statistics"""
+    cache = get_llm_cache()
+    if cache is None:
+        print("🗄️  LLM cache disabled")
+        return
+    stats = cache.stats()
+    print(f"🗄️  LLM cache: {stats['hits']} hits ({stats['memory_hits']} in memory), {stats['misses']} misses, "
+          f"hit rate {stats['hit_rate']:.0%}, {stats['entries']} entries, {stats['bytes'] / 1024:.1f} KB, "
+          f"{stats['evictions']} evictions")
@@ -0,0 +1,459 @@
+"""
+Semantic Response Cache for the Customer Service Chains
+
+"I can't log in" and "unable to login to my account" should get the same
+understanding/classification output. This cache sits in front of an LLMChain and
+reuses a previous output when a new input is similar enough to one it has seen.
+
+- Embeddings are computed locally with the hashing trick (word + character n-gram
+  features hashed into a fixed-size vector), so there is no network call
+- Vectors live in one contiguous NumPy matrix; lookup is a cosine top-1 search
+- The similarity threshold is configurable (SEMANTIC_CACHE_THRESHOLD)
+- Numbers and IDs (order numbers, customer IDs, amounts) must match exactly: a
+  message about order #99881 never reuses the output for order #12345, however
+  similar the wording
+- When the cache is full the least recently used entry is overwritten
+- A partitioned (IVF-style) index can replace brute force for very large caches
+- Snapshots: snapshot_semantic_caches() writes every cache to a memory_snapshot.py
+  file and restore_semantic_caches() loads each one on its first use, so a new
+  worker starts with the old worker's hits
+
+Run `python semantic_cache.py benchmark` to compare brute force and the partitioned
+index at up to 1M entries, or `python semantic_cache.py snapshot` to time a restore.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import struct
+import tempfile
+import threading
+from typing import Dict, List, Any, FrozenSet, Optional, Tuple
+
+import numpy as np
+from langchain.chains.base import Chain
+
+from memory_snapshot import SnapshotWriter, SnapshotReader
+
+SNAPSHOT_SECTION = "semantic_caches"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<IIq")  # dim, entries, clock; then vectors, last used, values (JSON)
+
+# Light normalization so common paraphrases share features
+PHRASE_NORMALIZATION = [
+    (r"\bunable to\b|\bcannot\b|\bcan not\b|\bcan't\b|\bcant\b|\bcouldn't\b", "cant"),
+    (r"\blog ?in\b|\bsign ?in\b|\blogging in\b|\bsigning in\b", "login"),
+    (r"\bpass ?word\b|\bpwd\b", "password"),
+    (r"\bcharged\b|\bcharges\b", "charge"),
+    (r"\bbills?\b|\binvoices?\b", "bill"),
+]
+STOPWORDS = {"i", "my", "to", "the", "a", "an", "is", "it", "me", "of", "for", "and", "in", "on",
+             "this", "that", "am", "be", "been", "with", "your", "you", "into", "account"}
+
+# Tokens with a digit (#12345, CUST123, $200, 2fa) and email addresses
+ENTITY_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+|[A-Za-z_$#-]*\d[\w.,-]*")
+
+def extract_entities(text: str) -> FrozenSet[str]:
+    """The must-match tokens of a message, normalized (case, # and trailing punctuation)"""
+    return frozenset(match.lower().strip("#$.,-") for match in ENTITY_PATTERN.findall(text))
+
+def normalize_text(text: str) -> List[str]:
+    """Lowercase, fold common paraphrases and drop stopwords"""
+    text = text.lower()
+    for pattern, replacement in PHRASE_NORMALIZATION:
+        text = re.sub(pattern, replacement, text)
+    return [word for word in re.findall(r"[a-z0-9]+", text) if word not in STOPWORDS]
+
+class HashingEmbedder:
+    """Hashing-trick vectorizer: no vocabulary, no model, no network"""
+
+    def __init__(self, dim: int = 512, char_ngram: int = 3):
+        self.dim = dim
+        self.char_ngram = char_ngram
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = normalize_text(text)
+        features = [(f"w:{word}", 1.0) for word in words]
+        features += [(f"b:{a}_{b}", 0.5) for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [(f"c:{padded[i:i + self.char_ngram]}", 0.3)
+                         for i in range(len(padded) - self.char_ngram + 1)]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Low bits pick the bucket, one high bit picks the sign
+            vector[h % self.dim] += weight if (h >> 31) & 1 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+class SemanticCache:
+    """Fixed-capacity cosine-similarity cache over a contiguous vector matrix"""
+
+    def __init__(self, dim: int = 512, capacity: int = 10000, threshold: float = 0.8,
+                 index: str = "brute", n_partitions: int = 256, n_probe: int = 8,
+                 embedder: Optional[HashingEmbedder] = None):
+        self.dim = dim
+        self.capacity = capacity
+        self.threshold = threshold
+        self.index = index
+        self.n_partitions = n_partitions
+        self.n_probe = n_probe
+        self.embedder = embedder or HashingEmbedder(dim)
+
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._values: List[Any] = [None] * capacity
+        self._entities: List[FrozenSet[str]] = [frozenset()] * capacity
+        self._size = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "inserts": 0, "evictions": 0, "entity_mismatches": 0}
+
+        # Partitioned index state (trained once enough vectors are present)
+        self._centroids: Optional[np.ndarray] = None
+        self._partition_of = np.full(capacity, -1, dtype=np.int32)
+        self._partitions: List[List[int]] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    # --- partitioned index -------------------------------------------------
+    def _train_partitions(self):
+        """Pick centroids from the stored vectors (a few rounds of k-means)"""
+        rng = np.random.default_rng(0)
+        sample_size = min(self._size, self.n_partitions * 64)
+        sample = self._vectors[rng.choice(self._size, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.n_partitions, replace=False)].copy()
+
+        for _ in range(5):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for p in range(self.n_partitions):
+                members = sample[assignment == p]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[p] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        self._centroids = centroids
+        self._partitions = [[] for _ in range(self.n_partitions)]
+        assignment = self._assign(self._vectors[:self._size])
+        for slot, p in enumerate(assignment):
+            self._partition_of[slot] = p
+            self._partitions[p].append(slot)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            block = vectors[start:start + 65536]
+            assignment[start:start + len(block)] = np.argmax(block @ self._centroids.T, axis=1)
+        return assignment
+
+    def _candidate_slots(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Slots in the n_probe partitions closest to the query (None = search everything)"""
+        if self.index != "partitioned":
+            return None
+        if self._centroids is None:
+            if self._size < self.n_partitions * 16:
+                return None
+            self._train_partitions()
+        nearest = np.argpartition(-(self._centroids @ query), self.n_probe)[:self.n_probe]
+        slots = [slot for p in nearest for slot in self._partitions[p]]
+        return np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+    # --- core operations ---------------------------------------------------
+    def search_vector(self, query: np.ndarray) -> Tuple[int, float]:
+        """Top-1 cosine search; returns (slot, similarity) or (-1, 0.0)"""
+        if self._size == 0:
+            return -1, 0.0
+        candidates = self._candidate_slots(query)
+        if candidates is None:
+            similarities = self._vectors[:self._size] @ query
+            best = int(np.argmax(similarities))
+            return best, float(similarities[best])
+        if len(candidates) == 0:
+            return -1, 0.0
+        similarities = self._vectors[candidates] @ query
+        best = int(np.argmax(similarities))
+        return int(candidates[best]), float(similarities[best])
+
+    def add_vector(self, vector: np.ndarray, value: Any, entities: FrozenSet[str] = frozenset()) -> int:
+        """Store a vector/value pair, overwriting the least recently used slot when full"""
+        self._clock += 1
+        if self._size < self.capacity:
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used))
+            self._stats["evictions"] += 1
+            if self._centroids is not None:
+                self._partitions[self._partition_of[slot]].remove(slot)
+
+        self._vectors[slot] = vector
+        self._values[slot] = value
+        self._entities[slot] = entities
+        self._last_used[slot] = self._clock
+        self._stats["inserts"] += 1
+
+        if self._centroids is not None:
+            p = int(np.argmax(self._centroids @ vector))
+            self._partition_of[slot] = p
+            self._partitions[p].append(slot)
+        return slot
+
+    def lookup(self, text: str) -> Optional[Tuple[Any, float]]:
+        """Return (cached value, similarity) if a similar enough input was seen"""
+        query = self.embedder.embed(text)
+        with self._lock:
+            slot, similarity = self.search_vector(query)
+            if slot >= 0 and similarity >= self.threshold:
+                self._clock += 1
+                self._last_used[slot] = self._clock
+                if self._entities[slot] == extract_entities(text):
+                    self._stats["hits"] += 1
+                    return self._values[slot], similarity
+                # Same wording about another order/customer: the cached output describes theirs
+                self._stats["entity_mismatches"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def add(self, text: str, value: Any):
+        vector = self.embedder.embed(text)
+        with self._lock:
+            self.add_vector(vector, value, extract_entities(text))
+
+    def to_bytes(self) -> bytes:
+        """The stored entries (little-endian arrays, JSON values and entities); the partitioned index is not included"""
+        with self._lock:
+            size = self._size
+            return b"".join([SNAPSHOT_HEADER.pack(self.dim, size, self._clock),
+                             self._vectors[:size].astype("<f4", copy=False).tobytes(),
+                             self._last_used[:size].astype("<i8", copy=False).tobytes(),
+                             json.dumps({"values": self._values[:size],
+                                         "entities": [sorted(entities) for entities in self._entities[:size]]},
+                                        separators=(",", ":")).encode("utf-8")])
+
+    def load_bytes(self, data) -> int:
+        """Replace the entries with to_bytes() output (the most recently used, if over capacity); returns count"""
+        dim, size, clock = SNAPSHOT_HEADER.unpack_from(data)
+        if dim != self.dim:
+            raise ValueError(f"snapshot vectors have {dim} dimensions, this cache {self.dim}")
+        position = SNAPSHOT_HEADER.size
+        vectors = np.frombuffer(data, dtype="<f4", count=size * dim, offset=position).reshape(size, dim)
+        position += vectors.nbytes
+        last_used = np.frombuffer(data, dtype="<i8", count=size, offset=position)
+        entries = json.loads(bytes(data[position + last_used.nbytes:]))
+        keep = np.argsort(last_used)[-self.capacity:] if size > self.capacity else np.arange(size)
+        with self._lock:
+            self._size = len(keep)
+            self._vectors[:self._size] = vectors[keep]
+            self._last_used[:self._size] = last_used[keep]
+            self._values[:self._size] = [entries["values"][slot] for slot in keep]
+            self._entities[:self._size] = [frozenset(entries["entities"][slot]) for slot in keep]
+            self._clock = clock
+            # Retrained from the restored vectors on the first partitioned search
+            self._centroids = None
+            self._partition_of[:] = -1
+            self._partitions = []
+        return self._size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, entries=self._size, capacity=self.capacity, threshold=self.threshold)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+class SemanticCacheChain(Chain):
+    """Wraps an LLMChain and reuses outputs for semantically similar inputs"""
+
+    chain: Chain
+    semantic_cache: Any
+    cache_input_key: str
+
+    @property
+    def input_keys(self) -> List[str]:
+        return self.chain.input_keys
+
+    @property
+    def output_keys(self) -> List[str]:
+        return self.chain.output_keys
+
+    def _call(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        text = str(inputs[self.cache_input_key])
+        cached = self.semantic_cache.lookup(text)
+        if cached is not None:
+            return dict(cached[0])
+
+        callbacks = run_manager.get_child() if run_manager else None
+        result = self.chain.invoke(inputs, config={"callbacks": callbacks})
+        outputs = {key: result[key] for key in self.chain.output_keys}
+        self.semantic_cache.add(text, outputs)
+        return outputs
+
+# Process-wide caches, one per wrapped step
+_semantic_caches: Dict[str, SemanticCache] = {}
+# Caches in a restored snapshot that have not been used yet
+_snapshot: Optional[SnapshotReader] = None
+_snapshot_offsets: Dict[str, int] = {}
+# Guards the three above, so two threads building chains never create or restore one cache twice
+_semantic_caches_lock = threading.Lock()
+
+def get_semantic_cache(name: str) -> SemanticCache:
+    """Return the shared semantic cache for a pipeline step"""
+    global _snapshot
+    with _semantic_caches_lock:
+        if name not in _semantic_caches:
+            cache = SemanticCache(
+                capacity=int(os.getenv("SEMANTIC_CACHE_CAPACITY", "10000")),
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+            )
+            offset = _snapshot_offsets.pop(name, None)
+            if offset is not None:
+                cache.load_bytes(_snapshot.read(offset))
+                if not _snapshot_offsets:
+                    _snapshot.close()
+                    _snapshot = None
+            _semantic_caches[name] = cache
+        return _semantic_caches[name]
+
+def snapshot_semantic_caches(path: str) -> int:
+    """Write every semantic cache (including restored ones not used yet) to a snapshot; returns its size"""
+    with _semantic_caches_lock, SnapshotWriter(path) as writer:
+        writer.begin_section(SNAPSHOT_SECTION, version=SNAPSHOT_VERSION)
+        for name, offset in _snapshot_offsets.items():
+            writer.add(name, bytes(_snapshot.read(offset)))
+        for name, cache in _semantic_caches.items():
+            writer.add(name, cache.to_bytes())
+    return os.path.getsize(path)
+
+def restore_semantic_caches(path: str) -> List[str]:
+    """Make the caches in a snapshot available; each is loaded when get_semantic_cache() first asks for it"""
+    global _snapshot, _snapshot_offsets
+    reader = SnapshotReader(path)
+    # Records in another version are not readable; the caches then start cold
+    if SNAPSHOT_SECTION not in reader.sections() or reader.meta(SNAPSHOT_SECTION)["version"] != SNAPSHOT_VERSION:
+        reader.close()
+        return []
+    with _semantic_caches_lock:
+        if _snapshot is not None:
+            _snapshot.close()
+        _snapshot = reader
+        _snapshot_offsets = {name: offset for name, offset in reader.index(SNAPSHOT_SECTION).items()
+                             if name not in _semantic_caches}
+        return list(_snapshot_offsets)
+
+def with_semantic_cache(chain: Chain, name: str, input_key: str) -> SemanticCacheChain:
+    """Put the shared semantic cache for `name` in front of `chain`"""
+    return SemanticCacheChain(chain=chain, semantic_cache=get_semantic_cache(name), cache_input_key=input_key)
+
+def print_semantic_cache_stats():
+    """Print hit/miss statistics for every semantic cache in use"""
+    with _semantic_caches_lock:
+        caches = list(_semantic_caches.items())
+    for name, cache in caches:
+        stats = cache.stats()
+        print(f"🧠 Semantic cache '{name}': {stats['hits']} hits, {stats['misses']} misses, "
+              f"hit rate {stats['hit_rate']:.0%}, {stats['entries']}/{stats['capacity']} entries, "
+              f"{stats['entity_mismatches']} rejected for different order/customer IDs")
+
+def demonstrate_similarity():
+    """Show which paraphrases clear the similarity threshold"""
+    print("\n🧠 Semantic Similarity Demo")
+    print("=" * 40)
+
+    embedder = HashingEmbedder()
+    base = "I can't log in"
+    others = [
+        "unable to login to my account",
+        "I cannot sign in to my account",
+        "My bill is higher than usual",
+        "The app keeps crashing"
+    ]
+    base_vector = embedder.embed(base)
+    for other in others:
+        similarity = float(base_vector @ embedder.embed(other))
+        print(f"'{base}' vs '{other}': {similarity:.2f}")
+
+    # Near-identical wording, different order: a hit would answer with the other order's details
+    cache = SemanticCache()
+    cache.add("My order #12345 has not arrived yet, where is it?", {"main_issue": "order 12345 not arrived"})
+    for message in ("Where is my order #12345? It has not arrived yet", "My order #99881 has not arrived yet, where is it?"):
+        cached = cache.lookup(message)
+        print(f"'{message}': {'reuses ' + str(cached[0]) if cached else 'miss (different order number)'}")
+
+def benchmark_semantic_cache(max_entries: int = 1_000_000, dim: int = 128, queries: int = 200):
+    """Compare brute-force and partitioned top-1 search as the cache grows"""
+    print("\n⏱️  Semantic Cache Benchmark (brute force vs. partitioned index)")
+    print("=" * 70)
+    rng = np.random.default_rng(42)
+
+    sizes = [size for size in (10_000, 100_000, 1_000_000) if size <= max_entries] or [max_entries]
+    for size in sizes:
+        # Clustered data resembles real traffic better than uniform noise
+        n_topics = max(size // 200, 16)
+        topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+        data = topics[rng.integers(0, n_topics, size)] + 0.3 * rng.standard_normal((size, dim)).astype(np.float32)
+        data /= np.linalg.norm(data, axis=1, keepdims=True)
+        query_vectors = data[rng.integers(0, size, queries)] + 0.05 * rng.standard_normal((queries, dim)).astype(np.float32)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+        results = {}
+        for index in ("brute", "partitioned"):
+            n_partitions = int(np.sqrt(size))
+            cache = SemanticCache(dim=dim, capacity=size, index=index,
+                                  n_partitions=n_partitions, n_probe=max(n_partitions // 32, 4))
+            cache._vectors[:] = data
+            cache._size = size
+
+            start = time.perf_counter()
+            cache.search_vector(query_vectors[0])  # trains the partitioned index
+            build_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            slots = [cache.search_vector(query)[0] for query in query_vectors]
+            results[index] = (slots, (time.perf_counter() - start) * 1000 / queries, build_ms)
+
+        recall = np.mean(np.array(results["brute"][0]) == np.array(results["partitioned"][0]))
+        print(f"{size:>9,} entries | brute {results['brute'][1]:7.3f} ms/query | "
+              f"partitioned {results['partitioned'][1]:7.3f} ms/query "
+              f"(index build {results['partitioned'][2]:.0f} ms, recall@1 {recall:.0%}) | "
+              f"matrix {data.nbytes / 1024 / 1024:.0f} MB")
+
+def demonstrate_snapshot(entries: int = 10_000):
+    """Snapshot a full cache, restore it as a new worker would and look something up"""
+    print("\n📸 Semantic Cache Snapshot Demo")
+    print("=" * 60)
+    issues = ["can't log in", "was charged twice", "order never arrived", "app keeps crashing", "need an invoice"]
+    cache = get_semantic_cache("classification")
+    for i in range(entries):
+        cache.add(f"{issues[i % len(issues)]} for order #{i}", {"category": issues[i % len(issues)]})
+
+    path = os.path.join(tempfile.mkdtemp(prefix="semantic-snapshot-"), "semantic.snap")
+    start = time.perf_counter()
+    size = snapshot_semantic_caches(path)
+    print(f"{len(cache):,} entries -> {size / 1e6:.1f} MB snapshot in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    _semantic_caches.clear()  # A fresh worker
+    start = time.perf_counter()
+    names = restore_semantic_caches(path)
+    print(f"🚀 Restored {names} in {(time.perf_counter() - start) * 1000:.1f} ms (entries load on first use)")
+    start = time.perf_counter()
+    cached = get_semantic_cache("classification").lookup("I was charged twice for order #6")
+    print(f"   first lookup {(time.perf_counter() - start) * 1000:.1f} ms: "
+          f"{'hit ' + str(cached[0]) if cached else 'miss'}")
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark_semantic_cache(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
+    elif len(sys.argv) > 1 and sys.argv[1] == "snapshot":
+        demonstrate_snapshot()
+    else:
+        demonstrate_similarity()
@@ -7,13 +7,16 @@ We'll take a story generation chain and add analysis, summarization, and title g
 
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain, SequentialChain
+from langchain.chains import LLMChain, SequentialChain, TransformChain
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 from typing import List
 
+from llm_cache import enable_llm_cache, print_cache_stats
+from llm_clients import get_chat_model, print_client_stats, using_fake_llm
+from dag_chain import ConcurrentSequentialChain
+
 # Load environment variables
 load_dotenv()
 
@@ -26,10 +29,11 @@ class StoryAnalysis(BaseModel):
 
 def create_story_generation_chain():
     """Create the initial story generation chain"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.8,
-        max_tokens=200
+        max_tokens=200,
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -41,10 +45,11 @@ def create_story_generation_chain():
 
 def create_story_analysis_chain():
     """Create a chain to analyze the generated story"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.3,
-        max_tokens=150
+        max_tokens=150,
+        cache=enable_llm_cache()
     )
     
     parser = PydanticOutputParser(pydantic_object=StoryAnalysis)
@@ -59,10 +64,11 @@ def create_story_analysis_chain():
 
 def create_summary_chain():
     """Create a chain to summarize the story"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.4,
-        max_tokens=100
+        max_tokens=100,
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -72,12 +78,27 @@ def create_summary_chain():
     
     return LLMChain(llm=llm, prompt=prompt, output_key="summary")
 
+def create_themes_chain():
+    """Create a chain that pulls the themes out of the analysis for the title step"""
+    parser = PydanticOutputParser(pydantic_object=StoryAnalysis)
+    
+    def extract_themes(inputs: dict) -> dict:
+        try:
+            themes = ", ".join(parser.parse(inputs["analysis"]).themes)
+        except Exception:
+            # Fall back to the raw analysis if the LLM did not return valid JSON
+            themes = inputs["analysis"]
+        return {"themes": themes}
+    
+    return TransformChain(input_variables=["analysis"], output_variables=["themes"], transform=extract_themes)
+
 def create_title_chain():
     """Create a chain to generate a title for the story"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.6,
-        max_tokens=50
+        max_tokens=50,
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -87,18 +108,20 @@ def create_title_chain():
     
     return LLMChain(llm=llm, prompt=prompt, output_key="title")
 
-def create_sequential_chain():
+def create_sequential_chain(concurrent: bool = True):
     """Create a sequential chain that combines all the individual chains"""
     
     # Create individual chains
     story_chain = create_story_generation_chain()
     analysis_chain = create_story_analysis_chain()
+    themes_chain = create_themes_chain()
     summary_chain = create_summary_chain()
     title_chain = create_title_chain()
     
-    # Create the sequential chain
-    sequential_chain = SequentialChain(
-        chains=[story_chain, analysis_chain, summary_chain, title_chain],
+    # Summary only needs the story, so the DAG scheduler runs it alongside analysis -> themes -> title
+    chain_class = ConcurrentSequentialChain if concurrent else SequentialChain
+    sequential_chain = chain_class(
+        chains=[story_chain, analysis_chain, themes_chain, summary_chain, title_chain],
         input_variables=["topic"],
         output_variables=["story", "analysis", "summary", "title"],
         verbose=True  # This will show the intermediate steps
@@ -145,6 +168,9 @@ def run_example():
         except Exception as e:
             print(f"❌ Error: {e}")
             print("💡 Make sure you have set up your OpenAI API key in the .env file")
+    
+    print_cache_stats()
+    print_client_stats()
 
 def interactive_mode():
     """Run the chain in interactive mode"""
@@ -208,10 +234,11 @@ def demonstrate_chain_composition():
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and not using_fake_llm():
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline with the fake model)")
         exit(1)
     
     # Run the main example
@@ -0,0 +1,315 @@
+"""
+Tiered Router: Rule-based Fast Path in Front of the LLM Pipeline
+
+The keyword classifier from the real-world app (Example 7) takes microseconds; the
+understand → classify → route → respond pipeline takes seconds. The tiered router
+runs the cheap classifier first:
+
+- High-confidence messages with a known answer template (order status, password
+  reset, support hours) are answered directly from the template, but only if they
+  contain one of the template's own phrases and none of its exclusions ("where is my
+  order" qualifies; "I want to cancel my order" does not)
+- Everything else, including any message with negative sentiment, goes to the LLM chain
+
+Fast-path results have the same outputs as the LLM pipeline (understanding,
+classification, routing, response) plus a `route` key, so callers need no changes.
+The confidence threshold is tunable (FAST_PATH_THRESHOLD) and the router reports
+what share of traffic took the fast path and the latency of each route.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional
+
+from langchain.chains.base import Chain
+
+DEFAULT_THRESHOLD = float(os.getenv("FAST_PATH_THRESHOLD", "0.75"))
+
+# Intent -> keywords; multi-word phrases count once per word, so specific phrases win
+INTENT_KEYWORDS = {
+    "order_status": ["where is my order", "order status", "status of my order", "my order", "order number",
+                     "track my order", "tracking number", "tracking", "shipped", "delivery", "package", "order"],
+    "password_reset": ["reset my password", "forgot my password", "password reset", "reset password",
+                       "forgot password", "password"],
+    "support_hours": ["support hours", "business hours", "opening hours", "when are you open", "hours"],
+    "billing": ["bill", "charged", "charge", "payment", "refund", "invoice", "subscription price"],
+    "technical": ["crash", "crashing", "not working", "broken", "error", "login", "log in", "locked out", "bug"],
+    "sales": ["upgrade", "premium", "plan", "pricing", "discount", "trial"],
+    "complaint": ["complaint", "unhappy", "dissatisfied", "unacceptable"]
+}
+
+NEGATIVE_WORDS = ["bad", "terrible", "awful", "hate", "angry", "frustrated", "ridiculous", "useless",
+                  "unacceptable", "nothing works", "!!"]
+POSITIVE_WORDS = ["good", "great", "excellent", "love", "happy", "satisfied", "thanks", "appreciate"]
+
+@dataclass
+class FastPathTemplate:
+    """Canned outputs for one intent, and which messages they may answer"""
+    category: str
+    subcategory: str
+    department: str
+    main_issue: str
+    response: str
+    evidence: List[str] = field(default_factory=list)  # The message must contain one of these phrases
+    exclusions: List[str] = field(default_factory=list)  # ...and none of these (requests the template cannot serve)
+
+    def __post_init__(self):
+        self._evidence = re.compile(r"\b(?:" + "|".join(map(re.escape, self.evidence)) + r")\b")
+        self._exclusions = (re.compile(r"\b(?:" + "|".join(map(re.escape, self.exclusions)) + r")")
+                            if self.exclusions else None)
+
+    def answers(self, message: str) -> bool:
+        """Whether the message asks exactly what this template answers"""
+        message_lower = message.lower()
+        return bool(self._evidence.search(message_lower)) and not (
+            self._exclusions and self._exclusions.search(message_lower))
+
+FAST_PATH_TEMPLATES = {
+    "order_status": FastPathTemplate(
+        category="general",
+        subcategory="order status",
+        department="general",
+        main_issue="Customer wants to know where their order is",
+        response=("Thanks for reaching out! You can follow {order} at any time from Orders > Track in your "
+                  "account, and we email you as soon as the carrier updates the status."),
+        evidence=["where is my order", "order status", "status of my order", "track my order", "tracking number",
+                  "tracking", "shipped"],
+        exclusions=["cancel", "refund", "money back", "return", "change", "address", "never received", "not received",
+                    "didn't receive", "didn't arrive", "damaged", "wrong", "missing", "charged"]
+    ),
+    "password_reset": FastPathTemplate(
+        category="technical",
+        subcategory="password reset",
+        department="technical",
+        main_issue="Customer needs to reset their password",
+        response=("You can reset your password from the sign-in page: choose 'Forgot password', enter your "
+                  "email address and follow the link we send you (it is valid for 30 minutes). If the email "
+                  "does not arrive within a few minutes, please check your spam folder."),
+        evidence=["reset my password", "forgot my password", "password reset", "reset password", "forgot password"],
+        exclusions=["hacked", "compromised", "someone else", "locked", "not working", "doesn't work",
+                    "didn't work", "didn't get", "never got"]
+    ),
+    "support_hours": FastPathTemplate(
+        category="general",
+        subcategory="support hours",
+        department="general",
+        main_issue="Customer asks when support is available",
+        response=("Our support team is available Monday to Friday, 8am-8pm, and Saturday, 9am-5pm (local time). "
+                  "This chat is available 24/7."),
+        evidence=["support hours", "business hours", "opening hours", "when are you open"]
+    )
+}
+
+@dataclass
+class IntentPrediction:
+    """Result of the keyword classifier"""
+    intent: str
+    confidence: float
+    sentiment_score: float
+    scores: Dict[str, float] = field(default_factory=dict)
+
+class KeywordIntentClassifier:
+    """Keyword intent classifier with a confidence score"""
+
+    def __init__(self, intent_keywords: Optional[Dict[str, List[str]]] = None, prior: float = 1.0):
+        self.intent_keywords = intent_keywords or INTENT_KEYWORDS
+        # Evidence needed before confidence gets high: one plain keyword scores 1 / (1 + prior)
+        self.prior = prior
+        # One alternation per intent and word count, compiled once
+        self._patterns = []
+        for intent, keywords in self.intent_keywords.items():
+            for weight in sorted({len(keyword.split()) for keyword in keywords}):
+                group = [re.escape(keyword) for keyword in keywords if len(keyword.split()) == weight]
+                self._patterns.append((intent, weight, re.compile(r"\b(?:" + "|".join(group) + r")\b")))
+
+    def classify(self, message: str) -> IntentPrediction:
+        """Score every intent by matched keywords; confidence is the top intent's share of the evidence"""
+        message_lower = message.lower()
+        scores: Dict[str, float] = {}
+        for intent, weight, pattern in self._patterns:
+            matches = len(set(pattern.findall(message_lower)))
+            if matches:
+                scores[intent] = scores.get(intent, 0.0) + weight * matches
+
+        negative_count = sum(1 for word in NEGATIVE_WORDS if word in message_lower)
+        positive_count = sum(1 for word in POSITIVE_WORDS if word in message_lower)
+        sentiment_score = (positive_count - negative_count) / max(len(message_lower.split()), 1)
+        sentiment_score = max(-1.0, min(1.0, sentiment_score))
+
+        if not scores:
+            return IntentPrediction(intent="general_inquiry", confidence=0.0, sentiment_score=sentiment_score)
+
+        intent = max(scores, key=scores.get)
+        confidence = scores[intent] / (sum(scores.values()) + self.prior)
+        return IntentPrediction(intent=intent, confidence=confidence, sentiment_score=sentiment_score, scores=scores)
+
+class FastPathStats:
+    """Share of traffic per route and the latency of each route"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies_ms: Dict[str, List[float]] = {"fast_path": [], "llm": []}
+        self.fast_path_intents: Dict[str, int] = {}
+
+    def record(self, route: str, duration_ms: float, intent: str):
+        with self._lock:
+            self.latencies_ms[route].append(duration_ms)
+            if route == "fast_path":
+                self.fast_path_intents[intent] = self.fast_path_intents.get(intent, 0) + 1
+
+    def report(self) -> Dict[str, Any]:
+        """Fast-path share, per-route p50/mean latency and the time saved"""
+        with self._lock:
+            fast = list(self.latencies_ms["fast_path"])
+            llm = list(self.latencies_ms["llm"])
+            intents = dict(self.fast_path_intents)
+        total = len(fast) + len(llm)
+
+        def p50(values: List[float]) -> float:
+            return sorted(values)[len(values) // 2] if values else 0.0
+
+        def mean(values: List[float]) -> float:
+            return sum(values) / len(values) if values else 0.0
+
+        return {
+            "requests": total,
+            "fast_path": len(fast),
+            "llm": len(llm),
+            "fast_path_share": len(fast) / total if total else 0.0,
+            "fast_path_p50_ms": p50(fast),
+            "llm_p50_ms": p50(llm),
+            "mean_ms": mean(fast + llm),
+            # What the fast-path requests would have cost at the observed LLM latency
+            "saved_ms": len(fast) * max(mean(llm) - mean(fast), 0.0) if llm else 0.0,
+            "fast_path_intents": intents
+        }
+
+class TieredRouterChain(Chain):
+    """Answers confident, templated messages directly and sends the rest to `chain`"""
+
+    chain: Chain
+    classifier: Any = None
+    threshold: float = DEFAULT_THRESHOLD
+    templates: Dict[str, Any] = FAST_PATH_TEMPLATES
+    stats: Any = None
+    input_key: str = "customer_message"
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.classifier = self.classifier or KeywordIntentClassifier()
+        self.stats = self.stats or FastPathStats()
+
+    @property
+    def input_keys(self) -> List[str]:
+        return [self.input_key]
+
+    @property
+    def output_keys(self) -> List[str]:
+        return self.chain.output_keys + ["route"]
+
+    def take_fast_path(self, message: str, prediction: IntentPrediction) -> bool:
+        """Only confident, non-negative messages that a template answers exactly skip the LLM"""
+        return (prediction.intent in self.templates and prediction.confidence >= self.threshold
+                and prediction.sentiment_score >= 0 and self.templates[prediction.intent].answers(message))
+
+    def render_template(self, message: str, prediction: IntentPrediction) -> Dict[str, Any]:
+        """Build the same outputs the LLM pipeline would return"""
+        template = self.templates[prediction.intent]
+        order_match = re.search(r"\b(?:ORD|ORDER)[-#:\s]*([A-Z0-9-]*\d[A-Z0-9-]*)", message, re.IGNORECASE)
+        # Nothing is looked up here, so the reply only points to where the order can be tracked
+        order = f"order {order_match.group(1).upper()}" if order_match else "your package"
+        context = [f"order {order_match.group(1).upper()}"] if order_match else []
+
+        return {
+            "understanding": json.dumps({
+                "main_issue": template.main_issue,
+                # Same values as the LLM pipeline; non-negative messages with a plain question read as confused
+                "customer_emotion": "happy" if prediction.sentiment_score > 0 else "confused",
+                "urgency_level": "low",
+                "context": context
+            }),
+            "classification": json.dumps({
+                "category": template.category,
+                "subcategory": template.subcategory,
+                "complexity": "simple",
+                "estimated_resolution_time": "immediate",
+                "requires_escalation": False
+            }),
+            "routing": json.dumps({
+                "department": template.department,
+                "priority": "low",
+                "agent_requirements": [],
+                "sla_target": "immediate"
+            }),
+            "handoff": {},  # Answered here, so no department queue
+            "response": template.response.format(order=order)
+        }
+
+    def _call(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        start = time.perf_counter()
+        message = str(inputs[self.input_key])
+        prediction = self.classifier.classify(message)
+
+        if self.take_fast_path(message, prediction):
+            outputs = self.render_template(message, prediction)
+            route = "fast_path"
+        else:
+            callbacks = run_manager.get_child() if run_manager else None
+            result = self.chain.invoke({self.input_key: message}, config={"callbacks": callbacks})
+            outputs = {key: result[key] for key in self.chain.output_keys}
+            route = "llm"
+
+        if run_manager:
+            run_manager.on_text(f"Route: {route} (intent={prediction.intent}, "
+                                f"confidence={prediction.confidence:.2f})\n", verbose=self.verbose)
+        self.stats.record(route, (time.perf_counter() - start) * 1000, prediction.intent)
+        outputs["route"] = route
+        return outputs
+
+def with_fast_path(chain: Chain, threshold: Optional[float] = None, input_key: str = "customer_message") -> TieredRouterChain:
+    """Put the rule-based fast path in front of a customer service chain"""
+    return TieredRouterChain(chain=chain, threshold=DEFAULT_THRESHOLD if threshold is None else threshold,
+                             input_key=input_key)
+
+def print_fast_path_stats(router: TieredRouterChain):
+    """Print what share of traffic skipped the LLM and how that affected latency"""
+    report = router.stats.report()
+    if not report["requests"]:
+        return
+    print(f"\n⚡ Fast path (threshold {router.threshold:.2f}): {report['fast_path']}/{report['requests']} requests "
+          f"({report['fast_path_share']:.0%}) answered without the LLM {report['fast_path_intents']}")
+    print(f"   p50 latency: fast path {report['fast_path_p50_ms']:.2f}ms, LLM {report['llm_p50_ms']:.0f}ms; "
+          f"mean {report['mean_ms']:.0f}ms per request, ~{report['saved_ms'] / 1000:.1f}s saved")
+
+def demonstrate_classifier(threshold: float = DEFAULT_THRESHOLD):
+    """Show the classifier's decisions and confidence on sample messages, offline"""
+    classifier = KeywordIntentClassifier()
+    messages = [
+        "Where is my order ORD-1042?",
+        "Hi, what's the status of my order? It was shipped last week.",
+        "I forgot my password, how do I reset my password?",
+        "What are your support hours?",
+        "I've been trying to reset my password for 2 hours and nothing works! This is ridiculous!",
+        "My order arrived but I was charged twice",
+        "I want to cancel my order",
+        "I never received my order and want my money back",
+        "Can I change the delivery address on my order?",
+        "The app keeps crashing every time I try to upload a file."
+    ]
+    print(f"\n🔀 Tiered Router Decisions (threshold {threshold:.2f})")
+    print("=" * 60)
+    for message in messages:
+        start = time.perf_counter()
+        prediction = classifier.classify(message)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        fast = (prediction.intent in FAST_PATH_TEMPLATES and prediction.confidence >= threshold
+                and prediction.sentiment_score >= 0 and FAST_PATH_TEMPLATES[prediction.intent].answers(message))
+        print(f"{'⚡ fast path' if fast else '🤖 LLM     '} {prediction.intent:<15} "
+              f"confidence={prediction.confidence:.2f} ({elapsed_us:.0f}µs)  '{message}'")
+
+if __name__ == "__main__":
+    demonstrate_classifier()
@@ -0,0 +1,259 @@
+"""
+Block Compression for Cold Conversation History
+
+Most stored turns are never read again once a session goes idle, but they still
+take RAM (compact histories) and disk (transcript segments). This module compresses
+them in blocks:
+
+- Blocks: a few dozen messages (or ~16 KB of records) are compressed together, so a
+  resumed session decompresses only the blocks it reads
+- Codecs: zlib with a preset dictionary (default) or lzma; HISTORY_COMPRESSION picks one
+- Trained dictionary: customer service chats repeat the same phrases, and short blocks
+  compress poorly without them; train_dictionary() keeps the most valuable recurring
+  phrases of sample text, up to zlib's 32 KB window
+- Every block names its codec and dictionary, so old blocks stay readable after the
+  dictionary is retrained
+- Stats: raw and compressed bytes (the ratio), blocks decompressed and their latency
+
+CompactChatMessageHistory.compress() and TranscriptStore.compress_session() use it.
+Run `python cold_compression.py` to compare codecs on synthetic support chats.
+"""
+
+import os
+import re
+import lzma
+import time
+import zlib
+import random
+import struct
+import threading
+from collections import Counter
+from typing import Dict, List, Any, Iterable, Optional
+
+DEFAULT_CODEC = os.getenv("HISTORY_COMPRESSION", "zlib")
+DICTIONARY_BYTES = 32 * 1024  # zlib only looks back 32 KB, so a larger dictionary is wasted
+
+BLOCK_HEADER = struct.Struct("<BI")  # codec, dictionary id (0 = none)
+CODECS = {"none": 0, "zlib": 1, "lzma": 2}
+
+# Phrases from the examples' conversations; train_dictionary() on real transcripts does better
+SUPPORT_SAMPLES = [
+    "I can't log into my account. The password reset isn't working.",
+    "I tried that already. It's been 2 hours and nothing works!",
+    "Can you just reset it for me? I have an important meeting in 30 minutes.",
+    "Thanks! That worked. You're the best!",
+    "My bill is much higher than usual this month.",
+    "It's $200 more than last month. I don't understand why.",
+    "Can you explain what the extra charges are for?",
+    "That makes sense now. Thanks for clarifying.",
+    "Hi, I'm interested in upgrading my plan.",
+    "What are the main differences between basic and premium?",
+    "How much more does the premium plan cost?",
+    "Perfect! I'd like to upgrade to premium.",
+    "My order still hasn't arrived and the tracking page is blank.",
+    "I was charged twice for the same order.",
+    "The app keeps crashing when I open it.",
+    "I need a copy of my invoice for last month.",
+    "Thank you for reaching out. I understand your concern and how much this matters to you.",
+    "I've passed it to our technical team, who will follow up within 2 hours.",
+    "I've passed it to our billing team, who will follow up within 24 hours.",
+    "Is there anything else I can help with in the meantime?",
+    "I'm sorry for the inconvenience. Let me look into your account.",
+    "Please try clearing your browser cache and requesting a new reset link.",
+    "I've escalated this to a specialist who will contact you shortly.",
+    "Your refund has been processed and should appear within 5-7 business days.",
+    "Could you confirm the email address associated with your account?",
+]
+
+# Phrases no dictionary is trained on: the demo measures on these, as real chats differ from the training set
+HELD_OUT_SAMPLES = [
+    "The discount code from your newsletter says it has expired.",
+    "I moved house last week and need to change my delivery address.",
+    "Why was my card declined when there is money in the account?",
+    "The headphones I received are the wrong colour.",
+    "Can I pause my subscription while I'm travelling?",
+    "Your website logged me out in the middle of checkout.",
+    "I'd like to close my account and delete my data.",
+    "The parcel was left outside in the rain and the box is soaked.",
+    "Let me check the status of that shipment with the courier.",
+    "I can see the payment attempt failed at the bank's end.",
+    "We can send a replacement in the correct colour at no cost.",
+    "Your subscription can be paused for up to three months.",
+    "I've updated the delivery address for your open orders.",
+    "Sorry about the expired code; here is a new one for 15% off.",
+]
+
+class CompressionStats:
+    """Bytes in and out of compression, and what decompression costs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.blocks = self.raw_bytes = self.compressed_bytes = 0
+        self.decompressions = 0
+        self.decompress_ms = 0.0
+
+    def add_block(self, raw: int, compressed: int):
+        with self._lock:
+            self.blocks += 1
+            self.raw_bytes += raw
+            self.compressed_bytes += compressed
+
+    def add_decompression(self, elapsed_ms: float):
+        with self._lock:
+            self.decompressions += 1
+            self.decompress_ms += elapsed_ms
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "blocks": self.blocks,
+                "raw_bytes": self.raw_bytes,
+                "compressed_bytes": self.compressed_bytes,
+                "ratio": self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0,
+                "decompressions": self.decompressions,
+                "decompress_ms_avg": self.decompress_ms / self.decompressions if self.decompressions else 0.0
+            }
+
+compression_stats = CompressionStats()
+
+def train_dictionary(samples: Iterable[str], size: int = DICTIONARY_BYTES) -> bytes:
+    """A zlib preset dictionary of the phrases (1-6 word runs) that recur most in `samples`"""
+    counts = Counter()
+    for sample in samples:
+        words = re.findall(r"\S+", sample)
+        for n in range(1, 7):
+            for i in range(len(words) - n + 1):
+                counts[" ".join(words[i:i + n])] += 1
+    # A phrase is worth what it saves: its length times how often it recurs
+    ranked = sorted((phrase for phrase, count in counts.items() if count > 1 or len(phrase) > 24),
+                    key=lambda phrase: counts[phrase] * len(phrase), reverse=True)
+    chosen, used = [], 0
+    for phrase in ranked:
+        encoded = phrase.encode("utf-8") + b" "
+        if used + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        used += len(encoded)
+    # zlib finds matches near the end of the dictionary most cheaply, so the best phrases go last
+    return b"".join(reversed(chosen))
+
+_dictionaries: Dict[int, bytes] = {}
+_active_dictionary_id = 0
+_dictionary_lock = threading.Lock()
+
+def register_dictionary(dictionary: bytes) -> int:
+    """Make a dictionary available for decompression; returns its id (a CRC32 of its bytes)"""
+    dictionary_id = zlib.crc32(dictionary) or 1
+    with _dictionary_lock:
+        _dictionaries[dictionary_id] = dictionary
+    return dictionary_id
+
+def set_dictionary(dictionary: bytes) -> int:
+    """Compress new blocks with this dictionary (e.g. one trained on real transcripts)"""
+    global _active_dictionary_id
+    _active_dictionary_id = register_dictionary(dictionary)
+    return _active_dictionary_id
+
+def get_dictionary(dictionary_id: Optional[int] = None) -> bytes:
+    """A registered dictionary, by default the active one (trained on SUPPORT_SAMPLES unless set)"""
+    if not _active_dictionary_id:
+        set_dictionary(train_dictionary(SUPPORT_SAMPLES))
+    dictionary_id = dictionary_id or _active_dictionary_id
+    if dictionary_id not in _dictionaries:
+        raise KeyError(f"compression dictionary {dictionary_id:08x} is not registered")
+    return _dictionaries[dictionary_id]
+
+def active_dictionary_id() -> int:
+    get_dictionary()
+    return _active_dictionary_id
+
+def compress_block(data: bytes, codec: str = DEFAULT_CODEC) -> bytes:
+    """Header (codec, dictionary id) plus the compressed data"""
+    if codec == "zlib":
+        dictionary_id = active_dictionary_id()
+        compressor = zlib.compressobj(level=9, zdict=get_dictionary(dictionary_id))
+        payload = compressor.compress(data) + compressor.flush()
+    elif codec == "lzma":
+        dictionary_id = 0
+        payload = lzma.compress(data, format=lzma.FORMAT_ALONE, preset=6)
+    elif codec == "none":
+        dictionary_id, payload = 0, data
+    else:
+        raise ValueError(f"unknown compression codec '{codec}' (expected zlib, lzma or none)")
+    block = BLOCK_HEADER.pack(CODECS[codec], dictionary_id) + payload
+    compression_stats.add_block(len(data), len(block))
+    return block
+
+def decompress_block(block) -> bytes:
+    """The data of a block written by compress_block()"""
+    start = time.perf_counter()
+    codec, dictionary_id = BLOCK_HEADER.unpack_from(block)
+    payload = bytes(block[BLOCK_HEADER.size:])
+    if codec == CODECS["zlib"]:
+        decompressor = zlib.decompressobj(zdict=get_dictionary(dictionary_id))
+        data = decompressor.decompress(payload) + decompressor.flush()
+    elif codec == CODECS["lzma"]:
+        data = lzma.decompress(payload, format=lzma.FORMAT_ALONE)
+    else:
+        data = payload
+    compression_stats.add_decompression((time.perf_counter() - start) * 1000)
+    return data
+
+def print_compression_stats():
+    """Print the compression ratio and decompression latency so far"""
+    report = compression_stats.report()
+    if not report["blocks"] and not report["decompressions"]:
+        return
+    print(f"🧊 Cold history: {report['blocks']} blocks compressed, {report['raw_bytes'] / 1024:.0f} KB -> "
+          f"{report['compressed_bytes'] / 1024:.0f} KB ({report['ratio']:.1f}x), "
+          f"{report['decompressions']} blocks decompressed ({report['decompress_ms_avg']:.3f} ms avg)")
+
+def synthetic_conversation(rng: random.Random, turns: int, samples: List[str] = SUPPORT_SAMPLES,
+                           customer_samples: int = 16) -> List[str]:
+    """Support-chat messages built from sample phrases (the first `customer_samples` are the customer's)"""
+    messages = []
+    for _ in range(turns):
+        customer = rng.choice(samples[:customer_samples]).replace("2 hours", f"{rng.randint(2, 9)} hours")
+        messages.append(f"{customer} Order #{rng.randint(10000, 99999)}.")
+        messages.append(" ".join(rng.sample(samples[customer_samples:], 2)))
+    return messages
+
+def demonstrate_cold_compression(sessions: int = 500, turns: int = 10, block_messages: int = 32):
+    """Compression ratio of each codec on idle support sessions, and the cost of reading them back"""
+    rng = random.Random(7)
+    # Half the measured sessions use phrases the dictionaries never saw, so the ratios aren't just memorised text
+    conversations = [synthetic_conversation(rng, turns) if i % 2 else
+                     synthetic_conversation(rng, turns, HELD_OUT_SAMPLES, customer_samples=8)
+                     for i in range(sessions)]
+    # Train on other conversations than the ones measured, as with a dictionary trained on older transcripts
+    training = [message for _ in range(200) for message in synthetic_conversation(rng, turns)]
+
+    print("\n🧊 Cold History Compression Demo")
+    print("=" * 60)
+    print(f"{sessions} idle sessions x {turns} turns, blocks of {block_messages} messages "
+          f"(half built from phrases outside every dictionary's training data)\n")
+    for name, codec, dictionary in (("zlib", "zlib", b""), ("zlib + sample dictionary", "zlib", None),
+                                    ("zlib + trained dictionary", "zlib", train_dictionary(training)),
+                                    ("lzma", "lzma", None)):
+        if codec == "zlib":
+            set_dictionary(dictionary if dictionary is not None else train_dictionary(SUPPORT_SAMPLES))
+        compression_stats.reset()
+        blocks = []
+        start = time.perf_counter()
+        for messages in conversations:
+            for i in range(0, len(messages), block_messages):
+                blocks.append(compress_block("\n".join(messages[i:i + block_messages]).encode("utf-8"), codec))
+        compress_ms = (time.perf_counter() - start) * 1000 / len(blocks)
+        for block in blocks[:200]:
+            decompress_block(block)
+        report = compression_stats.report()
+        print(f"{name:<28} {report['ratio']:>5.1f}x  ({report['compressed_bytes'] / len(conversations):>5.0f} "
+              f"bytes/session, compress {compress_ms:.3f} ms, decompress {report['decompress_ms_avg']:.3f} ms "
+              f"per block)")
+    set_dictionary(train_dictionary(SUPPORT_SAMPLES))
+
+if __name__ == "__main__":
+    demonstrate_cold_compression()
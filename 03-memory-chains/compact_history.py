@@ -0,0 +1,360 @@
+"""
+Compact Slotted Message Histories
+
+ChatMessageHistory keeps every message as a pydantic HumanMessage/AIMessage, and
+with thousands of resident sessions the per-object overhead (~800 bytes) outweighs
+the text itself. CompactChatMessageHistory stores a session's messages column-wise:
+
+- Parallel arrays: one byte per message for the role, eight for the timestamp and
+  four for where its content ends in the buffer
+- Interned roles: human, ai and system are small integer codes (the transcript
+  store's record kinds); other messages are kept as JSON under their own code
+- One growable UTF-8 buffer holds the content of all messages
+- Lazy views: `message_view` is a sequence view that builds BaseMessage objects
+  only for the items a prompt actually reads (e.g. the window slice); `messages` is
+  the plain list BaseChatMessageHistory promises, built on each call
+- Cold compression: compress() packs the content into compressed blocks (see
+  cold_compression.py) and then freezes the whole history, arrays included, into
+  one compressed blob, since for short sessions the arrays outweigh the text; the
+  first read or append thaws it, reads decompress only the block they need, and
+  new messages go to a plain buffer again
+- Thread safety: one lock guards every read and write, so a summary worker reading
+  the history never sees compress() half done
+- Snapshots: to_bytes()/from_bytes() copy the arrays, blocks and buffer as they
+  are, so saving and restoring a session never builds message objects
+
+It is a BaseChatMessageHistory, so memory classes take it as `chat_memory`; the
+memories here (TokenWindowMemory, SummaryWindowMemory) and the session pool read it
+through lazy_messages(), so a turn only builds the messages it uses. Memories that
+prune by popping from `chat_memory.messages` (ConversationSummaryBufferMemory) do
+not work with it: the list is a copy, so the pool rejects them. Run
+`python compact_history.py` to compare bytes per message at 1M messages.
+"""
+
+import sys
+import json
+import time
+import bisect
+import struct
+import threading
+import tracemalloc
+from array import array
+from collections.abc import Sequence as SequenceABC
+from typing import List, Optional, Sequence, Set, Union
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, message_to_dict, messages_from_dict
+
+from cold_compression import DEFAULT_CODEC, BLOCK_HEADER, compress_block, decompress_block
+from transcript_store import KIND_JSON, KIND_BY_TYPE, CLASS_BY_KIND
+
+BLOCK_MESSAGES = 32
+# messages, compressed messages, content bytes in blocks, blocks, plain buffer bytes
+DUMP_HEADER = struct.Struct("<IIIII")
+
+class MessageView(SequenceABC):
+    """Read-only sequence over a compact history; items are materialized on access"""
+
+    __slots__ = ("_history",)
+
+    def __init__(self, history: "CompactChatMessageHistory"):
+        self._history = history
+
+    def __len__(self) -> int:
+        return self._history._length()
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[BaseMessage, List[BaseMessage]]:
+        if isinstance(index, slice):
+            return [self._history._message(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        return self._history._message(index)
+
+    def __repr__(self) -> str:
+        return f"MessageView({len(self)} messages)"
+
+class CompactChatMessageHistory(BaseChatMessageHistory):
+    """Chat history in parallel arrays and one UTF-8 buffer instead of a list of message objects"""
+
+    def __init__(self, messages: Optional[Sequence[BaseMessage]] = None):
+        self._lock = threading.RLock()
+        self.clears = -1  # clear() calls after construction, so owners notice one that left the length unchanged
+        self.clear()
+        if messages:
+            self.add_messages(messages)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """Every message as an object (what other memory classes expect); see message_view"""
+        return list(MessageView(self))
+
+    @property
+    def message_view(self) -> MessageView:
+        """The messages as a lazy sequence: only the items read are materialized"""
+        return MessageView(self)
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            self._thaw()
+            self._append(messages)
+
+    def _append(self, messages: Sequence[BaseMessage]):
+        now = time.time()
+        for message in messages:
+            kind = KIND_BY_TYPE.get(message.type, KIND_JSON)
+            if kind != KIND_JSON and isinstance(message.content, str) and not message.additional_kwargs:
+                content = message.content
+            else:
+                kind = KIND_JSON
+                content = json.dumps(message_to_dict(message), separators=(",", ":"))
+            self._buffer += content.encode("utf-8")
+            self._roles.append(kind)
+            self._timestamps.append(now)
+            # Appended last: readers use len(_ends), so a half-added message is never visible
+            self._ends.append(self._compressed_bytes + len(self._buffer))
+
+    def _length(self) -> int:
+        with self._lock:
+            return self._frozen_length if self._frozen is not None else len(self._ends)
+
+    def _message(self, index: int) -> BaseMessage:
+        with self._lock:
+            self._thaw()
+            start = self._ends[index - 1] if index else 0
+            end = self._ends[index]
+            if index < self._compressed_messages:
+                block_start, data = self._block(bisect.bisect_right(self._block_starts, index) - 1)
+                content = data[start - block_start:end - block_start].decode("utf-8")
+            else:
+                content = self._buffer[start - self._compressed_bytes:end - self._compressed_bytes].decode("utf-8")
+            kind = self._roles[index]
+        if kind == KIND_JSON:
+            return messages_from_dict([json.loads(content)])[0]
+        return CLASS_BY_KIND[kind](content=content)
+
+    def timestamp(self, index: int) -> float:
+        """When message `index` was added (unix time)"""
+        with self._lock:
+            self._thaw()
+            return self._timestamps[index]
+
+    def _block(self, block: int):
+        """(content offset, data) of a compressed block; the last one read stays decompressed"""
+        if self._cached_block is None or self._cached_block[0] != block:
+            first = self._block_starts[block]
+            offset = self._ends[first - 1] if first else 0
+            self._cached_block = (block, offset, decompress_block(self._blocks[block]))
+        return self._cached_block[1:]
+
+    def compress(self, codec: str = DEFAULT_CODEC) -> int:
+        """Compress the plain buffer into blocks, then freeze the history into one blob; returns bytes saved"""
+        with self._lock:
+            if self._frozen is not None or not self._ends:
+                return 0
+            before = self.nbytes()
+            self._compress_buffer(codec)
+            # The arrays and the block list cost more than short sessions' compressed text
+            self._frozen_length = len(self._ends)
+            self._frozen = compress_block(self._dump(), codec)
+            self._roles = self._timestamps = self._ends = self._block_starts = None
+            self._buffer = self._blocks = self._cached_block = None
+            self._blocks_bytes = 0
+            return before - self.nbytes()
+
+    def _thaw(self):
+        """Unpack a frozen history (caller holds the lock); its blocks stay compressed"""
+        if self._frozen is None:
+            return
+        self._load(decompress_block(self._frozen))
+        self._frozen = None
+
+    def _compress_buffer(self, codec: str):
+        """Move the plain buffer into compressed blocks of BLOCK_MESSAGES messages"""
+        count = len(self._ends)
+        if count == self._compressed_messages:
+            return
+        if self._blocks and len(self._ends) - self._block_starts[-1] <= BLOCK_MESSAGES:
+            # Refill the last, partly filled block rather than adding another small one
+            block_start, data = self._block(len(self._blocks) - 1)
+            self._buffer = bytearray(data) + self._buffer
+            self._blocks_bytes -= sys.getsizeof(self._blocks.pop())
+            self._compressed_messages = self._block_starts.pop()
+            self._compressed_bytes = block_start
+        for first in range(self._compressed_messages, count, BLOCK_MESSAGES):
+            last = min(first + BLOCK_MESSAGES, count)
+            start = (self._ends[first - 1] if first else 0) - self._compressed_bytes
+            block = compress_block(bytes(self._buffer[start:self._ends[last - 1] - self._compressed_bytes]), codec)
+            self._blocks.append(block)
+            self._blocks_bytes += sys.getsizeof(block)
+            self._block_starts.append(first)
+        self._compressed_messages = count
+        self._compressed_bytes = self._ends[-1]
+        self._buffer = bytearray()
+        self._cached_block = None
+
+    @property
+    def compressed_messages(self) -> int:
+        """Messages whose content is in compressed blocks"""
+        with self._lock:
+            return self._frozen_length if self._frozen is not None else self._compressed_messages
+
+    def dictionary_ids(self) -> Set[int]:
+        """Compression dictionaries its blocks need (a restoring process must register them)"""
+        with self._lock:
+            if self._frozen is not None:
+                return CompactChatMessageHistory.from_bytes(self.to_bytes()).dictionary_ids()
+            return {BLOCK_HEADER.unpack_from(block)[1] for block in self._blocks} - {0}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.clears += 1
+            self._roles = array("B")
+            self._timestamps = array("d")
+            self._ends = array("I")  # End offset of each message's content (compressed blocks, then _buffer)
+            self._buffer = bytearray()
+            self._blocks: List[bytes] = []
+            self._blocks_bytes = 0
+            self._block_starts = array("I")  # First message of each block
+            self._compressed_messages = 0
+            self._compressed_bytes = 0  # Content bytes in blocks; _buffer starts at this offset
+            self._cached_block = None
+            self._frozen: Optional[bytes] = None  # Whole history as one compressed to_bytes() blob when cold
+            self._frozen_length = 0
+
+    def to_bytes(self) -> bytes:
+        """The history's header, arrays (native byte order), blocks and buffer; see from_bytes()"""
+        with self._lock:
+            # A frozen history is this very dump, compressed; unpack it without thawing the history
+            return decompress_block(self._frozen) if self._frozen is not None else self._dump()
+
+    def _dump(self) -> bytes:
+        header = DUMP_HEADER.pack(len(self._ends), self._compressed_messages, self._compressed_bytes,
+                                  len(self._blocks), len(self._buffer))
+        return b"".join([header, self._roles.tobytes(), self._timestamps.tobytes(), self._ends.tobytes(),
+                         self._block_starts.tobytes(), array("I", map(len, self._blocks)).tobytes(),
+                         *self._blocks, self._buffer])
+
+    @classmethod
+    def from_bytes(cls, data, swap_bytes: bool = False) -> "CompactChatMessageHistory":
+        """Rebuild a history from to_bytes() output (swap_bytes if it came from the other byte order)"""
+        history = cls()
+        history._load(data, swap_bytes)
+        return history
+
+    def _load(self, data, swap_bytes: bool = False):
+        """Replace the arrays, blocks and buffer with a to_bytes() dump (caller holds the lock or owns self)"""
+        data = memoryview(data)
+        # The header is little-endian everywhere; only the arrays are in native order
+        count, compressed_messages, compressed_bytes, blocks, buffer_bytes = DUMP_HEADER.unpack_from(data)
+        position = DUMP_HEADER.size
+
+        def take(length: int) -> memoryview:
+            nonlocal position
+            position += length
+            return data[position - length:position]
+
+        roles, timestamps, ends, block_starts, lengths = array("B"), array("d"), array("I"), array("I"), array("I")
+        roles.frombytes(take(count))
+        timestamps.frombytes(take(count * timestamps.itemsize))
+        ends.frombytes(take(count * ends.itemsize))
+        block_starts.frombytes(take(blocks * block_starts.itemsize))
+        lengths.frombytes(take(blocks * lengths.itemsize))
+        if swap_bytes:
+            for values in (timestamps, ends, block_starts, lengths):
+                values.byteswap()
+        self._roles, self._timestamps, self._ends, self._block_starts = roles, timestamps, ends, block_starts
+        self._compressed_messages, self._compressed_bytes = compressed_messages, compressed_bytes
+        self._blocks = [bytes(take(length)) for length in lengths]
+        self._blocks_bytes = sum(sys.getsizeof(block) for block in self._blocks)
+        self._buffer = bytearray(take(buffer_bytes))
+        self._cached_block = None
+
+    def nbytes(self) -> int:
+        """Bytes held by this history, including array and buffer headers"""
+        with self._lock:
+            if self._frozen is not None:
+                return sys.getsizeof(self) + sys.getsizeof(self._frozen)
+            cached = sys.getsizeof(self._cached_block[2]) if self._cached_block else 0
+            return (sys.getsizeof(self) + sys.getsizeof(self._roles) + sys.getsizeof(self._timestamps)
+                    + sys.getsizeof(self._ends) + sys.getsizeof(self._buffer) + sys.getsizeof(self._blocks)
+                    + self._blocks_bytes + sys.getsizeof(self._block_starts) + cached)
+
+def lazy_messages(history: BaseChatMessageHistory) -> Sequence[BaseMessage]:
+    """A history's messages, through the lazy view for compact histories"""
+    if isinstance(history, CompactChatMessageHistory):
+        return history.message_view
+    return history.messages
+
+def _measure(build) -> int:
+    """Bytes allocated (and still live) by build()"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return allocated
+
+def demonstrate_compact_history(total_messages: int = 1_000_000, sessions: int = 10_000):
+    """Bytes per message with message objects versus compact histories, spread over many sessions"""
+    per_session = total_messages // sessions
+    texts = [(f"Turn {i}: my order still hasn't arrived, can you check the tracking?",
+              f"Sorry about that! Turn {i}: I've asked the carrier and will update you by email.")
+             for i in range(per_session // 2)]
+
+    # Each session gets its own strings, as real conversations would
+    def as_objects():
+        histories = []
+        for session in range(sessions):
+            messages = []
+            for customer, agent in texts:
+                messages += [HumanMessage(content=f"{customer} #{session}"),
+                             AIMessage(content=f"{agent} #{session}")]
+            histories.append(messages)
+        return histories
+
+    def as_compact():
+        histories = []
+        for session in range(sessions):
+            history = CompactChatMessageHistory()
+            for customer, agent in texts:
+                history.add_messages([HumanMessage(content=f"{customer} #{session}"),
+                                      AIMessage(content=f"{agent} #{session}")])
+            histories.append(history)
+        return histories
+
+    content_bytes = (sum(len(customer.encode()) + len(agent.encode()) for customer, agent in texts) * sessions
+                     + sum(len(f" #{session}") for session in range(sessions)) * 2 * len(texts))
+    count = per_session // 2 * 2 * sessions
+    print("\n🗜️  Compact History Demo")
+    print("=" * 60)
+    print(f"{count:,} messages in {sessions:,} sessions (text alone: {content_bytes / count:.0f} bytes/message)\n")
+
+    results = {}
+    for name, build in (("HumanMessage/AIMessage objects", as_objects), ("CompactChatMessageHistory", as_compact)):
+        start = time.perf_counter()
+        allocated = _measure(build)
+        results[name] = allocated
+        print(f"{name:<32} {allocated / 1e6:>8.1f} MB  {allocated / count:>6.0f} bytes/message  "
+              f"(built in {time.perf_counter() - start:.1f}s)")
+    objects, compact = results.values()
+    print(f"\n📉 {objects / compact:.1f}x less memory for the same messages")
+
+    # Rendering a prompt only builds the messages it uses
+    history = CompactChatMessageHistory()
+    for customer, agent in texts:
+        history.add_messages([HumanMessage(content=customer), AIMessage(content=agent)])
+    start = time.perf_counter()
+    window = history.message_view[-6:]
+    print(f"🔎 Materializing a 6-message window: {(time.perf_counter() - start) * 1e6:.0f} µs "
+          f"('{window[-1].content[:40]}...')")
+
+if __name__ == "__main__":
+    demonstrate_compact_history()
@@ -0,0 +1,323 @@
+"""
+Shared Model Clients and HTTP Connection Pooling
+
+Every `create_*` function used to construct its own ChatOpenAI, and every ChatOpenAI
+builds its own OpenAI SDK client with its own HTTP connection pool. A four-step
+pipeline therefore opened at least four connections to the API, each paying a TCP
+and TLS handshake before its first request, and code that builds a chain per
+request paid those handshakes on every message.
+
+`get_chat_model()` hands out shared, thread-safe ChatOpenAI instances instead:
+- Key: (model, temperature, max_tokens) plus any other constructor options
+  (streaming, tags, cache), so identical settings return the same object
+- Transport: all models share one OpenAI SDK client on one keep-alive httpx pool,
+  so a connection opened by one step is reused by the next
+- Pool: LLM_HTTP_POOL_SIZE connections (keep it at least as large as the batch
+  concurrency), idle ones closed after LLM_HTTP_KEEPALIVE_SECONDS
+- Stats: requests, new connections, TLS handshakes and the connection reuse rate
+- Backend: LLM_BACKEND=fake returns offline FakeChatModels (see fake_llm.py) from
+  the same calls, so every chain runs without OPENAI_API_KEY
+
+Shared models must not be mutated; pass callbacks per call through `config`.
+Run `python llm_clients.py` to compare per-step clients with the shared pool
+against a local mock of the chat completions API.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+import httpx
+import openai
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from fake_llm import FakeChatModel, print_fake_llm_stats
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_POOL_SIZE = int(os.getenv("LLM_HTTP_POOL_SIZE", "20"))
+DEFAULT_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+
+def llm_backend() -> str:
+    """The configured model backend: openai (default) or fake"""
+    return os.getenv("LLM_BACKEND", "openai").lower()
+
+def using_fake_llm() -> bool:
+    """True when chains get the offline fake model, so no API key is needed"""
+    return llm_backend() == "fake"
+
+class ConnectionStats:
+    """Requests sent and connections opened on a pooled transport"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+
+    def trace(self, event: str, info: Dict[str, Any]) -> None:
+        """httpcore trace callback: sees every connection the pool opens"""
+        if event.endswith("connect_tcp.complete"):
+            with self._lock:
+                self.connections += 1
+        elif event.endswith("start_tls.complete"):
+            with self._lock:
+                self.tls_handshakes += 1
+
+    async def atrace(self, event: str, info: Dict[str, Any]) -> None:
+        self.trace(event, info)
+
+    def on_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    async def on_async_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.atrace
+
+    def report(self) -> Dict[str, Any]:
+        """Counters plus how many requests went out on an already open connection"""
+        with self._lock:
+            requests, connections, tls_handshakes = self.requests, self.connections, self.tls_handshakes
+        reused = max(requests - connections, 0)
+        return {
+            "requests": requests,
+            "connections": connections,
+            "tls_handshakes": tls_handshakes,
+            "reused": reused,
+            "reuse_rate": reused / requests if requests else 0.0
+        }
+
+def _freeze(value: Any) -> Any:
+    """Make constructor options hashable so they can be part of the key"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+class ChatModelFactory:
+    """Builds each ChatOpenAI configuration once, all on one pooled HTTP transport"""
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, keepalive_seconds: float = DEFAULT_KEEPALIVE_SECONDS,
+                 base_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+        self.base_url = base_url
+        self.api_key = api_key
+        self.stats = ConnectionStats()
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple, BaseChatModel] = {}
+        self._clients: Optional[Tuple[openai.OpenAI, openai.AsyncOpenAI]] = None
+
+    def _sdk_clients(self) -> Tuple[openai.OpenAI, openai.AsyncOpenAI]:
+        """Create the shared SDK clients on first use (they read OPENAI_API_KEY then)"""
+        if self._clients is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size,
+                                  keepalive_expiry=self.keepalive_seconds)
+            base_url = self.base_url or os.getenv("OPENAI_API_BASE") or None
+            self._clients = (
+                openai.OpenAI(api_key=self.api_key, base_url=base_url, http_client=httpx.Client(
+                    limits=limits, event_hooks={"request": [self.stats.on_request]})),
+                openai.AsyncOpenAI(api_key=self.api_key, base_url=base_url, http_client=httpx.AsyncClient(
+                    limits=limits, event_hooks={"request": [self.stats.on_async_request]}))
+            )
+        return self._clients
+
+    def get(self, model: str = DEFAULT_MODEL, temperature: float = 0.7, max_tokens: Optional[int] = None,
+            **options: Any) -> BaseChatModel:
+        """Return the shared model for these settings, creating it on first use"""
+        backend = llm_backend()
+        key = (backend, model, temperature, max_tokens, _freeze(options))
+        with self._lock:
+            llm = self._models.get(key)
+            if llm is None and backend == "fake":
+                llm = FakeChatModel(model=model, temperature=temperature, max_tokens=max_tokens, **options)
+                self._models[key] = llm
+            elif llm is None:
+                client, async_client = self._sdk_clients()
+                if self.api_key:
+                    options.setdefault("openai_api_key", self.api_key)
+                # Prebuilt clients stop ChatOpenAI from creating its own SDK client and pool
+                llm = ChatOpenAI(model=model, temperature=temperature, max_tokens=max_tokens,
+                                 client=client.chat.completions, async_client=async_client.chat.completions,
+                                 **options)
+                self._models[key] = llm
+            return llm
+
+    def report(self) -> Dict[str, Any]:
+        """Connection statistics plus the number of distinct model configurations"""
+        report = self.stats.report()
+        report["models"] = len(self._models)
+        report["pool_size"] = self.pool_size
+        return report
+
+    def close(self):
+        """Close the pooled connections; models handed out before must not be used afterwards"""
+        with self._lock:
+            if self._clients is not None:
+                self._clients[0].close()
+            self._clients = None
+            self._models.clear()
+
+# One factory per process, shared by every chain
+_factory: Optional[ChatModelFactory] = None
+_factory_lock = threading.Lock()
+
+def get_client_factory() -> ChatModelFactory:
+    """Return the process-wide model factory"""
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = ChatModelFactory()
+        return _factory
+
+def get_chat_model(model: str = DEFAULT_MODEL, temperature: float = 0.7, max_tokens: Optional[int] = None,
+                   **options: Any) -> BaseChatModel:
+    """Shared model for (model, temperature, max_tokens, options): ChatOpenAI on the pooled transport, or the fake"""
+    return get_client_factory().get(model=model, temperature=temperature, max_tokens=max_tokens, **options)
+
+def print_client_stats():
+    """Print connection reuse on the shared transport (or what the fake backend served)"""
+    if using_fake_llm():
+        print_fake_llm_stats()
+        return
+    report = get_client_factory().report()
+    if not report["requests"]:
+        return
+    print(f"🔌 HTTP pool: {report['requests']} requests on {report['connections']} connections "
+          f"({report['reuse_rate']:.0%} reused, {report['tls_handshakes']} TLS handshakes), "
+          f"{report['models']} shared model clients, pool size {report['pool_size']}")
+
+class MockChatCompletionsServer(ThreadingHTTPServer):
+    """Local stand-in for the chat completions endpoint that counts the connections it accepts"""
+
+    daemon_threads = True
+
+    def __init__(self, latency_seconds: float = 0.02, port: int = 0):
+        self.latency_seconds = latency_seconds
+        self.connections = 0
+        self._count_lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), _MockChatCompletionsHandler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def record_connection(self):
+        with self._count_lock:
+            self.connections += 1
+
+    def start(self) -> "MockChatCompletionsServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class _MockChatCompletionsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    def setup(self):
+        super().setup()
+        # Headers and body are separate writes; without this, delayed ACKs add ~40ms per request
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.record_connection()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.server.latency_seconds)
+        model = request.get("model", DEFAULT_MODEL)
+        words = ["Thanks", " for", " reaching", " out", "!"]
+
+        if request.get("stream"):
+            chunks = [{"choices": [{"index": 0, "delta": {"role": "assistant", "content": word}, "finish_reason": None}]}
+                      for word in words]
+            chunks.append({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            body = "".join(
+                "data: " + json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk",
+                                       "created": int(time.time()), "model": model, **chunk}) + "\n\n"
+                for chunk in chunks
+            ) + "data: [DONE]\n\n"
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)}
+            })
+            content_type = "application/json"
+
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def demonstrate_connection_pooling(messages: int = 40, max_concurrency: int = 4):
+    """Count connections for per-step clients, per-request clients and the shared pool, offline"""
+    # (temperature, max_tokens, streaming) of the four customer service steps
+    steps = [(0.3, 200, False), (0.3, 150, False), (0.2, 150, False), (0.7, 300, True)]
+    server = MockChatCompletionsServer().start()
+    api = {"openai_api_key": "mock-key", "openai_api_base": server.base_url}
+
+    def own_client(temperature: float, max_tokens: int, streaming: bool) -> ChatOpenAI:
+        return ChatOpenAI(model=DEFAULT_MODEL, temperature=temperature, max_tokens=max_tokens,
+                          streaming=streaming, **api)
+
+    per_step = [own_client(*step) for step in steps]
+    factory = ChatModelFactory(pool_size=max_concurrency, base_url=server.base_url, api_key="mock-key")
+
+    scenarios = {
+        "client per request": lambda step: own_client(*steps[step]),
+        "client per step": lambda step: per_step[step],
+        "shared pool": lambda step: factory.get(temperature=steps[step][0], max_tokens=steps[step][1],
+                                                streaming=steps[step][2])
+    }
+
+    print("\n🔌 Connection Pooling Demo")
+    print("=" * 60)
+    print(f"{messages} messages x {len(steps)} steps, {max_concurrency} messages at a time, "
+          f"against a local mock API\n")
+    for name, model_for_step in scenarios.items():
+        def run_message(index: int):
+            for step in range(len(steps)):
+                model_for_step(step).invoke(f"Customer message {index}, step {step}")
+
+        connections_before = server.connections
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            list(executor.map(run_message, range(messages)))
+        elapsed = time.perf_counter() - start
+        connections = server.connections - connections_before
+        requests = messages * len(steps)
+        print(f"{name:<20} {connections:>4} connections for {requests} requests "
+              f"({1 - connections / requests:.0%} reused), {elapsed:.2f}s")
+
+    report = factory.report()
+    print(f"\nShared pool, client side: {report['requests']} requests, {report['connections']} new connections, "
+          f"{report['models']} model clients")
+    print("Against the real API every new connection also costs a TLS handshake (2-3 extra round trips).")
+    factory.close()
+    server.stop()
+
+if __name__ == "__main__":
+    demonstrate_connection_pooling()
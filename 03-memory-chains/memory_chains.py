@@ -7,30 +7,38 @@ to maintain context across multiple interactions.
 """
 
 import os
-import json
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain, SequentialChain, ConversationChain
 from langchain.memory import ConversationBufferMemory, ConversationSummaryMemory
 from langchain.schema import HumanMessage, AIMessage
 from typing import List, Dict, Any
 
+from llm_cache import enable_llm_cache, print_cache_stats
+from llm_clients import get_chat_model, print_client_stats, using_fake_llm
+from streaming import stream_chain
+from streaming_json import parse_json_or_warn
+from retrieval_memory import RetrievalMemory, print_retrieval_stats
+
 # Load environment variables
 load_dotenv()
 
 def create_memory_aware_understanding_chain():
     """Create a chain to understand customer inquiry with memory context"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.3,
-        max_tokens=200
+        max_tokens=200,
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
-        input_variables=["customer_message"],
+        input_variables=["customer_message", "relevant_history"],
         template="""Analyze the following customer inquiry.
 
+Relevant previous turns from this customer (retrieved from earlier conversations):
+{relevant_history}
+
 Current Message: {customer_message}
 
 Emotion Detection Guidelines:
@@ -63,10 +71,11 @@ JSON Response:"""
 
 def create_memory_aware_classification_chain():
     """Create a chain to classify the inquiry with memory context"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.3,
-        max_tokens=150
+        max_tokens=150,
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -99,10 +108,11 @@ JSON Response:"""
 
 def create_memory_aware_routing_chain():
     """Create a chain to determine routing with memory context"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.2,
-        max_tokens=150
+        max_tokens=150,
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -136,10 +146,12 @@ JSON Response:"""
 
 def create_memory_aware_response_chain():
     """Create a chain to generate contextual responses"""
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.7,
-        max_tokens=300
+        max_tokens=300,
+        streaming=True,  # Stream the answer token by token when a handler is attached
+        cache=enable_llm_cache()
     )
     
     prompt = PromptTemplate(
@@ -163,8 +175,10 @@ Response:"""
     
     return LLMChain(llm=llm, prompt=prompt, output_key="response")
 
-def create_memory_aware_customer_service_chain():
-    """Create the complete memory-aware customer service workflow"""
+def create_memory_aware_customer_service_chain(memory: RetrievalMemory):
+    """Create the memory-aware customer service workflow for the customer `memory` belongs to"""
+    # Long-term memory: the customer's most relevant earlier turns, injected into the understanding step.
+    # It is required: a shared default customer would retrieve other callers' turns into this prompt
     
     # Create individual chains with memory
     understanding_chain = create_memory_aware_understanding_chain()
@@ -177,63 +191,56 @@ def create_memory_aware_customer_service_chain():
         chains=[understanding_chain, classification_chain, routing_chain, response_chain],
         input_variables=["customer_message"],
         output_variables=["understanding", "classification", "routing", "response"],
+        memory=memory,
         verbose=True
     )
     
     return customer_service_chain
 
-def parse_json_output(output_str):
-    """Parse JSON output from LLM"""
-    try:
-        if isinstance(output_str, str):
-            start = output_str.find('{')
-            end = output_str.rfind('}') + 1
-            if start != -1 and end != 0:
-                json_str = output_str[start:end]
-                return json.loads(json_str)
-        return output_str
-    except:
-        return output_str
-
 def run_multi_turn_conversation():
     """Run a multi-turn conversation example"""
     print("🎯 Memory Chains Example: Multi-turn Customer Service Conversation")
     print("=" * 70)
     
-    # Create the chain
-    chain = create_memory_aware_customer_service_chain()
+    # Each scenario is its own customer; each turn retrieves only that customer's related earlier turns
+    memory = RetrievalMemory(customer_id="customer-1001", session_id="1")
+    chain = create_memory_aware_customer_service_chain(memory)
     
-    # Multi-turn conversation scenarios
+    # Multi-turn conversation scenarios: (customer, messages)
     conversation_scenarios = [
         # Scenario 1: Technical issue with follow-ups
-        [
+        ("customer-1001", [
             "I can't log into my account. The password reset isn't working.",
             "I tried that already. It's been 2 hours and nothing works!",
             "Can you just reset it for me? I have an important meeting in 30 minutes.",
             "Thanks! That worked. You're the best!"
-        ],
+        ]),
         # Scenario 2: Billing issue with clarification
-        [
+        ("customer-1002", [
             "My bill is much higher than usual this month.",
             "It's $200 more than last month. I don't understand why.",
             "Can you explain what the extra charges are for?",
             "That makes sense now. Thanks for clarifying."
-        ],
+        ]),
         # Scenario 3: Sales inquiry with follow-up
-        [
+        ("customer-1003", [
             "Hi, I'm interested in upgrading my plan.",
             "What are the main differences between basic and premium?",
             "How much more does the premium plan cost?",
             "Perfect! I'd like to upgrade to premium."
-        ]
+        ]),
+        # Scenario 4: The customer from scenario 1 returns later about the same issue
+        ("customer-1001", [
+            "The password reset email is not arriving again.",
+            "Can you reset it for me manually like last time?"
+        ])
     ]
     
-    for scenario_num, messages in enumerate(conversation_scenarios, 1):
-        print(f"\n🔄 Conversation Scenario {scenario_num}")
+    for scenario_num, (customer_id, messages) in enumerate(conversation_scenarios, 1):
+        print(f"\n🔄 Conversation Scenario {scenario_num} ({customer_id})")
         print("=" * 50)
-        
-        # Reset memory for each scenario
-        chain = create_memory_aware_customer_service_chain()
+        memory.customer_id = customer_id
+        memory.session_id = str(scenario_num)
         
         for turn_num, message in enumerate(messages, 1):
             print(f"\n📧 Turn {turn_num}: '{message}'")
@@ -244,9 +251,9 @@ def run_multi_turn_conversation():
                 result = chain.invoke({"customer_message": message})
                 
                 # Parse JSON outputs
-                understanding = parse_json_output(result["understanding"])
-                classification = parse_json_output(result["classification"])
-                routing = parse_json_output(result["routing"])
+                understanding = parse_json_or_warn(result["understanding"], "understanding")
+                classification = parse_json_or_warn(result["classification"], "classification")
+                routing = parse_json_or_warn(result["routing"], "routing")
                 
                 # Display results
                 print(f"🔍 Understanding:")
@@ -254,6 +261,7 @@ def run_multi_turn_conversation():
                 print(f"  Emotion: {understanding.get('customer_emotion', 'N/A')}")
                 print(f"  Is Follow-up: {understanding.get('is_followup', 'N/A')}")
                 print(f"  References: {understanding.get('references_previous', 'N/A')}")
+                print(f"  Retrieved Turns: {memory.last_retrieved}")
                 
                 print(f"\n🏷️  Classification:")
                 print(f"  Category: {classification.get('category', 'N/A')}")
@@ -270,6 +278,10 @@ def run_multi_turn_conversation():
                 
             except Exception as e:
                 print(f"❌ Error: {e}")
+    
+    print_retrieval_stats()
+    print_cache_stats()
+    print_client_stats()
 
 def demonstrate_memory_types():
     """Demonstrate different types of memory components"""
@@ -293,7 +305,7 @@ def demonstrate_memory_types():
     
     # 2. ConversationSummaryMemory
     print("\n2️⃣ ConversationSummaryMemory (Summarized)")
-    summary_memory = ConversationSummaryMemory(llm=ChatOpenAI(temperature=0))
+    summary_memory = ConversationSummaryMemory(llm=get_chat_model(temperature=0))
     
     # Add the same messages
     summary_memory.chat_memory.add_user_message("I can't log in")
@@ -304,6 +316,17 @@ def demonstrate_memory_types():
     print("Conversation summary:")
     print(f"  {summary_memory.buffer}")
 
+def print_understanding(key: str, value: str):
+    """Display the understanding step before the response starts streaming"""
+    if key != "understanding":
+        return
+    understanding = parse_json_or_warn(value, "understanding")
+    print(f"\n🔍 Understanding: {understanding.get('customer_emotion', 'N/A')} emotion, "
+          f"{understanding.get('urgency_level', 'N/A')} urgency")
+    
+    if understanding.get('is_followup'):
+        print(f"📝 Follow-up detected: {understanding.get('references_previous', 'N/A')}")
+
 def interactive_memory_conversation():
     """Run an interactive conversation with memory"""
     print("\n🎮 Interactive Memory Conversation")
@@ -313,8 +336,8 @@ def interactive_memory_conversation():
     print("Type 'quit' to end the conversation.")
     print("-" * 50)
     
-    # Create the chain
-    chain = create_memory_aware_customer_service_chain()
+    # Create the chain (earlier turns of this customer are retrieved for each message)
+    chain = create_memory_aware_customer_service_chain(RetrievalMemory(customer_id="interactive-customer"))
     
     while True:
         message = input("\n👤 You: ").strip()
@@ -329,27 +352,20 @@ def interactive_memory_conversation():
         
         try:
             print("🤔 Processing...")
-            result = chain.invoke({"customer_message": message})
-            
-            # Parse and display understanding
-            understanding = parse_json_output(result["understanding"])
-            print(f"\n🔍 Understanding: {understanding.get('customer_emotion', 'N/A')} emotion, "
-                  f"{understanding.get('urgency_level', 'N/A')} urgency")
-            
-            if understanding.get('is_followup'):
-                print(f"📝 Follow-up detected: {understanding.get('references_previous', 'N/A')}")
-            
-            print(f"\n🤖 Assistant: {result['response']}")
+            # Show the understanding as soon as it is ready, then stream the reply
+            stream_chain(chain, {"customer_message": message}, output_key="response",
+                         prefix="\n🤖 Assistant: ", on_output=print_understanding)
             
         except Exception as e:
             print(f"❌ Error: {e}")
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and not using_fake_llm():
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline with the fake model)")
         exit(1)
     
     # Demonstrate memory types
@@ -0,0 +1,288 @@
+"""
+Retrieval-based Long-term Memory
+
+The memory chains ask the model whether a message is a follow-up, but a prompt
+can only answer that if it contains the earlier turns, and sending all of them
+grows without bound. RetrievalMemory indexes every past turn of a customer,
+across sessions, and injects only the few that are relevant to the new message:
+
+- Local vector index: one NumPy matrix per customer, grown by doubling, so adding
+  a turn is an amortized O(1) row write and a search is one matrix-vector product
+- Top-k with a floor: at most `k` turns scoring at least `min_score` are sent;
+  unrelated history adds nothing to the prompt
+- Offline embeddings: HashingEmbeddings (signed feature hashing of words and word
+  pairs) needs no API; any LangChain Embeddings can be passed instead
+- Across sessions: turns are keyed by customer, and each keeps its session ID
+
+Run `python retrieval_memory.py` to index 100,000 turns and time searches.
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+from langchain.schema import BaseMemory
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_TOP_K = int(os.getenv("RETRIEVAL_MEMORY_TOP_K", "3"))
+DEFAULT_MIN_SCORE = float(os.getenv("RETRIEVAL_MEMORY_MIN_SCORE", "0.25"))
+TURN_PREVIEW_CHARS = 200
+
+STOP_WORDS = set("""a about again all also an and any are as at back be been but by can do does for from had has
+have hi i i'm i've is it it's its just me more much my not of on or our please so still than that the this to
+too was we were what when which will with you your""".split())
+CONTEXT_WEIGHT = 0.5  # Weight of the session's previous message in a query, relative to the new one
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings: words and word pairs hashed into `dimensions` signed buckets"""
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    @staticmethod
+    def _stem(word: str) -> str:
+        # Crude suffix stripping so "charges", "charged" and "charge" share a feature
+        for suffix in ("ing", "ed", "es", "s"):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        return word[:-1] if word.endswith("e") and len(word) > 3 else word
+
+    def _features(self, text: str) -> List[str]:
+        words = [self._stem(word) for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOP_WORDS]
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dimensions] += 1.0 if digest & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class _CustomerTurns:
+    """One customer's turn vectors (a growable matrix) and the turns they belong to"""
+
+    __slots__ = ("vectors", "turns")
+
+    def __init__(self, dimensions: int, capacity: int):
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.turns: List[Dict[str, Any]] = []
+
+    def append(self, vector: np.ndarray, turn: Dict[str, Any]):
+        size = len(self.turns)
+        if size == len(self.vectors):
+            # Double the capacity: each row is copied O(1) times on average
+            grown = np.zeros((2 * size, self.vectors.shape[1]), dtype=np.float32)
+            grown[:size] = self.vectors
+            self.vectors = grown
+        self.vectors[size] = vector
+        self.turns.append(turn)
+
+class TurnIndex:
+    """Vector index of past conversation turns, searched per customer"""
+
+    def __init__(self, embeddings: Optional[Embeddings] = None, initial_capacity: int = 16):
+        self.embeddings = embeddings or HashingEmbeddings()
+        self.initial_capacity = initial_capacity
+        self._customers: Dict[str, _CustomerTurns] = {}
+        self._lock = threading.Lock()
+        self._stats = {"turns": 0, "searches": 0, "search_ms": 0.0, "retrieved": 0}
+
+    def add(self, customer_id: str, session_id: str, customer_text: str, agent_text: str = "") -> int:
+        """Index one turn; the customer's words are embedded, the agent's reply is kept for context"""
+        vector = np.asarray(self.embeddings.embed_documents([customer_text])[0], dtype=np.float32)
+        turn = {"session_id": session_id, "customer": customer_text, "agent": agent_text, "time": time.time()}
+        with self._lock:
+            turns = self._customers.get(customer_id)
+            if turns is None:
+                turns = self._customers[customer_id] = _CustomerTurns(len(vector), self.initial_capacity)
+            turns.append(vector, turn)
+            self._stats["turns"] += 1
+            return len(turns.turns)
+
+    def search(self, customer_id: str, query: str, k: int = DEFAULT_TOP_K, min_score: float = DEFAULT_MIN_SCORE,
+               context: str = "") -> List[Tuple[float, Dict[str, Any]]]:
+        """The customer's `k` past turns most similar to `query` (nudged towards `context`), best first"""
+        start = time.perf_counter()
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        if context:
+            query_vector = query_vector + CONTEXT_WEIGHT * np.asarray(self.embeddings.embed_query(context),
+                                                                      dtype=np.float32)
+            query_vector /= np.linalg.norm(query_vector) or 1.0
+        with self._lock:
+            turns = self._customers.get(customer_id)
+            if turns is None or not turns.turns:
+                hits = []
+            else:
+                size = len(turns.turns)
+                # Rows are unit length, so the dot product is the cosine similarity
+                scores = turns.vectors[:size] @ query_vector
+                top = np.argpartition(-scores, k - 1)[:k] if size > k else np.arange(size)
+                top = top[np.argsort(-scores[top])]
+                hits = [(float(scores[i]), turns.turns[i]) for i in top if scores[i] >= min_score]
+            self._stats["searches"] += 1
+            self._stats["retrieved"] += len(hits)
+            self._stats["search_ms"] += (time.perf_counter() - start) * 1000
+        return hits
+
+    def count(self, customer_id: Optional[str] = None) -> int:
+        """Turns indexed for one customer, or for everyone"""
+        if customer_id is None:
+            return self._stats["turns"]
+        turns = self._customers.get(customer_id)
+        return len(turns.turns) if turns else 0
+
+    def forget(self, customer_id: str):
+        """Drop everything indexed for the customer"""
+        with self._lock:
+            turns = self._customers.pop(customer_id, None)
+            if turns is not None:
+                self._stats["turns"] -= len(turns.turns)
+
+    def save(self, path: str):
+        """Write the index to `path` (.npz with the vectors, turns as JSON)"""
+        with self._lock:
+            customers = list(self._customers)
+            arrays = {f"vectors_{i}": self._customers[c].vectors[:len(self._customers[c].turns)]
+                      for i, c in enumerate(customers)}
+            turns = json.dumps({c: self._customers[c].turns for c in customers})
+        np.savez_compressed(path, customers=np.array(customers), turns=np.array(turns), **arrays)
+
+    @classmethod
+    def load(cls, path: str, embeddings: Optional[Embeddings] = None) -> "TurnIndex":
+        """Read an index written by save(); `embeddings` must be the one it was built with"""
+        index = cls(embeddings)
+        with np.load(path) as data:
+            turns = json.loads(str(data["turns"]))
+            for i, customer_id in enumerate(data["customers"].tolist()):
+                vectors = data[f"vectors_{i}"]
+                entry = _CustomerTurns(vectors.shape[1], max(index.initial_capacity, len(vectors)))
+                entry.vectors[:len(vectors)] = vectors
+                entry.turns = turns[customer_id]
+                index._customers[customer_id] = entry
+                index._stats["turns"] += len(vectors)
+        return index
+
+    def report(self) -> Dict[str, Any]:
+        """Turns indexed, searches run and their average latency and hit count"""
+        with self._lock:
+            searches = self._stats["searches"]
+            return {
+                "customers": len(self._customers),
+                "turns": self._stats["turns"],
+                "searches": searches,
+                "search_ms_avg": self._stats["search_ms"] / searches if searches else 0.0,
+                "retrieved_avg": self._stats["retrieved"] / searches if searches else 0.0
+            }
+
+_index: Optional[TurnIndex] = None
+_index_lock = threading.Lock()
+
+def get_turn_index() -> TurnIndex:
+    """The process-wide turn index shared by all retrieval memories"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TurnIndex()
+        return _index
+
+def format_turns(hits: List[Tuple[float, Dict[str, Any]]]) -> str:
+    """Retrieved turns as prompt lines, most relevant first"""
+    if not hits:
+        return "None (no related earlier turns)"
+    return "\n".join(f"- [session {turn['session_id']}, relevance {score:.2f}] "
+                     f"Customer: {turn['customer'][:TURN_PREVIEW_CHARS]} / "
+                     f"Agent: {turn['agent'][:TURN_PREVIEW_CHARS]}" for score, turn in hits)
+
+class RetrievalMemory(BaseMemory):
+    """Memory that puts a customer's most relevant past turns (from any session) into the prompt"""
+
+    customer_id: str
+    session_id: str = "default"
+    index: Any = None
+    k: int = DEFAULT_TOP_K
+    min_score: float = DEFAULT_MIN_SCORE
+    memory_key: str = "relevant_history"
+    input_key: str = "customer_message"
+    output_key: str = "response"
+    last_retrieved: int = 0
+    last_message: str = ""
+    last_message_session: str = ""
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.index = self.index or get_turn_index()
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # "I tried that already" says little alone; the session's previous message says what "that" is
+        context = self.last_message if self.last_message_session == self.session_id else ""
+        hits = self.index.search(self.customer_id, inputs[self.input_key], k=self.k, min_score=self.min_score,
+                                 context=context)
+        self.last_retrieved = len(hits)
+        return {self.memory_key: format_turns(hits)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        self.index.add(self.customer_id, self.session_id, inputs[self.input_key], outputs.get(self.output_key, ""))
+        self.last_message, self.last_message_session = inputs[self.input_key], self.session_id
+
+    def clear(self) -> None:
+        self.index.forget(self.customer_id)
+        self.last_message = ""
+
+def print_retrieval_stats(index: Optional[TurnIndex] = None):
+    """Print how much history is indexed and what searches cost"""
+    report = (index or get_turn_index()).report()
+    print(f"📚 Retrieval memory: {report['turns']} turns from {report['customers']} customers, "
+          f"{report['searches']} searches ({report['search_ms_avg']:.2f} ms avg, "
+          f"{report['retrieved_avg']:.1f} turns injected avg)")
+
+def demonstrate_retrieval_memory(customers: int = 200, turns_per_customer: int = 500):
+    """Index many past turns, then show search latency and what a follow-up retrieves, offline"""
+    index = TurnIndex()
+    topics = ["my invoice shows a duplicate charge", "the mobile app crashes on startup",
+              "I want to upgrade to the premium plan", "my parcel tracking page is blank",
+              "the password reset email never arrives", "I need a copy of last month's receipt"]
+
+    print("\n📚 Retrieval Memory Demo")
+    print("=" * 60)
+    start = time.perf_counter()
+    for customer in range(customers):
+        for turn in range(turns_per_customer):
+            index.add(f"customer-{customer}", str(turn // 10),
+                      f"Ticket {turn}: {topics[(customer + turn) % len(topics)]}",
+                      "Thanks, I've logged this and will follow up.")
+    elapsed = time.perf_counter() - start
+    total = customers * turns_per_customer
+    print(f"✍️  Indexed {total:,} turns in {elapsed:.2f}s ({total / elapsed:,.0f} turns/s)")
+
+    memory = RetrievalMemory(customer_id="customer-7", session_id="new", index=index)
+    query = "The password reset email still hasn't come through"
+    start = time.perf_counter()
+    for _ in range(100):
+        history = memory.load_memory_variables({"customer_message": query})["relevant_history"]
+    print(f"🔎 Search over {turns_per_customer} turns of one customer: "
+          f"{(time.perf_counter() - start) * 10:.2f} ms per query")
+    print(f"\nFollow-up: '{query}'\nInjected into the prompt ({len(history)} chars):\n{history}")
+
+    unrelated = memory.load_memory_variables({"customer_message": "Do you have a store in Berlin?"})
+    print(f"\nUnrelated message injects: {unrelated['relevant_history']}")
+    print_retrieval_stats(index)
+
+if __name__ == "__main__":
+    demonstrate_retrieval_memory()
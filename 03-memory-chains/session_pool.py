@@ -0,0 +1,511 @@
+"""
+Multi-session Memory Pool
+
+Rebuilding a chain to reset memory works for a demo with one conversation at a time.
+A server holds thousands of conversations at once and needs their memory in bounded
+RAM. SessionMemoryPool keeps memories keyed by conversation ID:
+
+- Bounded residency: at most `max_sessions` memories and/or `max_bytes` of message
+  content stay in RAM; the least recently used sessions are evicted first
+- Disk spill: an evicted session's messages that are not on disk yet are appended to
+  a TranscriptStore, so eviction writes only what is new
+- Transparent rehydration: the next `get()` for an evicted session rebuilds its
+  memory from the store, so the caller cannot tell it was evicted
+- Checkout: `with pool.checkout(session_id) as memory:` (or acquire()/release())
+  pins the session for a turn, so concurrent callers' sessions are never evicted
+  while they still save turns to them; get() alone is only safe until the next get()
+- Compact residents: sessions are held in CompactChatMessageHistory, so the byte
+  budget buys several times more messages than message objects would
+- Hot and cold residents: only the `hot_sessions` most recently used sessions keep
+  plain text; the others are compressed in RAM (see cold_compression.py) until they
+  are used again, and flush() compresses the spilled transcripts on disk
+- Snapshots: snapshot() writes the resident sessions to a memory_snapshot.py file
+  at shutdown and a replacement worker's restore() serves them from it, decoding
+  each session on its first get(), so a rolling deployment does not start cold
+- Metrics: resident sessions and bytes, hits, rehydrations, evictions, messages
+  spilled, and spill/rehydration latency
+
+Run `python session_pool.py` to drive 2,000 conversations through a pool holding 200,
+or `python session_pool.py snapshot` to benchmark snapshot/restore of 100k sessions.
+"""
+
+import os
+import sys
+import time
+import random
+import struct
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Callable, Set
+
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import HumanMessage, AIMessage
+
+from cold_compression import print_compression_stats
+from compact_history import CompactChatMessageHistory, lazy_messages
+from cold_compression import get_dictionary, register_dictionary
+from memory_snapshot import SnapshotWriter, SnapshotReader, SnapshotFormatError
+from token_window_memory import TokenWindowMemory
+from transcript_store import TranscriptStore
+
+DEFAULT_MAX_SESSIONS = int(os.getenv("MEMORY_POOL_MAX_SESSIONS", "1000"))
+DEFAULT_MAX_BYTES = int(os.getenv("MEMORY_POOL_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_HOT_SESSIONS = int(os.getenv("MEMORY_POOL_HOT_SESSIONS", "100"))
+SNAPSHOT_SECTION = "sessions"
+SNAPSHOT_VERSION = 1
+DICTIONARY_SECTION = "dictionaries"
+SNAPSHOT_RECORD = struct.Struct("<I")  # messages already in the transcript store, then the history
+# Memories that prune by popping from `chat_memory.messages`, which for a compact history is a copy
+INCOMPATIBLE_MEMORIES = (ConversationSummaryBufferMemory,)
+MESSAGE_OVERHEAD_BYTES = 200  # Rough size of a message object besides its text (histories without nbytes())
+
+class _Resident:
+    """A memory in RAM and how much of it is accounted for and on disk"""
+
+    __slots__ = ("memory", "bytes", "counted", "persisted", "cleared", "clears")
+
+    def __init__(self, memory: BaseChatMemory, persisted: int):
+        self.memory = memory
+        self.bytes = 0
+        self.counted = 0  # Messages included in `bytes`
+        self.persisted = persisted  # Messages already in the transcript store
+        self.cleared = False  # Memory was cleared since it was loaded: its transcript must be replaced
+        self.clears = getattr(memory.chat_memory, "clears", 0)  # Compact histories count their clear() calls
+
+class SessionMemoryPool:
+    """LRU pool of per-conversation memories that spills cold sessions to a TranscriptStore"""
+
+    def __init__(self, factory: Callable[[BaseChatMessageHistory], BaseChatMemory], store: TranscriptStore,
+                 max_sessions: Optional[int] = DEFAULT_MAX_SESSIONS, max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+                 resume_messages: Optional[int] = None, hot_sessions: Optional[int] = DEFAULT_HOT_SESSIONS):
+        # factory(chat_memory) builds a session's memory around a history already holding its messages
+        self.factory = factory
+        self.store = store
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.resume_messages = resume_messages
+        self.hot_sessions = hot_sessions
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()
+        self._hot: "OrderedDict[str, None]" = OrderedDict()  # Most recently used residents, kept uncompressed
+        self._resident_bytes = 0
+        self._handed_out: Set[str] = set()  # Returned by the last get(); its messages may have grown since counted
+        self._pins: Dict[str, int] = {}  # Checked-out sessions -> holders; never evicted while held
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "new_sessions": 0, "rehydrations": 0, "evictions": 0, "spilled_messages": 0,
+                       "compressions": 0, "compressed_bytes_saved": 0, "restored": 0}
+        self._snapshot: Optional[SnapshotReader] = None
+        self._snapshot_index: Dict[str, int] = {}  # Sessions in the snapshot not yet restored -> record offset
+        self._snapshot_swap = False
+        self._snapshot_dictionaries: Set[int] = set()
+        self._rehydrate_ms: List[float] = []
+        self._restore_ms: List[float] = []
+        self._spill_ms: List[float] = []
+
+    def get(self, session_id: str) -> BaseChatMemory:
+        """The session's memory, rehydrated from disk if it was evicted; evicts cold sessions to stay in budget
+
+        The memory may be evicted by the next get(); hold it across calls with checkout().
+        """
+        with self._lock:
+            # Account for what the previous turns added before deciding who to evict
+            for handed_out in self._handed_out | set(self._pins):
+                if handed_out in self._resident:
+                    self._account(self._resident[handed_out])
+            self._handed_out = {session_id}
+            resident = self._resident.get(session_id)
+            if resident is not None:
+                self._resident.move_to_end(session_id)
+                self._stats["hits"] += 1
+            else:
+                resident = self._load(session_id)
+                self._resident[session_id] = resident
+                self._account(resident)
+            self._cool(session_id)
+            self._evict(keep=session_id)
+            return resident.memory
+
+    def acquire(self, session_id: str) -> BaseChatMemory:
+        """The session's memory, pinned in RAM until release(session_id)"""
+        with self._lock:
+            memory = self.get(session_id)
+            self._pins[session_id] = self._pins.get(session_id, 0) + 1
+            return memory
+
+    def release(self, session_id: str):
+        """Unpin a session from acquire(), count what its turn added and evict if over budget"""
+        with self._lock:
+            holders = self._pins.pop(session_id) - 1
+            if holders:
+                self._pins[session_id] = holders
+            if session_id in self._resident:
+                self._account(self._resident[session_id])
+            self._evict(keep=None)
+
+    @contextmanager
+    def checkout(self, session_id: str):
+        """Hold the session's memory for the block; it cannot be evicted until the block exits"""
+        memory = self.acquire(session_id)
+        try:
+            yield memory
+        finally:
+            self.release(session_id)
+
+    def _cool(self, session_id: str):
+        """Mark the session hot and compress the sessions that drop out of the hot set"""
+        if self.hot_sessions is None:
+            return
+        self._hot[session_id] = None
+        self._hot.move_to_end(session_id)
+        while len(self._hot) > self.hot_sessions:
+            cold, _ = self._hot.popitem(last=False)
+            resident = self._resident.get(cold)
+            if resident is not None and isinstance(resident.memory.chat_memory, CompactChatMessageHistory):
+                saved = resident.memory.chat_memory.compress()
+                if saved:
+                    self._stats["compressions"] += 1
+                    self._stats["compressed_bytes_saved"] += saved
+                self._account(resident)
+
+    def _load(self, session_id: str) -> _Resident:
+        offset = self._snapshot_index.pop(session_id, None)
+        if offset is not None:
+            return self._restore_resident(offset)
+        persisted = self.store.count(session_id)
+        if not persisted:
+            self._stats["new_sessions"] += 1
+            return _Resident(self._build(CompactChatMessageHistory()), persisted=0)
+        start = time.perf_counter()
+        first = 0 if self.resume_messages is None else max(0, persisted - self.resume_messages)
+        messages = self.store.read_range(session_id, first, persisted)
+        resident = _Resident(self._build(CompactChatMessageHistory(messages)), persisted=persisted)
+        # Messages not loaded are on disk already; only later ones need spilling
+        resident.persisted = len(messages)
+        self._rehydrate_ms.append((time.perf_counter() - start) * 1000)
+        self._stats["rehydrations"] += 1
+        return resident
+
+    def _build(self, history: CompactChatMessageHistory) -> BaseChatMemory:
+        memory = self.factory(history)
+        if isinstance(memory, INCOMPATIBLE_MEMORIES):
+            raise TypeError(f"{type(memory).__name__} prunes chat_memory.messages in place, which a compact "
+                            f"history does not support; use SummaryWindowMemory or TokenWindowMemory")
+        return memory
+
+    def _restore_resident(self, offset: int) -> _Resident:
+        """Decode one session from the snapshot (no transcript store reads, no message objects)"""
+        start = time.perf_counter()
+        payload = self._snapshot.read(offset)
+        persisted, = SNAPSHOT_RECORD.unpack_from(payload)
+        history = CompactChatMessageHistory.from_bytes(payload[SNAPSHOT_RECORD.size:], swap_bytes=self._snapshot_swap)
+        del payload
+        if not self._snapshot_index:
+            self._snapshot.close()
+            self._snapshot = None
+        self._restore_ms.append((time.perf_counter() - start) * 1000)
+        self._stats["restored"] += 1
+        return _Resident(self._build(history), persisted=persisted)
+
+    def _account(self, resident: _Resident):
+        """Add the size of messages appended since the last call (O(new messages))"""
+        history = resident.memory.chat_memory
+        if isinstance(history, CompactChatMessageHistory):
+            size = history.nbytes()
+            self._resident_bytes += size - resident.bytes
+            resident.bytes = size
+            if history.clears != resident.clears or len(history.message_view) < resident.counted:
+                resident.persisted = 0  # Memory was cleared
+                resident.cleared = True
+                resident.clears = history.clears
+            resident.counted = len(history.message_view)
+            return
+        messages = history.messages
+        if len(messages) < resident.counted:
+            # Memory was cleared: recount
+            self._resident_bytes -= resident.bytes
+            resident.bytes = resident.counted = resident.persisted = 0
+            resident.cleared = True
+        for message in messages[resident.counted:]:
+            size = len(str(message.content).encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+            resident.bytes += size
+            self._resident_bytes += size
+        resident.counted = len(messages)
+
+    def _over_budget(self) -> bool:
+        if self.max_sessions is not None and len(self._resident) > self.max_sessions:
+            return True
+        return self.max_bytes is not None and self._resident_bytes > self.max_bytes
+
+    def _evict(self, keep: Optional[str]):
+        if not self._over_budget():
+            return  # The common case; copying the keys on every get() would cost O(resident sessions)
+        # Least recently used first, skipping the session being handed out and checked-out ones
+        for session_id in list(self._resident):
+            if not self._over_budget():
+                return
+            if session_id != keep and session_id not in self._pins:
+                self._spill(session_id, self._resident.pop(session_id))
+
+    def _persist(self, session_id: str, resident: _Resident) -> int:
+        """Append the messages not on disk yet to the store; returns how many"""
+        messages = lazy_messages(resident.memory.chat_memory)
+        if resident.cleared:
+            # Cleared while resident: the old transcript must not come back on rehydration
+            self.store.delete(session_id)
+            resident.cleared = False
+        pending = messages[resident.persisted:]
+        self.store.append(session_id, pending)
+        resident.persisted = len(messages)
+        return len(pending)
+
+    def _spill(self, session_id: str, resident: _Resident):
+        """Write the session's new messages to disk and release its memory"""
+        start = time.perf_counter()
+        self._account(resident)  # Notices a clear since the session was last counted
+        spilled = self._persist(session_id, resident)
+        self._resident_bytes -= resident.bytes
+        self._hot.pop(session_id, None)
+        self._spill_ms.append((time.perf_counter() - start) * 1000)
+        self._stats["evictions"] += 1
+        self._stats["spilled_messages"] += spilled
+
+    def flush(self, compress: bool = True):
+        """Spill every resident session (e.g. at shutdown), compressing the transcripts; the pool is empty afterwards"""
+        with self._lock:
+            for resident in self._resident.values():
+                self._account(resident)
+            while self._resident:
+                session_id, resident = self._resident.popitem(last=False)
+                self._spill(session_id, resident)
+                if compress and self.hot_sessions is not None:
+                    self.store.compress_session(session_id)
+
+    def snapshot(self, path: str, spill: bool = True) -> Dict[str, Any]:
+        """Write the resident sessions (and any not yet restored from a previous snapshot) to `path`
+
+        With spill=True new messages are appended to the transcript store first, so the
+        snapshot only saves warm-up time and losing it loses nothing.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            for resident in self._resident.values():
+                self._account(resident)
+            dictionaries = set(self._snapshot_dictionaries) if self._snapshot_index else set()
+            for resident in self._resident.values():
+                if isinstance(resident.memory.chat_memory, CompactChatMessageHistory):
+                    dictionaries |= resident.memory.chat_memory.dictionary_ids()
+            with SnapshotWriter(path) as writer:
+                # Compressed blocks are only readable with the dictionary they were written with
+                writer.begin_section(DICTIONARY_SECTION)
+                for dictionary_id in sorted(dictionaries):
+                    writer.add(f"{dictionary_id:08x}", get_dictionary(dictionary_id))
+                writer.begin_section(SNAPSHOT_SECTION, version=SNAPSHOT_VERSION, byteorder=sys.byteorder)
+                # Oldest first: restore(warm=n) decodes the last n records, the most recently used
+                for session_id, offset in self._snapshot_index.items():
+                    if session_id not in self._resident:
+                        writer.add(session_id, bytes(self._snapshot.read(offset)))
+                for session_id, resident in self._resident.items():
+                    history = resident.memory.chat_memory
+                    if not isinstance(history, CompactChatMessageHistory):
+                        history = CompactChatMessageHistory(history.messages)
+                    # A cleared session's old transcript is replaced even without spill, or it would come back
+                    if resident.cleared or (spill and resident.persisted < len(history.message_view)):
+                        self._persist(session_id, resident)
+                    writer.add(session_id, SNAPSHOT_RECORD.pack(resident.persisted) + history.to_bytes())
+                sessions = writer.records - len(dictionaries)
+        return {"sessions": sessions, "bytes": os.path.getsize(path), "seconds": time.perf_counter() - start}
+
+    def restore(self, path: str, warm: int = 0) -> int:
+        """Serve sessions from a snapshot: each is decoded on its first get(), the `warm` most recent right away"""
+        reader = SnapshotReader(path)
+        if SNAPSHOT_SECTION not in reader.sections():
+            reader.close()
+            return 0
+        meta = reader.meta(SNAPSHOT_SECTION)
+        if meta["version"] > SNAPSHOT_VERSION:
+            reader.close()
+            raise SnapshotFormatError(f"session records version {meta['version']} is newer than supported "
+                                      f"({SNAPSHOT_VERSION})")
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.close()
+            self._snapshot = reader
+            self._snapshot_swap = meta.get("byteorder", sys.byteorder) != sys.byteorder
+            self._snapshot_dictionaries = {register_dictionary(bytes(dictionary))
+                                           for _, dictionary in reader.records(DICTIONARY_SECTION)} \
+                if DICTIONARY_SECTION in reader.sections() else set()
+            self._snapshot_index = {session_id: offset for session_id, offset in reader.index(SNAPSHOT_SECTION).items()
+                                    if session_id not in self._resident}
+            available = len(self._snapshot_index)
+            for session_id in reader.keys(SNAPSHOT_SECTION)[-warm:] if warm else []:
+                if session_id in self._snapshot_index:
+                    resident = self._load(session_id)
+                    self._resident[session_id] = resident
+                    self._account(resident)
+            self._evict(keep=None)
+        return available
+
+    def report(self) -> Dict[str, Any]:
+        """Residency, eviction and latency figures"""
+        with self._lock:
+            def percentile(values: List[float], fraction: float) -> float:
+                ordered = sorted(values)
+                return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+            return {
+                **self._stats,
+                "resident_sessions": len(self._resident),
+                "resident_bytes": self._resident_bytes,
+                "rehydrate_ms_avg": sum(self._rehydrate_ms) / len(self._rehydrate_ms) if self._rehydrate_ms else 0.0,
+                "rehydrate_ms_p95": percentile(self._rehydrate_ms, 0.95),
+                "spill_ms_avg": sum(self._spill_ms) / len(self._spill_ms) if self._spill_ms else 0.0,
+                "snapshot_pending": len(self._snapshot_index),
+                "restore_ms_avg": sum(self._restore_ms) / len(self._restore_ms) if self._restore_ms else 0.0,
+                "restore_ms_p95": percentile(self._restore_ms, 0.95)
+            }
+
+def print_pool_stats(pool: SessionMemoryPool):
+    """Print how the pool is holding up"""
+    report = pool.report()
+    limit = f"limit {pool.max_sessions}" if pool.max_sessions is not None else "no session limit"
+    print(f"🏊 Session pool: {report['resident_sessions']} resident ({limit}), "
+          f"{report['resident_bytes'] / 1024:.0f} KB, {report['hits']} hits, {report['new_sessions']} new")
+    if report["restored"] or report["snapshot_pending"]:
+        print(f"   {report['restored']} sessions restored from a snapshot ({report['restore_ms_avg']:.3f} ms avg), "
+              f"{report['snapshot_pending']} not used yet")
+    if report["compressions"]:
+        print(f"   {report['compressions']} cold sessions compressed in RAM "
+              f"({report['compressed_bytes_saved'] / 1024:.0f} KB saved)")
+    print(f"   {report['evictions']} evictions ({report['spilled_messages']} messages spilled, "
+          f"{report['spill_ms_avg']:.2f} ms avg), {report['rehydrations']} rehydrations "
+          f"({report['rehydrate_ms_avg']:.2f} ms avg, {report['rehydrate_ms_p95']:.2f} ms p95)")
+
+def demonstrate_session_pool(conversations: int = 2000, turns: int = 5, max_sessions: int = 200,
+                             hot_sessions: int = 50):
+    """Interleave many conversations through a small pool and check none loses a message, offline"""
+    root = tempfile.mkdtemp(prefix="session-pool-")
+    try:
+        pool = SessionMemoryPool(
+            factory=lambda history: TokenWindowMemory(chat_memory=history, max_token_limit=300),
+            store=TranscriptStore(root),
+            max_sessions=max_sessions,
+            max_bytes=None,
+            hot_sessions=hot_sessions
+        )
+        print("\n🏊 Session Memory Pool Demo")
+        print("=" * 60)
+        print(f"{conversations} conversations x {turns} turns, at most {max_sessions} resident "
+              f"({hot_sessions} uncompressed)\n")
+
+        start = time.perf_counter()
+        for turn in range(turns):
+            for conversation in range(conversations):
+                with pool.checkout(f"conversation-{conversation}") as memory:
+                    memory.load_memory_variables({})
+                    memory.save_context({"input": f"Turn {turn}: where is order #{conversation}?"},
+                                        {"output": f"Order #{conversation} is with the carrier; turn {turn} noted."})
+        elapsed = time.perf_counter() - start
+        print(f"⏱️  {conversations * turns} turns in {elapsed:.2f}s")
+        print_pool_stats(pool)
+        histories = [memory.chat_memory for memory in (r.memory for r in pool._resident.values())]
+        cold = [history for history in histories if history.compressed_messages]
+        compressed = sum(history.nbytes() for history in histories)
+        cold_compressed = sum(history.nbytes() for history in cold)
+        # Plain copies go through to_bytes(), which doesn't thaw the cold histories being measured
+        plain_sizes = {id(history): CompactChatMessageHistory(
+            CompactChatMessageHistory.from_bytes(history.to_bytes()).messages).nbytes() for history in histories}
+        plain = sum(plain_sizes.values())
+        cold_plain = sum(plain_sizes[id(history)] for history in cold)
+        print(f"🧊 Resident footprint: {plain / 1024:.0f} KB uncompressed -> {compressed / 1024:.0f} KB "
+              f"with cold sessions compressed ({plain / compressed:.1f}x); the {len(cold)} cold sessions "
+              f"alone: {cold_plain / 1024:.0f} KB -> {cold_compressed / 1024:.0f} KB "
+              f"({cold_plain / max(cold_compressed, 1):.1f}x)")
+
+        # Every conversation still has all its turns, whether it stayed resident or not
+        pool.flush(compress=False)
+        plain = pool.store.disk_usage()["bytes"]
+        pool.store.compress_idle(0)
+        compressed = pool.store.disk_usage()["bytes"]
+        print(f"💾 On disk: {plain / 1024:.0f} KB -> {compressed / 1024:.0f} KB compressed "
+              f"({plain / compressed:.1f}x, index files included)")
+        print_compression_stats()
+        complete = sum(pool.store.count(f"conversation-{c}") == turns * 2 for c in range(conversations))
+        print(f"✅ {complete}/{conversations} conversations have all {turns * 2} messages after flush")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def benchmark_session_snapshot(sessions: int = 100_000, turns: int = 5, sample: int = 1000):
+    """Snapshot size and restore time for `sessions` conversations, against rehydrating from transcripts"""
+    root = tempfile.mkdtemp(prefix="session-snapshot-")
+    path = os.path.join(root, "sessions.snap")
+
+    def memory_factory(history):
+        return TokenWindowMemory(chat_memory=history, max_token_limit=300)
+
+    try:
+        print("\n📸 Session Snapshot Benchmark")
+        print("=" * 60)
+        pool = SessionMemoryPool(factory=memory_factory, store=TranscriptStore(os.path.join(root, "old")),
+                                 max_sessions=None, max_bytes=None, hot_sessions=None)
+        start = time.perf_counter()
+        for conversation in range(sessions):
+            history = pool.get(f"conversation-{conversation}").chat_memory
+            for turn in range(turns):
+                history.add_messages([HumanMessage(content=f"Turn {turn}: where is order #{conversation}?"),
+                                      AIMessage(content=f"Order #{conversation} is with the carrier; turn {turn} noted.")])
+        print(f"{sessions:,} sessions x {turns * 2} messages built in {time.perf_counter() - start:.1f}s "
+              f"({pool.report()['resident_bytes'] / 1e6:.0f} MB resident)")
+
+        # Deployment: the old worker snapshots (transcripts are assumed flushed, so spill=False)
+        result = pool.snapshot(path, spill=False)
+        print(f"📸 Snapshot: {result['bytes'] / 1e6:.1f} MB ({result['bytes'] / sessions:.0f} bytes/session) "
+              f"written in {result['seconds']:.2f}s")
+        del pool
+
+        rng = random.Random(3)
+        picks = [f"conversation-{rng.randrange(sessions)}" for _ in range(sample)]
+        new_pool = SessionMemoryPool(factory=memory_factory, store=TranscriptStore(os.path.join(root, "new")),
+                                     max_sessions=None, max_bytes=None, hot_sessions=None)
+        start = time.perf_counter()
+        available = new_pool.restore(path)
+        print(f"🚀 Lazy restore: {available:,} sessions available after {(time.perf_counter() - start) * 1000:.0f} ms")
+        start = time.perf_counter()
+        complete = sum(len(new_pool.get(session_id).chat_memory.message_view) == turns * 2 for session_id in picks)
+        report = new_pool.report()
+        print(f"   first get() of {sample} sessions: {report['restore_ms_avg']:.3f} ms avg, "
+              f"{report['restore_ms_p95']:.3f} ms p95 ({complete}/{sample} complete, "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms total)")
+
+        start = time.perf_counter()
+        warm_pool = SessionMemoryPool(factory=memory_factory, store=TranscriptStore(os.path.join(root, "warm")),
+                                      max_sessions=None, max_bytes=None, hot_sessions=None)
+        warm_pool.restore(path, warm=sessions)
+        print(f"🔥 Eager restore of all {sessions:,} sessions: {time.perf_counter() - start:.1f}s")
+        del warm_pool
+
+        # Without a snapshot the new worker rehydrates each session from its transcript
+        store = TranscriptStore(os.path.join(root, "transcripts"))
+        for session_id in picks:
+            number = int(session_id.rsplit("-", 1)[1])
+            store.append(session_id, [message for turn in range(turns) for message in (
+                HumanMessage(content=f"Turn {turn}: where is order #{number}?"),
+                AIMessage(content=f"Order #{number} is with the carrier; turn {turn} noted."))])
+        cold_pool = SessionMemoryPool(factory=memory_factory, store=store, max_sessions=None, max_bytes=None,
+                                      hot_sessions=None)
+        for session_id in picks:
+            cold_pool.get(session_id)
+        report = cold_pool.report()
+        print(f"🧊 Without snapshot, rehydrating from transcripts: {report['rehydrate_ms_avg']:.3f} ms avg, "
+              f"{report['rehydrate_ms_p95']:.3f} ms p95 per session")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "snapshot":
+        benchmark_session_snapshot()
+    else:
+        demonstrate_session_pool()
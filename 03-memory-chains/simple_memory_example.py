@@ -6,30 +6,51 @@ This example shows how to properly use memory components with LangChain chains.
 
 import os
 import json
+import shutil
+import tempfile
+from typing import Optional
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain, ConversationChain
 from langchain.memory import ConversationBufferMemory, ConversationSummaryMemory
 from langchain.schema import HumanMessage, AIMessage
+from langchain_core.chat_history import BaseChatMessageHistory
+
+from llm_cache import enable_llm_cache, print_cache_stats
+from llm_clients import get_chat_model, print_client_stats, using_fake_llm
+from streaming import stream_chain
+from token_window_memory import TokenWindowMemory, print_memory_window
+from summary_window_memory import SummaryWindowMemory, print_summary_window
+from transcript_store import TranscriptStore, get_session_history
+from session_pool import SessionMemoryPool, print_pool_stats
 
 # Load environment variables
 load_dotenv()
 
-def create_memory_aware_customer_service():
-    """Create a customer service chain with memory"""
-    llm = ChatOpenAI(
-        model="gpt-3.5-turbo",
-        temperature=0.7,
-        max_tokens=300
-    )
-    
-    # Create memory component
-    memory = ConversationBufferMemory(
+def create_session_memory(chat_memory: BaseChatMessageHistory) -> SummaryWindowMemory:
+    """Memory for one conversation: recent turns within a token budget plus a background summary"""
+    return SummaryWindowMemory(
+        chat_memory=chat_memory,
+        llm=get_chat_model(temperature=0),
         memory_key="chat_history",
         return_messages=True,
         input_key="customer_message"
     )
+
+def create_memory_aware_customer_service(session_id: Optional[str] = None,
+                                         memory: Optional[SummaryWindowMemory] = None):
+    """Create a customer service chain with memory (persisted per session when TRANSCRIPT_STORE_DIR is set)"""
+    llm = get_chat_model(
+        model="gpt-3.5-turbo",
+        temperature=0.7,
+        max_tokens=300,
+        streaming=True,  # Stream the answer token by token when a handler is attached
+        cache=enable_llm_cache()
+    )
+    
+    # Create memory component, unless the session's memory comes from a pool
+    if memory is None:
+        memory = create_session_memory(get_session_history(session_id))
     
     prompt = PromptTemplate(
         input_variables=["customer_message", "chat_history"],
@@ -56,8 +77,9 @@ def run_memory_conversation():
     print("🎯 Simple Memory Example: Customer Service with Memory")
     print("=" * 60)
     
-    # Create the chain with memory
-    chain = create_memory_aware_customer_service()
+    # Conversations share one pool that keeps a single session in RAM and spills the rest to disk
+    pool_dir = tempfile.mkdtemp(prefix="memory-pool-")
+    pool = SessionMemoryPool(factory=create_session_memory, store=TranscriptStore(pool_dir), max_sessions=1)
     
     # Conversation scenarios
     conversations = [
@@ -77,16 +99,15 @@ def run_memory_conversation():
         ]
     ]
     
-    for scenario_num, messages in enumerate(conversations, 1):
-        print(f"\n🔄 Conversation Scenario {scenario_num}")
-        print("=" * 50)
-        
-        # Reset memory for each scenario
-        chain = create_memory_aware_customer_service()
-        
-        for turn_num, message in enumerate(messages, 1):
-            print(f"\n📧 Turn {turn_num}: '{message}'")
-            print("-" * 40)
+    # The customers write in turn, so each turn brings back a session the other one pushed out
+    for turn_num, turn_messages in enumerate(zip(*conversations), 1):
+        for scenario_num, message in enumerate(turn_messages, 1):
+            print(f"\n🔄 Conversation Scenario {scenario_num}, 📧 Turn {turn_num}: '{message}'")
+            print("-" * 50)
+            
+            # Each scenario keeps its own memory, rehydrated from disk if it was evicted; it stays
+            # checked out (and so resident) until its turn is done
+            chain = create_memory_aware_customer_service(memory=pool.acquire(f"scenario-{scenario_num}"))
             
             try:
                 # Run the chain
@@ -103,9 +124,17 @@ def run_memory_conversation():
                         print(f"  {i}. {role}: {msg.content[:100]}...")
                 else:
                     print("  No previous messages")
+                print_summary_window(chain.memory)
                 
             except Exception as e:
                 print(f"❌ Error: {e}")
+            finally:
+                pool.release(f"scenario-{scenario_num}")
+    
+    print_pool_stats(pool)
+    shutil.rmtree(pool_dir, ignore_errors=True)
+    print_cache_stats()
+    print_client_stats()
 
 def demonstrate_memory_types():
     """Demonstrate different types of memory components"""
@@ -129,7 +158,7 @@ def demonstrate_memory_types():
     
     # 2. ConversationSummaryMemory
     print("\n2️⃣ ConversationSummaryMemory (Summarized)")
-    summary_memory = ConversationSummaryMemory(llm=ChatOpenAI(temperature=0))
+    summary_memory = ConversationSummaryMemory(llm=get_chat_model(temperature=0))
     
     # Add the same messages
     summary_memory.chat_memory.add_user_message("I can't log in")
@@ -139,6 +168,40 @@ def demonstrate_memory_types():
     
     print("Conversation summary:")
     print(f"  {summary_memory.buffer}")
+    
+    # 3. TokenWindowMemory
+    print("\n3️⃣ TokenWindowMemory (Recent Turns Within a Token Budget)")
+    window_memory = TokenWindowMemory(return_messages=True, max_token_limit=40)
+    
+    # Add the same messages
+    window_memory.chat_memory.add_user_message("I can't log in")
+    window_memory.chat_memory.add_ai_message("I understand you're having login issues. Let me help you.")
+    window_memory.chat_memory.add_user_message("I tried resetting my password")
+    window_memory.chat_memory.add_ai_message("I see you've already tried password reset. Let me escalate this.")
+    
+    print("Messages sent with the next prompt (first issue pinned):")
+    for message in window_memory.window:
+        role = "👤 User" if isinstance(message, HumanMessage) else "🤖 Assistant"
+        print(f"  {role}: {message.content}")
+    print_memory_window(window_memory)
+    
+    # 4. SummaryWindowMemory
+    print("\n4️⃣ SummaryWindowMemory (Recent Turns + Background Summary)")
+    hybrid_memory = SummaryWindowMemory(llm=get_chat_model(temperature=0), return_messages=True,
+                                        max_token_limit=50)
+    
+    # Save the same turns; evicted ones are summarized by a background worker
+    hybrid_memory.save_context({"input": "I can't log in"},
+                               {"output": "I understand you're having login issues. Let me help you."})
+    hybrid_memory.save_context({"input": "I tried resetting my password"},
+                               {"output": "I see you've already tried password reset. Let me escalate this."})
+    hybrid_memory.wait_for_summary()  # Only so the demo shows the finished summary
+    
+    print("Messages sent with the next prompt:")
+    for message in hybrid_memory.load_memory_variables({})["history"]:
+        role = {"human": "👤 User", "ai": "🤖 Assistant"}.get(message.type, "📝 Summary")
+        print(f"  {role}: {message.content}")
+    print_summary_window(hybrid_memory)
 
 def interactive_memory_conversation():
     """Run an interactive conversation with memory"""
@@ -149,8 +212,10 @@ def interactive_memory_conversation():
     print("Type 'quit' to end the conversation.")
     print("-" * 50)
     
-    # Create the chain
-    chain = create_memory_aware_customer_service()
+    # Create the chain (with TRANSCRIPT_STORE_DIR set, the conversation survives restarts)
+    chain = create_memory_aware_customer_service(session_id="interactive-customer")
+    if chain.memory.chat_memory.messages:
+        print(f"💾 Resumed {len(chain.memory.chat_memory.messages)} messages from the transcript store")
     
     while True:
         message = input("\n👤 You: ").strip()
@@ -165,9 +230,7 @@ def interactive_memory_conversation():
         
         try:
             print("🤔 Processing...")
-            response = chain.invoke({"customer_message": message})
-            
-            print(f"\n🤖 Assistant: {response['text']}")
+            stream_chain(chain, {"customer_message": message}, output_key="text", prefix="\n🤖 Assistant: ")
             
             # Show memory info
             memory_count = len(chain.memory.chat_memory.messages)
@@ -182,7 +245,7 @@ def demonstrate_conversation_chain():
     print("=" * 40)
     
     # Create a conversation chain with memory
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.7)
+    llm = get_chat_model(model="gpt-3.5-turbo", temperature=0.7)
     memory = ConversationBufferMemory()
     
     conversation = ConversationChain(
@@ -211,10 +274,11 @@ def demonstrate_conversation_chain():
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and not using_fake_llm():
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline with the fake model)")
         exit(1)
     
     # Demonstrate memory types
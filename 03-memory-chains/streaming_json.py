@@ -0,0 +1,468 @@
+"""
+Incremental JSON Parser with Early Field Dispatch
+
+The structured steps (understanding, classification, routing, fused triage) return
+small JSON objects. Instead of waiting for the whole completion and then slicing
+between the first '{' and the last '}', this parser consumes the streamed tokens and
+reports each field the moment its value is complete, e.g. `routing.department`
+while the rest of the object is still being generated.
+
+It tolerates the usual LLM JSON defects and records what it repaired:
+- Prose or ```json fences before the object and text after it
+- Trailing commas, missing commas between fields
+- Single-quoted strings, unquoted keys, Python literals (True/False/None)
+- Raw newlines inside strings, bare words where a string was expected
+- Output cut off by max_tokens (open strings and containers are closed)
+
+Anything it cannot make sense of is raised as JSONOutputError with the position
+instead of silently handing back the raw string.
+
+EarlyDispatchChain puts this in a pipeline: it wraps a structured step and starts
+the work registered for a field (e.g. handing the ticket to `department`) in the
+background as soon as that field has streamed, while the model is still writing
+the rest of the object.
+"""
+
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Callable, Tuple
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.chains.base import Chain
+from langchain_core.callbacks.manager import CallbackManager
+
+from streaming import STRUCTURED_OUTPUT_TAG
+
+FieldCallback = Callable[[str, Any], None]
+
+LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class JSONOutputError(ValueError):
+    """Raised when an LLM output cannot be parsed into a JSON object"""
+
+    def __init__(self, message: str, text: str = "", position: Optional[int] = None):
+        self.message = message
+        location = f" at character {position}" if position is not None else ""
+        snippet = f" (output starts: {text[:60]!r})" if text else ""
+        super().__init__(f"{message}{location}{snippet}")
+        self.text = text
+        self.position = position
+
+class _Frame:
+    """An open object or array"""
+
+    def __init__(self, container, path: str):
+        self.container = container
+        self.path = path
+        self.key: Optional[str] = None
+        # object: "key" -> "colon" -> "value" -> "next"; array: "value" -> "next"
+        self.expect = "key" if isinstance(container, dict) else "value"
+
+class IncrementalJSONParser:
+    """Feed text chunks; completed fields are returned (and passed to `on_field`) as they close"""
+
+    def __init__(self, on_field: Optional[FieldCallback] = None):
+        self.on_field = on_field
+        self.root: Optional[Dict[str, Any]] = None
+        self.repairs: List[str] = []
+        self.errors: List[Tuple[int, str]] = []
+        self.position = 0
+        self.done = False
+        self._stack: List[_Frame] = []
+        self._mode: Optional[str] = None  # None, "string", "escape", "unicode", "bare"
+        self._quote = '"'
+        self._token: List[str] = []
+        self._unicode: List[str] = []
+        self._skipped_prefix = False
+        self._events: List[Tuple[str, Any]] = []
+
+    def _repair(self, message: str):
+        if message not in self.repairs:
+            self.repairs.append(message)
+
+    def _error(self, message: str):
+        self.errors.append((self.position, message))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk of text and return the fields completed by it"""
+        self._events = []
+        for char in chunk:
+            self._consume(char)
+            self.position += 1
+        return self._events
+
+    def _consume(self, char: str):
+        if self.done:
+            if not char.isspace() and char != "`":
+                self._repair("ignored text after the JSON object")
+            return
+
+        if not self._stack:
+            if char == "{":
+                self.root = {}
+                self._stack.append(_Frame(self.root, ""))
+            elif not char.isspace() and not self._skipped_prefix:
+                self._skipped_prefix = True
+                self._repair("skipped text before the JSON object")
+            return
+
+        if self._mode == "string":
+            if char == "\\":
+                self._mode = "escape"
+            elif char == self._quote:
+                self._mode = None
+                self._complete_scalar("".join(self._token), quoted=True)
+            else:
+                if char == "\n":
+                    self._repair("raw newline inside a string")
+                self._token.append(char)
+            return
+
+        if self._mode == "escape":
+            if char == "u":
+                self._mode = "unicode"
+                self._unicode = []
+            else:
+                self._token.append(ESCAPES.get(char, char))
+                self._mode = "string"
+            return
+
+        if self._mode == "unicode":
+            self._unicode.append(char)
+            if len(self._unicode) == 4:
+                try:
+                    self._token.append(chr(int("".join(self._unicode), 16)))
+                except ValueError:
+                    self._repair("invalid \\u escape kept as text")
+                    self._token.append("\\u" + "".join(self._unicode))
+                self._mode = "string"
+            return
+
+        if self._mode == "bare":
+            if char in ",:}]" or char.isspace():
+                self._mode = None
+                self._complete_scalar("".join(self._token), quoted=False)
+            else:
+                self._token.append(char)
+                return
+
+        self._structural(char)
+
+    def _structural(self, char: str):
+        frame = self._stack[-1]
+        is_object = isinstance(frame.container, dict)
+
+        if char.isspace():
+            return
+
+        if char in "\"'":
+            if frame.expect == "next":
+                self._repair("inserted a missing comma")
+                frame.expect = "key" if is_object else "value"
+            if frame.expect not in ("key", "value"):
+                self._error(f"unexpected string while expecting {frame.expect}")
+            if char == "'":
+                self._repair("single-quoted string")
+            self._mode = "string"
+            self._quote = char
+            self._token = []
+            return
+
+        if char in "{[":
+            if frame.expect == "next" and not is_object:
+                self._repair("inserted a missing comma")
+                frame.expect = "value"
+            if frame.expect != "value":
+                self._error(f"unexpected '{char}' while expecting {frame.expect}")
+                return
+            container = {} if char == "{" else []
+            self._stack.append(_Frame(container, self._child_path(frame)))
+            return
+
+        if char in "}]":
+            if (char == "}") != is_object:
+                self._error(f"mismatched '{char}'")
+                return
+            if frame.expect in ("colon", "value") and is_object:
+                self._repair(f"dropped key '{frame.key}' without a value")
+            elif frame.expect != "next" and frame.container:
+                self._repair("removed a trailing comma")
+            self._close_container()
+            return
+
+        if char == ":":
+            if is_object and frame.expect == "colon":
+                frame.expect = "value"
+            else:
+                self._error("unexpected ':'")
+            return
+
+        if char == ",":
+            if frame.expect == "next":
+                frame.expect = "key" if is_object else "value"
+            elif not is_object and frame.expect == "value":
+                self._repair("skipped an empty array element")
+            else:
+                self._error(f"unexpected ',' while expecting {frame.expect}")
+            return
+
+        # Numbers, literals, unquoted keys and bare words
+        if frame.expect == "next":
+            self._repair("inserted a missing comma")
+            frame.expect = "key" if is_object else "value"
+        self._mode = "bare"
+        self._token = [char]
+
+    def _child_path(self, frame: _Frame) -> str:
+        if isinstance(frame.container, dict):
+            return f"{frame.path}.{frame.key}" if frame.path else frame.key
+        return f"{frame.path}[{len(frame.container)}]"
+
+    def _complete_scalar(self, text: str, quoted: bool):
+        frame = self._stack[-1]
+        if isinstance(frame.container, dict) and frame.expect == "key":
+            if not quoted:
+                self._repair("unquoted key")
+            frame.key = text
+            frame.expect = "colon"
+            return
+
+        if quoted:
+            value = text
+        elif text in LITERALS:
+            if text[0].isupper():
+                self._repair("Python literal")
+            value = LITERALS[text]
+        else:
+            try:
+                value = json.loads(text)
+            except ValueError:
+                self._repair("bare word kept as a string")
+                value = text
+        self._complete_value(value)
+
+    def _complete_value(self, value: Any):
+        frame = self._stack[-1]
+        if frame.expect != "value":
+            self._error(f"unexpected value while expecting {frame.expect}")
+            return
+        if isinstance(frame.container, dict):
+            frame.container[frame.key] = value
+            self._emit(self._child_path(frame), value)
+        else:
+            frame.container.append(value)
+        frame.expect = "next"
+
+    def _close_container(self):
+        frame = self._stack.pop()
+        if not self._stack:
+            self.done = True
+            return
+        self._complete_value(frame.container)
+
+    def _emit(self, path: str, value: Any):
+        self._events.append((path, value))
+        if self.on_field:
+            self.on_field(path, value)
+
+    def finish(self) -> Dict[str, Any]:
+        """Close whatever the (possibly truncated) output left open and return the object"""
+        if self.root is None:
+            raise JSONOutputError("no JSON object found in the output")
+        if not self.done:
+            self._repair("closed output that was cut off")
+            if self._mode in ("string", "escape", "unicode"):
+                self._mode = None
+                self._complete_scalar("".join(self._token), quoted=True)
+            elif self._mode == "bare":
+                self._mode = None
+                self._complete_scalar("".join(self._token), quoted=False)
+            while self._stack:
+                self._close_container()
+        if self.errors:
+            position, message = self.errors[0]
+            if len(self.errors) > 1:
+                message += f" (+{len(self.errors) - 1} more errors)"
+            raise JSONOutputError(message, position=position)
+        return self.root
+
+def parse_json_output(output_str) -> Dict[str, Any]:
+    """Parse a complete LLM output into a dict, repairing common defects; raises JSONOutputError"""
+    if isinstance(output_str, dict):
+        return output_str
+    if not isinstance(output_str, str):
+        raise JSONOutputError(f"expected text, got {type(output_str).__name__}")
+    parser = IncrementalJSONParser()
+    parser.feed(output_str)
+    try:
+        return parser.finish()
+    except JSONOutputError as e:
+        raise JSONOutputError(e.message, text=output_str, position=e.position) from None
+
+def parse_json_or_warn(output_str, label: str) -> Dict[str, Any]:
+    """Parse for display: print the parse error and return an empty dict"""
+    try:
+        return parse_json_output(output_str)
+    except JSONOutputError as e:
+        print(f"⚠️  Could not parse {label}: {e}")
+        return {}
+
+class StreamingJSONHandler(BaseCallbackHandler):
+    """Parses streamed structured-output LLM runs and dispatches each field as it completes"""
+
+    def __init__(self, on_field: FieldCallback, tag: str = STRUCTURED_OUTPUT_TAG):
+        self.on_field = on_field
+        self.tag = tag
+        self.started_at = time.perf_counter()
+        self.timeline: List[Tuple[float, str]] = []
+        self._parsers: Dict[Any, IncrementalJSONParser] = {}
+
+    def _dispatch(self, path: str, value: Any):
+        self.timeline.append(((time.perf_counter() - self.started_at) * 1000, path))
+        self.on_field(path, value)
+
+    def on_llm_new_token(self, token: str, *, run_id=None, tags=None, **kwargs: Any) -> None:
+        if self.tag not in (tags or []):
+            return
+        if run_id not in self._parsers:
+            self._parsers[run_id] = IncrementalJSONParser(on_field=self._dispatch)
+        self._parsers[run_id].feed(token)
+
+    def on_llm_end(self, response, *, run_id=None, tags=None, **kwargs: Any) -> None:
+        parser = self._parsers.pop(run_id, None)
+        if parser is None and self.tag in (tags or []):
+            # Cached responses arrive whole, without token callbacks
+            parser = IncrementalJSONParser(on_field=self._dispatch)
+            parser.feed(response.generations[0][0].text)
+
+class EarlyDispatchStats:
+    """How far ahead of the complete structured output the dispatched work started"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.streamed = 0  # Started while the output was still being generated
+        self.after_output = 0  # Started from the finished output (cache hits, non-streaming models)
+        self.lead_ms = 0.0
+
+    def record(self, lead_ms: Optional[float]):
+        with self._lock:
+            if lead_ms is None:
+                self.after_output += 1
+            else:
+                self.streamed += 1
+                self.lead_ms += lead_ms
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"streamed": self.streamed, "after_output": self.after_output,
+                    "lead_ms_avg": self.lead_ms / self.streamed if self.streamed else 0.0}
+
+early_dispatch_stats = EarlyDispatchStats()
+
+class EarlyDispatchChain(Chain):
+    """Runs a structured-output step and starts `dispatch[path](value)` as soon as that field streams
+
+    The step's LLM must be created with streaming=True and tags=[STRUCTURED_OUTPUT_TAG].
+    Results are returned under `output_key` as {path: result}; a field that only exists
+    in the finished output (cached or non-streaming) is dispatched from it instead.
+    """
+
+    chain: Chain
+    dispatch: Dict[str, Callable[[Any], Any]]
+    output_key: str = "dispatched"
+    parse_key: Optional[str] = None  # Output holding the JSON; the step's only output by default
+
+    @property
+    def input_keys(self) -> List[str]:
+        return self.chain.input_keys
+
+    @property
+    def output_keys(self) -> List[str]:
+        return self.chain.output_keys + [self.output_key]
+
+    def _call(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        started: Dict[str, Tuple[float, Future]] = {}
+        lock = threading.Lock()
+        executor = ThreadPoolExecutor(max_workers=len(self.dispatch) or 1)
+
+        def on_field(path: str, value: Any):
+            if path in self.dispatch:
+                with lock:
+                    if path not in started:
+                        started[path] = (time.perf_counter(), executor.submit(self.dispatch[path], value))
+
+        callbacks = run_manager.get_child() if run_manager else CallbackManager([])
+        callbacks.add_handler(StreamingJSONHandler(on_field=on_field))
+        try:
+            result = self.chain.invoke(inputs, config={"callbacks": callbacks})
+            output_complete = time.perf_counter()
+            streamed = dict(started)
+            if len(started) < len(self.dispatch):
+                parse_key = self.parse_key or self.chain.output_keys[0]
+                parser = IncrementalJSONParser(on_field=on_field)
+                parser.feed(json.dumps(result[parse_key]) if isinstance(result[parse_key], dict) else result[parse_key])
+            dispatched = {path: future.result() for path, (_, future) in started.items()}
+        finally:
+            executor.shutdown(wait=False)
+
+        for path in started:
+            lead_ms = (output_complete - streamed[path][0]) * 1000 if path in streamed else None
+            early_dispatch_stats.record(lead_ms)
+            if run_manager:
+                when = f"{lead_ms:.0f}ms before the output was complete" if lead_ms is not None else "from the output"
+                run_manager.on_text(f"Dispatched {path} {when}\n", verbose=self.verbose)
+        outputs = {key: result[key] for key in self.chain.output_keys}
+        outputs[self.output_key] = dispatched
+        return outputs
+
+def print_early_dispatch_stats():
+    """Print how much earlier dispatched work started than the complete structured output"""
+    report = early_dispatch_stats.report()
+    if report["streamed"] or report["after_output"]:
+        print(f"🚀 Early dispatch: {report['streamed']} started while streaming "
+              f"({report['lead_ms_avg']:.0f} ms before the output was complete on average), "
+              f"{report['after_output']} from finished outputs")
+
+def demonstrate_early_dispatch(chunk_size: int = 4, seconds_per_chunk: float = 0.01):
+    """Stream a defective fused-triage output and show when each field becomes available, offline"""
+    output = """Here is the analysis:
+```json
+{
+  "understanding": {"main_issue": "Cannot log in", 'customer_emotion': "frustrated",
+                    "urgency_level": "high", "context": ["2 hours", "password reset failed",]},
+  "routing": {department: "technical", "priority": "high", "agent_requirements": ["account access"]
+  "sla_target": "1 hour"},
+  "classification": {"category": "technical", "requires_escalation": True, "complexity": "moderate", "estimated_resolution_time": "2 ho"""
+
+    print("\n🧩 Incremental JSON Parsing Demo")
+    print("=" * 50)
+    try:
+        json.loads(output[output.find("{"):output.rfind("}") + 1])
+    except json.JSONDecodeError as e:
+        print(f"json.loads on the find/rfind slice: ❌ {e}")
+
+    start = time.perf_counter()
+    parser = IncrementalJSONParser()
+    for i in range(0, len(output), chunk_size):
+        time.sleep(seconds_per_chunk)  # Stand-in for token streaming
+        for path, value in parser.feed(output[i:i + chunk_size]):
+            if "." in path and not isinstance(value, (dict, list)):
+                marker = "🚀" if path == "routing.department" else "  "
+                print(f"{marker} {(time.perf_counter() - start) * 1000:6.0f}ms {path} = {value!r}")
+    result = parser.finish()
+    print(f"✅ Complete after {(time.perf_counter() - start) * 1000:.0f}ms with {len(result)} sections")
+    print(f"🔧 Repairs: {', '.join(parser.repairs)}")
+
+    try:
+        parse_json_output("Sorry, I can't help with that.")
+    except JSONOutputError as e:
+        print(f"❌ Reported, not swallowed: {e}")
+
+if __name__ == "__main__":
+    demonstrate_early_dispatch()
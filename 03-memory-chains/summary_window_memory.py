@@ -0,0 +1,207 @@
+"""
+Background-summarized Window Memory
+
+ConversationSummaryMemory re-summarizes inside save_context, so every turn waits for
+an extra model call before the customer gets an answer. SummaryWindowMemory keeps
+summarization off the request path:
+
+- Verbatim window: the newest turns within the token budget, as TokenWindowMemory
+- Rolling summary: turns that slide out of the window are folded into the summary
+  incrementally (only the newly evicted lines are sent, with the current summary)
+- Off the request path: a background worker updates the summary; prompts always use
+  the latest completed summary, even while a refresh is in flight, and never wait
+- Failures keep the previous summary; the evicted turns are retried on the next turn
+
+Turns evicted while a refresh is running are folded in by the next refresh, so for a
+moment they are in neither the window nor the summary. Run `python summary_window_memory.py`
+to compare per-turn latency with ConversationSummaryMemory.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from langchain.memory import ConversationSummaryMemory
+from langchain.memory.summary import SummarizerMixin
+from langchain.schema import BaseMessage, get_buffer_string
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from compact_history import lazy_messages
+from fake_llm import FakeChatModel, PROFILES
+from token_window_memory import TokenWindowMemory, count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+SUMMARY_WORKERS = int(os.getenv("MEMORY_SUMMARY_WORKERS", "2"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_summary_executor() -> ThreadPoolExecutor:
+    """Worker pool shared by all summary memories (each memory has at most one refresh in flight)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="memory-summary")
+        return _executor
+
+class SummaryWindowMemory(TokenWindowMemory, SummarizerMixin):
+    """Token window of recent messages plus a summary of older ones, refreshed in the background"""
+
+    _summary: str = PrivateAttr(default="")
+    _summary_tokens: int = PrivateAttr(default=0)
+    _summarized_upto: int = PrivateAttr(default=0)
+    _refresh: Optional[Future] = PrivateAttr(default=None)
+    _generation: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _refresh_stats: Dict[str, float] = PrivateAttr(default_factory=dict)
+
+    @property
+    def summary(self) -> str:
+        """The latest completed summary ("" until the first refresh finishes)"""
+        return self._summary
+
+    def _reserved_tokens(self) -> int:
+        # The summary is sent with every prompt, so it comes out of the window's budget
+        return self._pinned_tokens + self._summary_tokens
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        window = self.window
+        # A grown summary can push more turns out of the window; queue them without waiting
+        self._schedule_refresh()
+        with self._lock:
+            summary = self._summary
+            if self._refresh is not None:
+                self._count("stale_loads")
+        if summary:
+            dropped_pins = sum(1 for i in self._pinned if i < self._window_start)
+            window = window[:dropped_pins] + [self.summary_message_cls(content=summary)] + window[dropped_pins:]
+        if self.return_messages:
+            return {self.memory_key: window}
+        return {self.memory_key: get_buffer_string(window, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        """Hand newly evicted messages to the background worker, unless a refresh is already running"""
+        with self._lock:
+            if self._refresh is not None or self._window_start <= self._summarized_upto:
+                return
+            start, end = self._summarized_upto, self._window_start
+            pinned = set(self._pinned)
+            messages = lazy_messages(self.chat_memory)
+            evicted = [messages[i] for i in range(start, end) if i not in pinned]
+            self._refresh = get_summary_executor().submit(self._refresh_summary, evicted, self._summary, end,
+                                                          self._generation)
+
+    def _refresh_summary(self, evicted: List[BaseMessage], summary: str, end: int, generation: int):
+        """Worker: fold the evicted messages into the summary, then pick up anything evicted meanwhile"""
+        start = time.perf_counter()
+        try:
+            new_summary = self.predict_new_summary(evicted, summary) if evicted else summary
+        except Exception as e:
+            # Keep the old summary; the same messages are retried after the next turn
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._refresh = None
+                self._count("failures")
+                self._refresh_stats["last_error"] = str(e)
+            return
+        with self._lock:
+            if generation != self._generation:
+                return  # The memory was cleared while this refresh ran
+            self._summary = new_summary.strip()
+            self._summary_tokens = count_tokens(self._summary) + MESSAGE_OVERHEAD_TOKENS if self._summary else 0
+            self._summarized_upto = end
+            self._refresh = None
+            self._count("refreshes")
+            self._count("summarized_messages", len(evicted))
+            self._refresh_stats["last_refresh_ms"] = (time.perf_counter() - start) * 1000
+        self._schedule_refresh()
+
+    def _count(self, name: str, amount: int = 1):
+        self._refresh_stats[name] = self._refresh_stats.get(name, 0) + amount
+
+    def wait_for_summary(self, timeout: Optional[float] = None) -> str:
+        """Block until no refresh is in flight (for shutdown and demos, never on the request path)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                refresh = self._refresh
+            if refresh is None:
+                return self._summary
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            refresh.exception(timeout=remaining)
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self._summary = ""
+            self._summary_tokens = 0
+            self._summarized_upto = 0
+            # A refresh still in flight belongs to the old conversation; its result is dropped
+            self._generation += 1
+            self._refresh = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Window stats plus the summary's size, refresh counts and how far it lags the window"""
+        stats = super().stats()
+        with self._lock:
+            stats.update({
+                "window_tokens": stats["window_tokens"] + self._summary_tokens,
+                "summary_tokens": self._summary_tokens,
+                "pending_messages": max(0, self._window_start - self._summarized_upto),
+                "refresh_in_flight": self._refresh is not None,
+                "refreshes": int(self._refresh_stats.get("refreshes", 0)),
+                "failures": int(self._refresh_stats.get("failures", 0)),
+                "stale_loads": int(self._refresh_stats.get("stale_loads", 0)),
+                "last_refresh_ms": self._refresh_stats.get("last_refresh_ms", 0.0)
+            })
+        return stats
+
+def print_summary_window(memory: SummaryWindowMemory):
+    """Print the window, the summary and whether the summary is keeping up"""
+    stats = memory.stats()
+    print(f"📝 Summary: {stats['summary_tokens']} tokens, {stats['refreshes']} background refreshes "
+          f"(last {stats['last_refresh_ms']:.0f} ms), {stats['pending_messages']} evicted messages pending, "
+          f"{stats['failures']} failures")
+    summary = " + summary" if stats["summary_tokens"] else ""
+    print(f"🪟 Prompt history: {stats['window_messages']} verbatim messages{summary}, "
+          f"{stats['window_tokens']}/{memory.max_token_limit} tokens (full history {stats['history_tokens']})")
+
+def demonstrate_summary_window(turns: int = 12, max_token_limit: int = 200, profile: str = "gpt-3.5-turbo"):
+    """Per-turn memory latency of in-request summarization versus background summarization, offline"""
+    llm = FakeChatModel(temperature=0, profile=PROFILES[profile])
+    blocking = ConversationSummaryMemory(llm=llm, memory_key="chat_history", input_key="customer_message",
+                                         return_messages=True)
+    background = SummaryWindowMemory(llm=llm, memory_key="chat_history", input_key="customer_message",
+                                     return_messages=True, max_token_limit=max_token_limit)
+
+    print("\n📝 Background Summary Memory Demo")
+    print("=" * 60)
+    print(f"{turns} turns, {max_token_limit}-token budget, summarizer latency profile '{profile}'\n")
+    print(f"{'turn':>6} {'in-request ms':>14} {'background ms':>14} {'refresh running':>16}")
+    totals = [0.0, 0.0]
+    for turn in range(1, turns + 1):
+        message = f"Update {turn}: my order #{1000 + turn} still hasn't shipped and the tracking page is blank."
+        reply = {"text": f"Sorry about order #{1000 + turn}. I've asked the warehouse to check it and will email you."}
+        timings = []
+        for memory in (blocking, background):
+            start = time.perf_counter()
+            memory.load_memory_variables({"customer_message": message})
+            memory.save_context({"customer_message": message}, reply)
+            timings.append((time.perf_counter() - start) * 1000)
+        totals = [total + timing for total, timing in zip(totals, timings)]
+        in_flight = "yes" if background.stats()["refresh_in_flight"] else "no"
+        print(f"{turn:>6} {timings[0]:>14.1f} {timings[1]:>14.1f} {in_flight:>16}")
+
+    print(f"\nMemory time over {turns} turns: in-request {totals[0]:.0f} ms, background {totals[1]:.0f} ms")
+    background.wait_for_summary()
+    print(f"Summary after catching up: '{background.summary}'")
+    print_summary_window(background)
+
+if __name__ == "__main__":
+    demonstrate_summary_window()
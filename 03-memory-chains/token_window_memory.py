@@ -0,0 +1,189 @@
+"""
+Token-budgeted Sliding-Window Memory
+
+ConversationBufferMemory resends the whole transcript every turn, so prompt size,
+latency and cost grow linearly with the length of the conversation. TokenWindowMemory
+keeps only the most recent messages that fit a token budget:
+
+- Incremental counting: each message is tokenized once, when it is appended; the
+  window start only moves forward, so a turn costs O(new messages), not O(history)
+- Pinned messages: system messages and the customer's first message (the original
+  issue) are always sent, whatever the window has dropped
+- Drop-in: same `memory_key`, `input_key` and `return_messages` wiring as
+  ConversationBufferMemory
+
+Tokens are counted with tiktoken when its encoding is available and estimated at
+~4 characters per token otherwise (e.g. offline). Run `python token_window_memory.py`
+to compare prompt sizes with the full buffer over a long conversation.
+"""
+
+import os
+import time
+from typing import Dict, List, Any, Callable
+
+from langchain.memory import ConversationBufferMemory
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.schema import BaseMessage, SystemMessage, HumanMessage, get_buffer_string
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from compact_history import lazy_messages
+
+DEFAULT_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "1000"))
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators of one chat message
+
+_encoding = None
+_encoding_failed = False
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken (cl100k_base), or a ~4 characters/token estimate without it"""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Not installed, or the encoding file cannot be downloaded
+            _encoding_failed = True
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+class TokenWindowMemory(BaseChatMemory):
+    """Chat memory that returns the pinned messages plus the newest messages within `max_token_limit`"""
+
+    memory_key: str = "history"
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    max_token_limit: int = DEFAULT_MAX_TOKENS
+    pin_first_human: bool = True
+    token_counter: Callable[[str], int] = count_tokens
+
+    _token_counts: List[int] = PrivateAttr(default_factory=list)
+    _pinned: List[int] = PrivateAttr(default_factory=list)
+    _window_start: int = PrivateAttr(default=0)
+    _window_tokens: int = PrivateAttr(default=0)
+    _pinned_tokens: int = PrivateAttr(default=0)
+    _total_tokens: int = PrivateAttr(default=0)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def _is_pinned(self, index: int, message: BaseMessage) -> bool:
+        if isinstance(message, SystemMessage):
+            return True
+        if not (self.pin_first_human and isinstance(message, HumanMessage)):
+            return False
+        return not any(isinstance(lazy_messages(self.chat_memory)[i], HumanMessage) for i in self._pinned)
+
+    def _sync(self):
+        """Count messages appended since the last call and slide the window forward"""
+        messages = lazy_messages(self.chat_memory)
+        if len(messages) < len(self._token_counts):
+            self._reset_counts()
+
+        for index in range(len(self._token_counts), len(messages)):
+            tokens = self.token_counter(str(messages[index].content)) + MESSAGE_OVERHEAD_TOKENS
+            self._token_counts.append(tokens)
+            self._total_tokens += tokens
+            if self._is_pinned(index, messages[index]):
+                self._pinned.append(index)
+                self._pinned_tokens += tokens
+            else:
+                self._window_tokens += tokens
+
+        # Pinned messages are paid for first; the window gets what is left
+        budget = self.max_token_limit - self._reserved_tokens()
+        pinned = set(self._pinned)
+        while self._window_tokens > budget and self._window_start < len(messages):
+            if self._window_start not in pinned:
+                self._window_tokens -= self._token_counts[self._window_start]
+            self._window_start += 1
+
+    def _reserved_tokens(self) -> int:
+        """Tokens of the budget taken before the window: the pinned messages"""
+        return self._pinned_tokens
+
+    def _reset_counts(self):
+        self._token_counts = []
+        self._pinned = []
+        self._window_start = 0
+        self._window_tokens = 0
+        self._pinned_tokens = 0
+        self._total_tokens = 0
+
+    @property
+    def window(self) -> List[BaseMessage]:
+        """Pinned messages that fell out of the window, then the window itself, in conversation order"""
+        self._sync()
+        messages = lazy_messages(self.chat_memory)
+        dropped_pins = [messages[i] for i in self._pinned if i < self._window_start]
+        return dropped_pins + messages[self._window_start:]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        window = self.window
+        if self.return_messages:
+            return {self.memory_key: window}
+        return {self.memory_key: get_buffer_string(window, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self._sync()
+
+    def clear(self) -> None:
+        super().clear()
+        self._reset_counts()
+
+    def stats(self) -> Dict[str, int]:
+        """Tokens sent per turn now versus what the full history would cost"""
+        self._sync()
+        sent = self._pinned_tokens + self._window_tokens
+        return {
+            "messages": len(lazy_messages(self.chat_memory)),
+            "window_messages": len(self.window),
+            "window_tokens": sent,
+            "history_tokens": self._total_tokens,
+            "dropped_messages": self._window_start - sum(1 for i in self._pinned if i < self._window_start)
+        }
+
+def print_memory_window(memory: TokenWindowMemory):
+    """Print how much of the conversation the next prompt will carry"""
+    stats = memory.stats()
+    print(f"🪟 Memory window: {stats['window_messages']}/{stats['messages']} messages, "
+          f"{stats['window_tokens']}/{memory.max_token_limit} tokens "
+          f"(full history {stats['history_tokens']}, {stats['dropped_messages']} dropped)")
+
+def demonstrate_token_window(turns: int = 300, max_token_limit: int = 800):
+    """Compare prompt size and memory overhead with ConversationBufferMemory over a long conversation, offline"""
+    buffer_memory = ConversationBufferMemory(memory_key="chat_history", input_key="customer_message",
+                                             return_messages=True)
+    window_memory = TokenWindowMemory(memory_key="chat_history", input_key="customer_message",
+                                      return_messages=True, max_token_limit=max_token_limit)
+
+    print("\n🪟 Token Window Memory Demo")
+    print("=" * 60)
+    print(f"{turns} turns, window budget {max_token_limit} tokens\n")
+    print(f"{'turn':>6} {'buffer tokens':>14} {'window tokens':>14} {'buffer ms':>10} {'window ms':>10}")
+    for turn in range(1, turns + 1):
+        message = "I can't log into my account and the reset email never arrives." if turn == 1 else \
+            f"Follow-up {turn}: I tried the steps you sent but the page still shows an error."
+        timings = []
+        for memory in (buffer_memory, window_memory):
+            start = time.perf_counter()
+            history = memory.load_memory_variables({"customer_message": message})["chat_history"]
+            # What the buffer costs: its history is re-tokenized for the prompt every turn
+            tokens = sum(count_tokens(str(m.content)) + MESSAGE_OVERHEAD_TOKENS for m in history) \
+                if memory is buffer_memory else memory.stats()["window_tokens"]
+            timings.append(((time.perf_counter() - start) * 1000, tokens))
+            memory.save_context({"customer_message": message},
+                                {"text": "Thanks for the details. Please try clearing your browser cache and "
+                                         "requesting a new reset link; I've also flagged your account."})
+        if turn in (1, 10, 50, 100, 200, turns):
+            print(f"{turn:>6} {timings[0][1]:>14} {timings[1][1]:>14} {timings[0][0]:>10.3f} {timings[1][0]:>10.3f}")
+
+    first = window_memory.window[0]
+    print(f"\nPinned first issue still in the prompt: '{first.content}'")
+    print_memory_window(window_memory)
+
+if __name__ == "__main__":
+    demonstrate_token_window()
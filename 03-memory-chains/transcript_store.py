@@ -0,0 +1,460 @@
+"""
+Persistent Session Transcript Store
+
+Chat memory normally lives in process RAM, so a restart loses every conversation and
+two workers cannot serve the same session. TranscriptStore keeps each session's
+transcript on disk:
+
+- Append-only segments: each session writes records to numbered segment files and
+  rolls over to a new segment at `segment_bytes`; nothing is ever rewritten
+- Compact records: a 17-byte header (length, CRC32, message type, timestamp) and the
+  UTF-8 content; messages with extra fields are stored as JSON
+- Offset index: one fixed 12-byte entry (segment, offset) per record, so the last N
+  records are found without scanning the segments
+- mmap reads: records are sliced out of memory-mapped segments; nothing is parsed
+  that is not returned
+- Several workers: appends take an exclusive file lock on the session's index, and
+  readers pick up records other processes appended by checking the index size
+- Many sessions: files are opened per call and sessions are spread over hashed
+  shard directories, so tens of thousands of sessions need no open handles
+- Cold compression: compress_session()/compress_idle() rewrite an idle session's
+  segments as compressed blocks cut at record boundaries (see cold_compression.py);
+  index offsets stay valid, reads decompress only the blocks they touch, and later
+  appends start a new plain segment
+
+PersistentChatMessageHistory plugs the store into any memory class as `chat_memory`.
+Run `python transcript_store.py` for write/read throughput and a restart demo.
+"""
+
+import os
+import json
+import mmap
+import time
+import shutil
+import struct
+import zlib
+import bisect
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one worker per session
+    fcntl = None
+
+from langchain.memory import ChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (BaseMessage, HumanMessage, AIMessage, SystemMessage,
+                                     message_to_dict, messages_from_dict)
+
+from cold_compression import (DEFAULT_CODEC, compress_block, decompress_block, active_dictionary_id,
+                              get_dictionary, register_dictionary)
+
+DEFAULT_SEGMENT_BYTES = int(os.getenv("TRANSCRIPT_SEGMENT_BYTES", str(1024 * 1024)))
+
+RECORD_HEADER = struct.Struct("<IIBd")  # payload length, CRC32 of payload, kind, unix timestamp
+INDEX_ENTRY = struct.Struct("<IQ")  # segment number, offset of the record in the segment
+COMPRESSED_MAGIC = b"TSZ1"
+COMPRESSED_HEADER = struct.Struct("<4sI")  # magic, block count
+BLOCK_ENTRY = struct.Struct("<QQI")  # offset of the block's first record in the plain segment, file offset, length
+COMPRESSED_BLOCK_BYTES = 16 * 1024
+
+KIND_JSON = 0
+KIND_BY_TYPE = {"human": 1, "ai": 2, "system": 3}
+CLASS_BY_KIND = {1: HumanMessage, 2: AIMessage, 3: SystemMessage}
+
+class TranscriptCorruptionError(Exception):
+    """A record's checksum or framing does not match what the index says"""
+
+def encode_record(message: BaseMessage, timestamp: Optional[float] = None) -> bytes:
+    """Header plus payload for one message (plain text for simple messages, JSON otherwise)"""
+    kind = KIND_BY_TYPE.get(message.type, KIND_JSON)
+    if kind != KIND_JSON and isinstance(message.content, str) and not message.additional_kwargs:
+        payload = message.content.encode("utf-8")
+    else:
+        kind = KIND_JSON
+        payload = json.dumps(message_to_dict(message), separators=(",", ":")).encode("utf-8")
+    header = RECORD_HEADER.pack(len(payload), zlib.crc32(payload), kind,
+                                time.time() if timestamp is None else timestamp)
+    return header + payload
+
+def decode_record(buffer, offset: int) -> BaseMessage:
+    """The message stored at `offset` of a segment buffer"""
+    if offset + RECORD_HEADER.size > len(buffer):
+        raise TranscriptCorruptionError(f"record header at offset {offset} is past the end of the segment")
+    length, crc, kind, _ = RECORD_HEADER.unpack_from(buffer, offset)
+    start = offset + RECORD_HEADER.size
+    payload = buffer[start:start + length]
+    if len(payload) != length or zlib.crc32(payload) != crc:
+        raise TranscriptCorruptionError(f"record at offset {offset} fails its checksum")
+    if kind == KIND_JSON:
+        return messages_from_dict([json.loads(payload)])[0]
+    return CLASS_BY_KIND[kind](content=payload.decode("utf-8"))
+
+class TranscriptStore:
+    """Per-session append-only transcripts under one root directory"""
+
+    def __init__(self, root: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        os.makedirs(root, exist_ok=True)
+        self._load_dictionaries()
+
+    def _dictionary_dir(self) -> str:
+        return os.path.join(self.root, "dictionaries")
+
+    def _load_dictionaries(self):
+        """Register the compression dictionaries that blocks in this store were written with"""
+        if os.path.isdir(self._dictionary_dir()):
+            for name in os.listdir(self._dictionary_dir()):
+                with open(os.path.join(self._dictionary_dir(), name), "rb") as dictionary:
+                    register_dictionary(dictionary.read())
+
+    def _save_dictionary(self):
+        dictionary_id = active_dictionary_id()
+        path = os.path.join(self._dictionary_dir(), f"{dictionary_id:08x}.zdict")
+        if not os.path.exists(path):
+            os.makedirs(self._dictionary_dir(), exist_ok=True)
+            with open(path + ".tmp", "wb") as dictionary:
+                dictionary.write(get_dictionary(dictionary_id))
+            os.replace(path + ".tmp", path)
+
+    def session_dir(self, session_id: str) -> str:
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        # 256 shard directories keep any one directory small with many sessions
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _index_path(self, session_id: str) -> str:
+        return os.path.join(self.session_dir(session_id), "index")
+
+    def _segment_path(self, session_id: str, segment: int, compressed: bool = False) -> str:
+        return os.path.join(self.session_dir(session_id), f"{segment:08d}.seg{'z' if compressed else ''}")
+
+    def count(self, session_id: str) -> int:
+        """Records stored for the session (a partly written index entry does not count)"""
+        try:
+            return os.path.getsize(self._index_path(session_id)) // INDEX_ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]) -> int:
+        """Append messages under the session lock; returns the record count afterwards"""
+        if not messages:
+            return self.count(session_id)
+        with self._locked_index(self.session_dir(session_id)) as index:
+            return self._append_locked(session_id, index, messages)
+
+    @contextmanager
+    def _locked_index(self, directory: str):
+        """The session's index file, held under an exclusive lock (appends and compression)"""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "index"), "a+b") as index:
+            if fcntl is not None:
+                fcntl.flock(index.fileno(), fcntl.LOCK_EX)
+            try:
+                yield index
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(index.fileno(), fcntl.LOCK_UN)
+
+    def _append_locked(self, session_id: str, index, messages: Sequence[BaseMessage]) -> int:
+        index_size = os.fstat(index.fileno()).st_size
+        if index_size % INDEX_ENTRY.size:
+            # A writer died mid-entry; drop the fragment so entries stay aligned
+            index_size -= index_size % INDEX_ENTRY.size
+            index.truncate(index_size)
+        segment = 0
+        if index_size:
+            index.seek(index_size - INDEX_ENTRY.size)
+            segment, _ = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+
+        entries = []
+        records = [encode_record(message) for message in messages]
+        position = 0
+        while position < len(records):
+            if os.path.exists(self._segment_path(session_id, segment, compressed=True)):
+                segment += 1  # Compressed segments are sealed
+                continue
+            with open(self._segment_path(session_id, segment), "ab") as segment_file:
+                offset = segment_file.tell()
+                if offset >= self.segment_bytes:
+                    segment += 1
+                    continue
+                chunk = []
+                while position < len(records) and (offset < self.segment_bytes or not chunk):
+                    entries.append(INDEX_ENTRY.pack(segment, offset))
+                    chunk.append(records[position])
+                    offset += len(records[position])
+                    position += 1
+                segment_file.write(b"".join(chunk))
+                segment_file.flush()
+        # Records are on disk before the index points at them, so readers never see a partial record
+        index.seek(index_size)
+        index.write(b"".join(entries))
+        index.flush()
+        return index_size // INDEX_ENTRY.size + len(entries)
+
+    def read_range(self, session_id: str, start: int, end: Optional[int] = None) -> List[BaseMessage]:
+        """Messages [start, end) of the session, read through mmap"""
+        entries = self._index_entries(session_id, start, end)
+        messages = []
+        for segment, offsets in self._group_by_segment(entries):
+            try:
+                segment_file = open(self._segment_path(session_id, segment), "rb")
+            except FileNotFoundError:
+                # Compressed (possibly since the index was read)
+                messages.extend(self._read_compressed(self._segment_path(session_id, segment, compressed=True),
+                                                      offsets))
+                continue
+            with segment_file, mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                messages.extend(decode_record(buffer, offset) for offset in offsets)
+        return messages
+
+    def _read_compressed(self, path: str, offsets: List[int]) -> List[BaseMessage]:
+        """Records at plain-segment `offsets` from a compressed segment, decompressing each block once"""
+        with open(path, "rb") as segment_file, \
+                mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, count = COMPRESSED_HEADER.unpack_from(buffer)
+            if magic != COMPRESSED_MAGIC:
+                raise TranscriptCorruptionError(f"{path} is not a compressed segment")
+            table = [BLOCK_ENTRY.unpack_from(buffer, COMPRESSED_HEADER.size + i * BLOCK_ENTRY.size)
+                     for i in range(count)]
+            starts = [entry[0] for entry in table]
+            blocks: Dict[int, bytes] = {}
+            messages = []
+            for offset in offsets:
+                block = bisect.bisect_right(starts, offset) - 1
+                if block not in blocks:
+                    start, position, length = table[block]
+                    try:
+                        blocks[block] = decompress_block(buffer[position:position + length])
+                    except KeyError:
+                        # Written with a dictionary another process saved after this store was opened
+                        self._load_dictionaries()
+                        blocks[block] = decompress_block(buffer[position:position + length])
+                messages.append(decode_record(blocks[block], offset - table[block][0]))
+            return messages
+
+    def read_last(self, session_id: str, n: int) -> List[BaseMessage]:
+        """The last `n` messages of the session"""
+        return self.read_range(session_id, max(0, self.count(session_id) - n))
+
+    def _index_entries(self, session_id: str, start: int, end: Optional[int]) -> List[Tuple[int, int]]:
+        count = self.count(session_id)
+        end = count if end is None else min(end, count)
+        if start >= end:
+            return []
+        with open(self._index_path(session_id), "rb") as index:
+            with mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return [INDEX_ENTRY.unpack_from(buffer, i * INDEX_ENTRY.size) for i in range(start, end)]
+
+    @staticmethod
+    def _group_by_segment(entries: List[Tuple[int, int]]) -> List[Tuple[int, List[int]]]:
+        groups = []
+        for segment, offset in entries:
+            if groups and groups[-1][0] == segment:
+                groups[-1][1].append(offset)
+            else:
+                groups.append((segment, [offset]))
+        return groups
+
+    def compress_session(self, session_id: str, codec: str = DEFAULT_CODEC) -> Dict[str, int]:
+        """Compress the session's plain segments; returns plain and compressed bytes"""
+        return self._compress_dir(self.session_dir(session_id), codec)
+
+    def compress_idle(self, idle_seconds: float, codec: str = DEFAULT_CODEC) -> Dict[str, int]:
+        """Compress every session with no append for `idle_seconds`; returns totals"""
+        totals = {"sessions": 0, "plain_bytes": 0, "compressed_bytes": 0}
+        cutoff = time.time() - idle_seconds
+        for shard in sorted(os.listdir(self.root)):
+            shard_dir = os.path.join(self.root, shard)
+            if len(shard) != 2 or not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                directory = os.path.join(shard_dir, name)
+                index_path = os.path.join(directory, "index")
+                if not os.path.exists(index_path) or os.path.getmtime(index_path) > cutoff:
+                    continue
+                result = self._compress_dir(directory, codec)
+                if result["plain_bytes"]:
+                    totals["sessions"] += 1
+                    totals["plain_bytes"] += result["plain_bytes"]
+                    totals["compressed_bytes"] += result["compressed_bytes"]
+        return totals
+
+    def _compress_dir(self, directory: str, codec: str) -> Dict[str, int]:
+        plain_total = compressed_total = 0
+        with self._locked_index(directory) as index:
+            index.seek(0)
+            data = index.read()
+            entries = [INDEX_ENTRY.unpack_from(data, i) for i in range(0, len(data) - len(data) % INDEX_ENTRY.size,
+                                                                        INDEX_ENTRY.size)]
+            if codec == "zlib":
+                self._save_dictionary()
+            for segment, offsets in self._group_by_segment(entries):
+                path = os.path.join(directory, f"{segment:08d}.seg")
+                if not os.path.exists(path):
+                    continue
+                with open(path, "rb") as segment_file:
+                    plain = segment_file.read()
+                compressed = self._compressed_segment(plain, offsets, codec)
+                with open(path + "z.tmp", "wb") as segment_file:
+                    segment_file.write(compressed)
+                os.replace(path + "z.tmp", path + "z")
+                os.remove(path)
+                plain_total += len(plain)
+                compressed_total += len(compressed)
+        return {"plain_bytes": plain_total, "compressed_bytes": compressed_total}
+
+    @staticmethod
+    def _compressed_segment(plain: bytes, offsets: List[int], codec: str) -> bytes:
+        """Header, block table and blocks of whole records (bytes past the last record are dropped)"""
+        groups, start = [], None
+        for offset in offsets:
+            length, _, _, _ = RECORD_HEADER.unpack_from(plain, offset)
+            end = offset + RECORD_HEADER.size + length
+            if start is None or end - start > COMPRESSED_BLOCK_BYTES:
+                groups.append([offset, end])
+                start = offset
+            else:
+                groups[-1][1] = end
+        blocks = [(first, compress_block(plain[first:end], codec)) for first, end in groups]
+        position = COMPRESSED_HEADER.size + BLOCK_ENTRY.size * len(blocks)
+        table = []
+        for first, block in blocks:
+            table.append(BLOCK_ENTRY.pack(first, position, len(block)))
+            position += len(block)
+        return (COMPRESSED_HEADER.pack(COMPRESSED_MAGIC, len(blocks)) + b"".join(table)
+                + b"".join(block for _, block in blocks))
+
+    def delete(self, session_id: str):
+        """Remove the session's transcript"""
+        shutil.rmtree(self.session_dir(session_id), ignore_errors=True)
+
+    def disk_usage(self) -> Dict[str, int]:
+        """Files and bytes under the store root"""
+        files = size = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                files += 1
+                size += os.path.getsize(os.path.join(directory, name))
+        return {"files": files, "bytes": size}
+
+class PersistentChatMessageHistory(BaseChatMessageHistory):
+    """Chat history of one session backed by a TranscriptStore, usable as any memory's `chat_memory`"""
+
+    def __init__(self, session_id: str, store: "TranscriptStore", resume_messages: Optional[int] = None):
+        self.session_id = session_id
+        self.store = store
+        # Older records stay on disk; a restarted worker only loads this many
+        self.resume_messages = resume_messages
+        self._messages: List[BaseMessage] = []
+        self._loaded_upto: Optional[int] = None
+        self._resumed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """Loaded messages, plus any that this or another worker appended since the last call"""
+        with self._lock:
+            count = self.store.count(self.session_id)
+            if self._loaded_upto is None:
+                start = 0 if self.resume_messages is None else max(0, count - self.resume_messages)
+                self._messages = self.store.read_range(self.session_id, start, count)
+                self._resumed = len(self._messages)
+            elif count > self._loaded_upto:
+                self._messages.extend(self.store.read_range(self.session_id, self._loaded_upto, count))
+            elif count < self._loaded_upto:
+                # Cleared by another worker
+                self._messages = self.store.read_range(self.session_id, 0, count)
+            self._loaded_upto = count
+            return self._messages
+
+    @property
+    def resumed(self) -> int:
+        """Messages loaded from disk when the history was first read"""
+        self.messages
+        return self._resumed
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.store.append(self.session_id, [message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store.append(self.session_id, messages)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.store.delete(self.session_id)
+            self._messages = []
+            self._loaded_upto = 0
+
+_store: Optional[TranscriptStore] = None
+
+def get_transcript_store() -> Optional[TranscriptStore]:
+    """The store at TRANSCRIPT_STORE_DIR, or None when transcripts are kept in memory only"""
+    global _store
+    root = os.getenv("TRANSCRIPT_STORE_DIR", "")
+    if not root:
+        return None
+    if _store is None or _store.root != root:
+        _store = TranscriptStore(root)
+    return _store
+
+def get_session_history(session_id: Optional[str], resume_messages: Optional[int] = None) -> BaseChatMessageHistory:
+    """Persistent history for a session when TRANSCRIPT_STORE_DIR is set, otherwise an in-memory one"""
+    store = get_transcript_store()
+    if store is None or session_id is None:
+        return ChatMessageHistory()
+    return PersistentChatMessageHistory(session_id, store, resume_messages=resume_messages)
+
+def demonstrate_transcript_store(sessions: int = 10000, turns: int = 4, last_n: int = 6):
+    """Write and read many sessions, then resume one after a simulated restart, offline"""
+    root = tempfile.mkdtemp(prefix="transcripts-")
+    try:
+        store = TranscriptStore(root, segment_bytes=4096)
+        print("\n💾 Transcript Store Demo")
+        print("=" * 60)
+        print(f"{sessions} sessions x {turns} turns in {root}\n")
+
+        start = time.perf_counter()
+        for turn in range(turns):
+            for session in range(sessions):
+                store.append(f"customer-{session}", [
+                    HumanMessage(content=f"Turn {turn}: my order #{session} still hasn't arrived."),
+                    AIMessage(content=f"Sorry about order #{session}. I've opened a ticket with the carrier.")
+                ])
+        elapsed = time.perf_counter() - start
+        messages = sessions * turns * 2
+        print(f"✍️  Appended {messages} messages in {elapsed:.2f}s ({messages / elapsed:,.0f} messages/s)")
+
+        start = time.perf_counter()
+        for session in range(0, sessions, 7):
+            store.read_last(f"customer-{session}", last_n)
+        reads = len(range(0, sessions, 7))
+        elapsed = time.perf_counter() - start
+        print(f"📖 Read the last {last_n} messages of {reads} sessions in {elapsed:.2f}s "
+              f"({elapsed / reads * 1e6:.0f} µs per session)")
+
+        usage = store.disk_usage()
+        print(f"📦 {usage['files']} files, {usage['bytes'] / 1e6:.1f} MB ({usage['bytes'] / messages:.0f} bytes/message)")
+
+        # Two workers serving one session see each other's messages
+        worker_a = PersistentChatMessageHistory("customer-42", store)
+        worker_b = PersistentChatMessageHistory("customer-42", TranscriptStore(root, segment_bytes=4096))
+        worker_a.add_user_message("Any update on the carrier ticket?")
+        worker_b.add_ai_message("Yes, the parcel was found and ships today.")
+        print(f"\n👥 Worker A sees: '{worker_a.messages[-1].content}'")
+
+        # A restarted worker resumes the conversation from disk
+        restarted = PersistentChatMessageHistory("customer-42", TranscriptStore(root), resume_messages=last_n)
+        print(f"🔁 After restart: resumed the last {restarted.resumed} of {store.count('customer-42')} messages")
+        for message in restarted.messages[-2:]:
+            print(f"  {message.type}: {message.content}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    demonstrate_transcript_store()
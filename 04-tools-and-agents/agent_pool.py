@@ -0,0 +1,143 @@
+"""
+Agent Pool with Per-session Memory Swapping
+
+Building a specialized agent means creating a ChatOpenAI client, the tool list, the
+prompt and the executor. The pool does that once per agent type, off the request
+path. On checkout it hands out a lightweight view of the prebuilt agent with the
+session's own memory swapped in: the LLM client, tools and prompt are shared, and
+only the memory and per-run bookkeeping are per session.
+
+The pool also caps how many sessions may use each agent type at once and records
+how long callers waited for a slot. Agents are built outside the pool lock: the
+first caller for a type builds it, and concurrent callers for that type wait on its
+future while other types and sessions go ahead.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import Dict, List, Any, Optional, Callable
+
+from bounded_agent import AgentBudget, PromptSizeRecorder, create_bounded_memory
+
+class AgentPool:
+    """Builds each agent type once and checks it out per session"""
+
+    def __init__(self, factory: Callable[..., Any], max_in_flight: int = 4,
+                 budget: Optional[AgentBudget] = None):
+        self.factory = factory
+        self.max_in_flight = max_in_flight
+        self.budget = budget or AgentBudget()
+        self._agents: Dict[str, Any] = {}
+        self._building: Dict[str, Future] = {}  # Builds in flight; concurrent callers for one type share them
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._memories: Dict[str, Any] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._wait_times: Dict[str, List[float]] = {}
+        self._build_times: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def warm(self, agent_types: List[str]):
+        """Build agents ahead of time so the first request does not pay for it"""
+        for agent_type in agent_types:
+            self._get_agent(agent_type)
+
+    def _get_agent(self, agent_type: str):
+        with self._lock:
+            if agent_type in self._agents:
+                return self._agents[agent_type]
+            future = self._building.get(agent_type)
+            builder = future is None
+            if builder:
+                future = self._building[agent_type] = Future()
+        if not builder:
+            return future.result()
+
+        start = time.perf_counter()
+        try:
+            agent = self.factory(agent_type, budget=self.budget)
+        except Exception as e:
+            with self._lock:
+                del self._building[agent_type]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._build_times[agent_type] = time.perf_counter() - start
+            self._slots[agent_type] = threading.BoundedSemaphore(self.max_in_flight)
+            self._in_flight[agent_type] = 0
+            self._wait_times[agent_type] = []
+            self._agents[agent_type] = agent
+            del self._building[agent_type]
+        future.set_result(agent)
+        return agent
+
+    def session_memory(self, session_id: str):
+        """Return (creating if needed) the memory object owned by a session"""
+        with self._lock:
+            if session_id not in self._memories:
+                self._memories[session_id] = create_bounded_memory(self.budget)
+            return self._memories[session_id]
+
+    @contextmanager
+    def checkout(self, agent_type: str, session_id: str, timeout: Optional[float] = None):
+        """Borrow an agent of `agent_type` bound to the session's memory"""
+        base_agent = self._get_agent(agent_type)
+
+        start = time.perf_counter()
+        if not self._slots[agent_type].acquire(timeout=timeout):
+            raise TimeoutError(f"No free {agent_type} agent after {timeout}s "
+                               f"({self.max_in_flight} sessions in flight)")
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self._wait_times[agent_type].append(waited)
+            self._in_flight[agent_type] += 1
+
+        try:
+            # Shallow copies share the LLM client, tools and prompt with the pooled agent
+            recorder = PromptSizeRecorder()
+            agent = base_agent.copy(update={
+                "memory": self.session_memory(session_id),
+                "agent": base_agent.agent.copy(update={"prompt_recorder": recorder}),
+                "prompt_recorder": recorder
+            })
+            yield agent
+        finally:
+            with self._lock:
+                self._in_flight[agent_type] -= 1
+            self._slots[agent_type].release()
+
+    def release_session(self, session_id: str):
+        """Drop a finished session's memory"""
+        with self._lock:
+            self._memories.pop(session_id, None)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Build time, in-flight count and wait-time percentiles per agent type"""
+        with self._lock:
+            report = {}
+            for agent_type, waits in self._wait_times.items():
+                ordered = sorted(waits)
+                report[agent_type] = {
+                    "build_time_ms": self._build_times[agent_type] * 1000,
+                    "checkouts": len(ordered),
+                    "in_flight": self._in_flight[agent_type],
+                    "wait_p50_ms": ordered[len(ordered) // 2] * 1000 if ordered else 0.0,
+                    "wait_p95_ms": ordered[int(len(ordered) * 0.95)] * 1000 if ordered else 0.0,
+                    "wait_max_ms": ordered[-1] * 1000 if ordered else 0.0
+                }
+            report["sessions"] = {"active": len(self._memories)}
+            return report
+
+def print_pool_report(pool: AgentPool):
+    """Print the pool's per-agent-type statistics"""
+    print("\n🏊 Agent Pool Report")
+    print("-" * 30)
+    for agent_type, stats in pool.report().items():
+        if agent_type == "sessions":
+            print(f"Active sessions: {stats['active']}")
+            continue
+        print(f"{agent_type}: built in {stats['build_time_ms']:.1f}ms, {stats['checkouts']} checkouts, "
+              f"{stats['in_flight']} in flight, wait p50={stats['wait_p50_ms']:.2f}ms "
+              f"p95={stats['wait_p95_ms']:.2f}ms max={stats['wait_max_ms']:.2f}ms")
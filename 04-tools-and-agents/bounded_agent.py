@@ -0,0 +1,160 @@
+"""
+Bounded ReAct Loop with Scratchpad Compaction
+
+A conversational ReAct agent resends its whole scratchpad (every thought, action and
+observation so far) plus the chat history on each step, so prompt size and latency
+grow with every tool call. This module bounds that loop:
+
+- Step, wall-clock and prompt-token budgets stop runaway tool chains
+- Older thought/observation pairs are compacted into one-line summaries; only the
+  most recent steps are kept verbatim
+- Chat history is limited to a window of recent turns
+- Prompt size is recorded for every LLM call so the growth can be inspected
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
+
+from langchain.agents import AgentExecutor
+from langchain.agents.agent import AgentAction, AgentFinish
+from langchain.agents.conversational.base import ConversationalAgent
+from langchain.memory import ConversationBufferWindowMemory
+
+@dataclass
+class AgentBudget:
+    """Limits for a single agent invocation"""
+    max_steps: int = 6                      # tool calls per question
+    max_execution_time: float = 30.0        # seconds per question
+    max_prompt_tokens: int = 6000           # prompt tokens summed over all steps
+    keep_recent_steps: int = 2              # steps kept verbatim in the scratchpad
+    observation_summary_chars: int = 120    # length of a compacted observation
+    history_turns: int = 5                  # chat turns kept in memory
+    early_stopping_method: str = "generate" # "generate" a final answer or "force" stop
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+class PromptSizeRecorder:
+    """Records the size of every prompt the agent sends during one run"""
+
+    def __init__(self):
+        self.steps: List[Dict[str, int]] = []
+
+    def reset(self):
+        self.steps = []
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(step["tokens"] for step in self.steps)
+
+    def record(self, prompt: str):
+        self.steps.append({"step": len(self.steps) + 1, "chars": len(prompt), "tokens": estimate_tokens(prompt)})
+
+class CompactingConversationalAgent(ConversationalAgent):
+    """Conversational ReAct agent that summarizes older scratchpad steps"""
+
+    keep_recent_steps: int = 2
+    observation_summary_chars: int = 120
+    prompt_recorder: Any = None
+
+    def _summarize_step(self, action: AgentAction, observation: str) -> str:
+        observation = " ".join(str(observation).split())
+        if len(observation) > self.observation_summary_chars:
+            observation = observation[:self.observation_summary_chars - 3] + "..."
+        return f"- {action.tool}({action.tool_input}) -> {observation}"
+
+    def _construct_scratchpad(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> str:
+        keep = max(self.keep_recent_steps, 1)
+        older, recent = intermediate_steps[:-keep], intermediate_steps[-keep:]
+
+        if not older:
+            return super()._construct_scratchpad(intermediate_steps)
+
+        summary = "\n".join(self._summarize_step(action, observation) for action, observation in older)
+        return (
+            f"Summary of earlier tool results:\n{summary}\n"
+            + super()._construct_scratchpad(recent)
+        )
+
+    def get_full_inputs(self, intermediate_steps: List[Tuple[AgentAction, str]], **kwargs: Any) -> Dict[str, Any]:
+        full_inputs = super().get_full_inputs(intermediate_steps, **kwargs)
+        if self.prompt_recorder is not None:
+            self.prompt_recorder.record(self.llm_chain.prompt.format_prompt(**full_inputs).to_string())
+        return full_inputs
+
+    def return_stopped_response(self, early_stopping_method: str,
+                                intermediate_steps: List[Tuple[AgentAction, str]], **kwargs: Any) -> AgentFinish:
+        """Final answer once a budget trips; "generate" sends the compacted scratchpad, not the full one"""
+        if early_stopping_method != "generate":
+            return super().return_stopped_response(early_stopping_method, intermediate_steps, **kwargs)
+        thoughts = (self._construct_scratchpad(intermediate_steps)
+                    + "\n\nI now need to return a final answer based on the previous steps:")
+        full_inputs = {**kwargs, "agent_scratchpad": thoughts, "stop": self._stop}
+        if self.prompt_recorder is not None:
+            self.prompt_recorder.record(self.llm_chain.prompt.format_prompt(**full_inputs).to_string())
+        full_output = self.llm_chain.predict(**full_inputs)
+        parsed_output = self.output_parser.parse(full_output)
+        if isinstance(parsed_output, AgentFinish):
+            return parsed_output
+        return AgentFinish({"output": full_output}, full_output)
+
+class BoundedAgentExecutor(AgentExecutor):
+    """AgentExecutor that also stops when the prompt-token budget is spent"""
+
+    max_prompt_tokens: Optional[int] = None
+    prompt_recorder: Any = None
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        if not super()._should_continue(iterations, time_elapsed):
+            return False
+        if self.max_prompt_tokens is not None and self.prompt_recorder is not None:
+            return self.prompt_recorder.total_tokens < self.max_prompt_tokens
+        return True
+
+    def _call(self, inputs: Dict[str, str], run_manager=None) -> Dict[str, Any]:
+        if self.prompt_recorder is not None:
+            self.prompt_recorder.reset()
+        return super()._call(inputs, run_manager=run_manager)
+
+def create_bounded_memory(budget: AgentBudget) -> ConversationBufferWindowMemory:
+    """Chat memory that keeps only the last `history_turns` turns"""
+    return ConversationBufferWindowMemory(
+        k=budget.history_turns,
+        memory_key="chat_history",
+        return_messages=True
+    )
+
+def create_bounded_agent(llm, tools, memory=None, budget: Optional[AgentBudget] = None,
+                         verbose: bool = True, handle_parsing_errors: bool = False) -> BoundedAgentExecutor:
+    """Build a CONVERSATIONAL_REACT_DESCRIPTION-style agent with bounded steps, time and tokens"""
+    budget = budget or AgentBudget()
+    recorder = PromptSizeRecorder()
+
+    agent = CompactingConversationalAgent.from_llm_and_tools(
+        llm=llm,
+        tools=tools,
+        keep_recent_steps=budget.keep_recent_steps,
+        observation_summary_chars=budget.observation_summary_chars,
+        prompt_recorder=recorder
+    )
+
+    return BoundedAgentExecutor(
+        agent=agent,
+        tools=tools,
+        memory=memory if memory is not None else create_bounded_memory(budget),
+        verbose=verbose,
+        handle_parsing_errors=handle_parsing_errors,
+        max_iterations=budget.max_steps,
+        max_execution_time=budget.max_execution_time,
+        early_stopping_method=budget.early_stopping_method,
+        max_prompt_tokens=budget.max_prompt_tokens,
+        prompt_recorder=recorder
+    )
+
+def print_prompt_sizes(agent: BoundedAgentExecutor):
+    """Print the per-step prompt sizes recorded during the last run"""
+    if agent.prompt_recorder is None or not agent.prompt_recorder.steps:
+        return
+    sizes = ", ".join(f"#{step['step']}: {step['tokens']}" for step in agent.prompt_recorder.steps)
+    print(f"📏 Prompt tokens per step: {sizes} (total {agent.prompt_recorder.total_tokens})")
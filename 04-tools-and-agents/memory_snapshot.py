@@ -0,0 +1,207 @@
+"""
+Versioned Binary Snapshots of In-process Memory
+
+A rolling deployment starts workers with empty session memories and caches, and
+latency stays high until they fill up again. The old worker writes what it holds
+to a snapshot at shutdown; its replacement opens the snapshot and comes up hot.
+
+    [header: magic, format version]
+    [frames: section start | record | ...]   (streamed, nothing buffered)
+    [footer: JSON index of every record's offset]
+    [trailer: footer offset, end magic]
+
+- Streaming: SnapshotWriter writes each record as it is produced, so a snapshot of
+  100k sessions never exists in memory as a whole; iter_snapshot() reads frames
+  in order from any file object (no footer needed)
+- Lazy loading: SnapshotReader maps the file and parses only the footer; a record
+  is read when its key is first asked for
+- Versioned: the header carries the format version and every section its own
+  version, so a component can change its record encoding independently
+- Atomic: the snapshot is written to a temporary file and renamed into place, and
+  a file without its trailer is rejected as incomplete
+
+Components encode their own records (bytes) and restore from a reader, e.g.
+SessionMemoryPool.snapshot()/restore(). Identical copies of this file sit next to
+the components that use it: semantic_cache.py (02), session_pool.py (03) and
+tool_result_store.py (04, 05).
+"""
+
+import os
+import json
+import mmap
+import struct
+from typing import Dict, List, Any, Iterator, Optional, Tuple, BinaryIO
+
+SNAPSHOT_MAGIC = b"MSNP"
+SNAPSHOT_END = b"MEND"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHH")  # magic, format version, reserved
+FRAME = struct.Struct("<BHI")  # frame type, key length, payload length
+TRAILER = struct.Struct("<Q4s")  # footer offset, end magic
+
+FRAME_SECTION = 1
+FRAME_RECORD = 2
+FRAME_FOOTER = 3
+
+class SnapshotFormatError(ValueError):
+    """The file is not a snapshot this version can read (bad magic, newer version, truncated)"""
+
+class SnapshotWriter:
+    """Streams sections of keyed records to a snapshot file; use as a context manager"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path + ".tmp", "wb")
+        self._file.write(HEADER.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, 0))
+        self._sections: Dict[str, Dict[str, Any]] = {}
+        self._current: Optional[Dict[str, Any]] = None
+        self.records = 0
+
+    def begin_section(self, name: str, version: int = 1, **meta: Any):
+        """Start a section; records added next belong to it"""
+        if name in self._sections:
+            raise ValueError(f"snapshot section '{name}' written twice")
+        meta = {"version": version, **meta}
+        self._write_frame(FRAME_SECTION, name, json.dumps(meta).encode("utf-8"))
+        self._current = self._sections[name] = {"meta": meta, "keys": [], "offsets": []}
+
+    def add(self, key: str, payload: bytes):
+        """Append one record to the current section"""
+        if self._current is None:
+            raise ValueError("begin_section() must be called before add()")
+        self._current["keys"].append(key)
+        self._current["offsets"].append(self._file.tell())
+        self._write_frame(FRAME_RECORD, key, payload)
+        self.records += 1
+
+    def _write_frame(self, frame_type: int, key: str, payload: bytes):
+        encoded = key.encode("utf-8")
+        self._file.write(FRAME.pack(frame_type, len(encoded), len(payload)))
+        self._file.write(encoded)
+        self._file.write(payload)
+
+    def close(self) -> int:
+        """Write the footer and move the snapshot into place; returns its size in bytes"""
+        footer_offset = self._file.tell()
+        self._write_frame(FRAME_FOOTER, "", json.dumps({"sections": self._sections},
+                                                        separators=(",", ":")).encode("utf-8"))
+        self._file.write(TRAILER.pack(footer_offset, SNAPSHOT_END))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        size = self._file.tell()
+        self._file.close()
+        os.replace(self.path + ".tmp", self.path)
+        return size
+
+    def abort(self):
+        self._file.close()
+        os.remove(self.path + ".tmp")
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def _check_header(header: bytes):
+    if len(header) < HEADER.size:
+        raise SnapshotFormatError("snapshot is truncated")
+    magic, version, _ = HEADER.unpack_from(header)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotFormatError("not a memory snapshot")
+    if version > FORMAT_VERSION:
+        raise SnapshotFormatError(f"snapshot format {version} is newer than supported ({FORMAT_VERSION})")
+
+class SnapshotReader:
+    """Memory-mapped snapshot; only the footer is parsed up front and records are read on demand"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotFormatError("snapshot is empty")
+        try:
+            self._sections = self._read_footer()
+        except Exception:
+            # A rejected file must not keep its mapping and descriptor open
+            self.close()
+            raise
+
+    def _read_footer(self) -> Dict[str, Any]:
+        _check_header(self._buffer[:HEADER.size])
+        if len(self._buffer) < HEADER.size + TRAILER.size:
+            raise SnapshotFormatError("snapshot is truncated")
+        footer_offset, end = TRAILER.unpack_from(self._buffer, len(self._buffer) - TRAILER.size)
+        if end != SNAPSHOT_END:
+            raise SnapshotFormatError("snapshot has no trailer (the writer did not finish)")
+        frame_type, _, payload = self._frame(footer_offset)
+        if frame_type != FRAME_FOOTER:
+            raise SnapshotFormatError("snapshot footer is missing")
+        return json.loads(bytes(payload))["sections"]
+
+    def _frame(self, offset: int) -> Tuple[int, str, memoryview]:
+        frame_type, key_length, payload_length = FRAME.unpack_from(self._buffer, offset)
+        start = offset + FRAME.size
+        key = self._buffer[start:start + key_length].decode("utf-8")
+        return frame_type, key, memoryview(self._buffer)[start + key_length:start + key_length + payload_length]
+
+    def sections(self) -> List[str]:
+        return list(self._sections)
+
+    def meta(self, section: str) -> Dict[str, Any]:
+        """The section's metadata, including its record format `version`"""
+        return self._sections[section]["meta"]
+
+    def index(self, section: str) -> Dict[str, int]:
+        """Record key -> offset for a section (an empty dict if the section is absent)"""
+        if section not in self._sections:
+            return {}
+        entry = self._sections[section]
+        return dict(zip(entry["keys"], entry["offsets"]))
+
+    def keys(self, section: str) -> List[str]:
+        """Record keys in the order they were written"""
+        return list(self._sections[section]["keys"]) if section in self._sections else []
+
+    def read(self, offset: int) -> memoryview:
+        """The payload of the record at `offset` (a view into the mapping; copy it to keep it)"""
+        frame_type, _, payload = self._frame(offset)
+        if frame_type != FRAME_RECORD:
+            raise SnapshotFormatError(f"no record at offset {offset}")
+        return payload
+
+    def records(self, section: str) -> Iterator[Tuple[str, memoryview]]:
+        """(key, payload) for every record of a section, in file order"""
+        for key, offset in zip(self._sections[section]["keys"], self._sections[section]["offsets"]):
+            yield key, self.read(offset)
+
+    def close(self):
+        try:
+            self._buffer.close()
+        except BufferError:
+            pass  # Views into the mapping are still alive; it is released with them
+        self._file.close()
+
+def iter_snapshot(stream: BinaryIO) -> Iterator[Tuple[str, str, bytes]]:
+    """Stream (section, key, payload) for every record without seeking, e.g. from a pipe or socket"""
+    _check_header(stream.read(HEADER.size))
+    section = None
+    while True:
+        header = stream.read(FRAME.size)
+        if len(header) < FRAME.size:
+            raise SnapshotFormatError("snapshot ended before its footer")
+        frame_type, key_length, payload_length = FRAME.unpack(header)
+        key = stream.read(key_length).decode("utf-8")
+        payload = stream.read(payload_length)
+        if frame_type == FRAME_FOOTER:
+            return
+        if frame_type == FRAME_SECTION:
+            section = key
+        else:
+            yield section, key, payload
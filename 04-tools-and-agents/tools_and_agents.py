@@ -9,17 +9,22 @@ and web search, creating an autonomous system that can make decisions about whic
 import os
 import json
 import requests
+import tempfile
 from datetime import datetime
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain.agents import initialize_agent, AgentType, Tool
+from langchain.agents import Tool
 from langchain.tools import BaseTool
 from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
 from langchain.schema import HumanMessage, AIMessage
-from typing import Optional, Type
+from typing import Optional, Type, List
 from pydantic import BaseModel, Field
 
+from tool_result_store import SessionToolResultStore
+from memory_snapshot import SnapshotWriter
+from bounded_agent import AgentBudget, create_bounded_agent, create_bounded_memory, print_prompt_sizes
+from agent_pool import AgentPool, print_pool_report
+from llm_clients import get_chat_model, using_fake_llm
+
 # Load environment variables
 load_dotenv()
 
@@ -117,33 +122,66 @@ class CustomerDatabaseTool(BaseTool):
     def _arun(self, customer_id: str):
         raise NotImplementedError("Async not implemented")
 
-def create_customer_service_agent():
+# Custom tool for billing updates (writes customer data)
+class BillingUpdateTool(BaseTool):
+    name: str = "billing_update"
+    description: str = "Update a customer's billing details. Input: '<customer_id>: <change>'"
+    
+    def _run(self, update: str) -> str:
+        """Apply a billing update"""
+        try:
+            customer_id, _, change = update.partition(":")
+            # Simulate the billing system update
+            return f"Billing details for {customer_id.strip()} updated: {change.strip() or 'no changes'}"
+        except Exception as e:
+            return f"Error updating billing details: {str(e)}"
+    
+    def _arun(self, update: str):
+        raise NotImplementedError("Async not implemented")
+
+def with_session_tool_store(tools: List[BaseTool], tool_store: SessionToolResultStore, thread_id: str) -> List[Tool]:
+    """Wrap tools so they read from the session's tool result store before running"""
+    return [
+        Tool(
+            name=tool.name,
+            description=tool.description,
+            func=lambda tool_input, tool=tool: tool_store.call(thread_id, tool.name, tool_input, tool._run)
+        )
+        for tool in tools
+    ]
+
+def create_customer_service_agent(tool_store: Optional[SessionToolResultStore] = None, thread_id: str = "default",
+                                  budget: Optional[AgentBudget] = None):
     """Create a customer service agent with tools"""
-    llm = ChatOpenAI(
+    budget = budget or AgentBudget()
+    
+    llm = get_chat_model(
         model="gpt-3.5-turbo",
         temperature=0.7
     )
     
-    # Create memory for conversation history
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True
-    )
+    # Create memory for conversation history (bounded to the last few turns)
+    memory = create_bounded_memory(budget)
     
     # Create tools
     tools = [
         WeatherTool(),
         CalculatorTool(),
         SearchTool(),
-        CustomerDatabaseTool()
+        CustomerDatabaseTool(),
+        BillingUpdateTool()
     ]
     
-    # Create the agent
-    agent = initialize_agent(
-        tools=tools,
+    # Reuse tool results from earlier turns of the same session
+    if tool_store is not None:
+        tools = with_session_tool_store(tools, tool_store, thread_id)
+    
+    # Create the agent (step, time and token budgets; older steps compacted)
+    agent = create_bounded_agent(
         llm=llm,
-        agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
+        tools=tools,
         memory=memory,
+        budget=budget,
         verbose=True,
         handle_parsing_errors=True
     )
@@ -218,18 +256,62 @@ def demonstrate_tool_usage():
         except Exception as e:
             print(f"Error: {e}")
 
+def demonstrate_session_tool_reuse():
+    """Demonstrate reusing tool results across turns of one session"""
+    print("\n🗄️  Session Tool Result Reuse Demo")
+    print("=" * 40)
+    
+    tool_store = SessionToolResultStore()
+    thread_id = "demo_session"
+    tools = {tool.name: tool for tool in with_session_tool_store(
+        [WeatherTool(), CustomerDatabaseTool(), BillingUpdateTool()], tool_store, thread_id
+    )}
+    
+    turns = [
+        ("customer_database", "CUST123"),
+        ("weather", "Miami"),
+        ("customer_database", "CUST123"),   # reused
+        ("weather", "Miami"),               # reused
+        ("billing_update", "CUST123: new card ending in 4242"),
+        ("customer_database", "CUST123"),   # invalidated by the billing update
+    ]
+    
+    for turn, (tool_name, tool_input) in enumerate(turns, 1):
+        result = tools[tool_name].run(tool_input)
+        stats = tool_store.stats(thread_id)
+        print(f"Turn {turn}: {tool_name}({tool_input}) -> {result}")
+        print(f"  hits={stats['hits']} misses={stats['misses']} invalidations={stats['invalidations']}")
+    
+    # A new worker takes over the session from a snapshot instead of starting cold
+    path = os.path.join(tempfile.mkdtemp(prefix="tool-snapshot-"), "tools.snap")
+    with SnapshotWriter(path) as writer:
+        tool_store.snapshot(writer)
+    new_store = SessionToolResultStore()
+    new_store.restore(path)
+    tools = {tool.name: tool for tool in with_session_tool_store([WeatherTool()], new_store, thread_id)}
+    result = tools["weather"].run("Miami")
+    stats = new_store.stats(thread_id)
+    print(f"After restart: weather(Miami) -> {result}")
+    print(f"  hits={stats['hits']} misses={stats['misses']} (restored from a {os.path.getsize(path)}-byte snapshot)")
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
 def interactive_agent_conversation():
     """Run an interactive conversation with the agent"""
     print("\n🎮 Interactive Agent Conversation")
     print("=" * 50)
     print("Start a conversation with the customer service agent.")
     print("The agent can use tools to help answer your questions.")
-    print("Available tools: weather, calculator, search, customer_database")
+    print("Available tools: weather, calculator, search, customer_database, billing_update")
     print("Type 'quit' to end the conversation.")
     print("-" * 50)
     
+    # Tool results are reused across turns of this session
+    tool_store = SessionToolResultStore()
+    thread_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    
     # Create the agent
-    agent = create_customer_service_agent()
+    agent = create_customer_service_agent(tool_store=tool_store, thread_id=thread_id)
     
     while True:
         message = input("\n👤 You: ").strip()
@@ -247,8 +329,14 @@ def interactive_agent_conversation():
             response = agent.invoke({"input": message})
             print(f"\n🤖 Agent: {response['output']}")
             
+            stats = tool_store.stats(thread_id)
+            print(f"🗄️  Tool cache: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['invalidations']} invalidated, {stats['cached_results']} cached")
+            
         except Exception as e:
             print(f"❌ Error: {e}")
+    
+    tool_store.end_session(thread_id)
 
 def demonstrate_agent_reasoning():
     """Demonstrate how agents reason about tool selection"""
@@ -275,15 +363,17 @@ def demonstrate_agent_reasoning():
         try:
             response = agent.invoke({"input": scenario})
             print(f"🤖 Agent Response: {response['output']}")
+            print_prompt_sizes(agent)
             
         except Exception as e:
             print(f"❌ Error: {e}")
 
-def create_specialized_agent(agent_type: str):
+def create_specialized_agent(agent_type: str, budget: Optional[AgentBudget] = None):
     """Create specialized agents for different use cases"""
+    budget = budget or AgentBudget()
     
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.7)
-    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    llm = get_chat_model(model="gpt-3.5-turbo", temperature=0.7)
+    memory = create_bounded_memory(budget)
     
     if agent_type == "sales":
         # Sales agent with pricing and product tools
@@ -311,11 +401,11 @@ def create_specialized_agent(agent_type: str):
         # General customer service agent
         tools = [WeatherTool(), CalculatorTool(), SearchTool(), CustomerDatabaseTool()]
     
-    return initialize_agent(
-        tools=tools,
+    return create_bounded_agent(
         llm=llm,
-        agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
+        tools=tools,
         memory=memory,
+        budget=budget,
         verbose=True
     )
 
@@ -336,32 +426,46 @@ def demonstrate_specialized_agents():
         "general": "What's the weather like in Boston and can you calculate shipping costs?"
     }
     
+    # Build each agent type once; sessions borrow it with their own memory
+    pool = AgentPool(create_specialized_agent, max_in_flight=4)
+    pool.warm(list(agent_types))
+    
     for agent_type, description in agent_types.items():
         print(f"\n🎯 {description}")
         print("-" * 30)
         
-        agent = create_specialized_agent(agent_type)
         question = test_questions[agent_type]
         
         print(f"Question: {question}")
         
+        session_id = f"demo_{agent_type}"
         try:
-            response = agent.invoke({"input": question})
+            with pool.checkout(agent_type, session_id=session_id) as agent:
+                response = agent.invoke({"input": question})
             print(f"Response: {response['output']}")
         except Exception as e:
             print(f"Error: {e}")
+        finally:
+            # One question per session here, so its memory can go as soon as it is answered
+            pool.release_session(session_id)
+    
+    print_pool_report(pool)
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and not using_fake_llm():
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline with the fake model)")
         exit(1)
     
     # Demonstrate individual tools
     demonstrate_tool_usage()
     
+    # Demonstrate tool result reuse across turns
+    demonstrate_session_tool_reuse()
+    
     # Run agent examples
     run_agent_examples()
     
@@ -18,6 +18,8 @@ from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import MemorySaver
 
+from tool_result_store import SessionToolResultStore
+
 # Load environment variables
 load_dotenv()
 
@@ -33,6 +35,7 @@ class WorkflowState(TypedDict):
     customer_info: str
     next_step: str
     workflow_status: str
+    thread_id: str
 
 # Custom tools (simplified versions from Example 4)
 class WeatherTool(BaseTool):
@@ -96,6 +99,16 @@ class CustomerDatabaseTool(BaseTool):
     def _arun(self, customer_id: str):
         raise NotImplementedError("Async not implemented")
 
+# Tool results shared across turns of the same session (keyed by thread_id)
+tool_store = SessionToolResultStore()
+
+def run_tool(state: WorkflowState, tool: BaseTool, tool_input: str) -> str:
+    """Run a tool, reusing the session's earlier result when it is still valid"""
+    thread_id = state.get("thread_id")
+    if not thread_id:
+        return tool._run(tool_input)
+    return tool_store.call(thread_id, tool.name, tool_input, tool._run)
+
 # Node functions for the workflow
 def analyze_customer_request(state: WorkflowState) -> WorkflowState:
     """Analyze the customer request and determine the issue type and priority"""
@@ -122,6 +135,13 @@ def analyze_customer_request(state: WorkflowState) -> WorkflowState:
         state["issue_type"] = "general_inquiry"
         state["priority"] = "low"
     
+    # Billing/payment changes make cached customer data stale for this session
+    message_lower = latest_message.lower()
+    if state.get("thread_id") and "update" in message_lower and any(
+        word in message_lower for word in ["billing", "payment", "card", "address"]
+    ):
+        tool_store.invalidate(state["thread_id"], "customer", "billing")
+    
     state["workflow_status"] = "analyzed"
     print(f"📊 Issue Type: {state['issue_type']}, Priority: {state['priority']}")
     
@@ -146,7 +166,7 @@ def check_weather_if_needed(state: WorkflowState) -> WorkflowState:
             location = "Los Angeles"
         
         weather_tool = WeatherTool()
-        weather_info = weather_tool._run(location)
+        weather_info = run_tool(state, weather_tool, location)
         state["weather_info"] = weather_info
         
         # Add response to messages
@@ -196,7 +216,7 @@ def lookup_customer_info_if_needed(state: WorkflowState) -> WorkflowState:
         customer_id = state.get("customer_id", "CUST123")
         
         customer_tool = CustomerDatabaseTool()
-        customer_info = customer_tool._run(customer_id)
+        customer_info = run_tool(state, customer_tool, customer_id)
         state["customer_info"] = customer_info
         
         # Add response to messages
@@ -427,6 +447,10 @@ def interactive_workflow():
     
     app = create_customer_service_workflow()
     
+    # One thread per session: tool results are reused across its turns
+    thread_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    config = {"configurable": {"thread_id": thread_id}}
+    
     while True:
         message = input("\n👤 You: ").strip()
         
@@ -451,16 +475,22 @@ def interactive_workflow():
                 "search_results": "",
                 "customer_info": "",
                 "next_step": "",
-                "workflow_status": ""
+                "workflow_status": "",
+                "thread_id": thread_id
             }
             
-            result = app.invoke(initial_state)
+            result = app.invoke(initial_state, config=config)
             
             print(f"\n🤖 Assistant: {result['messages'][-1].content}")
             print(f"📊 Workflow Status: {result['workflow_status']}")
             
+            stats = tool_store.stats(thread_id)
+            print(f"🗄️  Tool cache: {stats['hits']} hits, {stats['misses']} misses")
+            
         except Exception as e:
             print(f"❌ Error: {e}")
+    
+    tool_store.end_session(thread_id)
 
 def demonstrate_workflow_visualization():
     """Demonstrate the workflow structure"""
@@ -513,10 +543,11 @@ def demonstrate_workflow_visualization():
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and os.getenv("LLM_BACKEND", "openai").lower() != "fake":
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline; these graphs make no model calls)")
         exit(1)
     
     # Demonstrate workflow visualization
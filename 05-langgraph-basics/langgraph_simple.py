@@ -275,10 +275,11 @@ def demonstrate_state_management():
 
 if __name__ == "__main__":
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and os.getenv("LLM_BACKEND", "openai").lower() != "fake":
         print("❌ Error: OPENAI_API_KEY not found in environment variables")
         print("💡 Please create a .env file with your OpenAI API key:")
         print("   OPENAI_API_KEY=your_api_key_here")
+        print("   (or set LLM_BACKEND=fake to run offline; these graphs make no model calls)")
         exit(1)
     
     # Run workflow examples
@@ -0,0 +1,184 @@
+"""
+Session-scoped Tool Result Store
+
+Multi-turn conversations keep asking tools the same questions ("look up CUST123",
+"weather in Chicago"). This store keeps tool results per session (thread_id) so
+agents and graph nodes can reuse them on later turns.
+
+Each tool declares which resources it reads and writes. A cached result stays valid
+until a tool that writes one of its resources runs in the same session (for example
+a billing update invalidates cached customer data), or until its TTL expires.
+
+snapshot()/restore() carry the sessions over to a new worker in a memory_snapshot.py
+file; a restored session is decoded the first time it is used.
+"""
+
+import json
+import time
+import threading
+from typing import Dict, Any, Optional, Callable
+
+from memory_snapshot import SnapshotWriter, SnapshotReader
+
+SNAPSHOT_SECTION = "tool_results"
+SNAPSHOT_VERSION = 1
+
+# Which resources each tool reads/writes, and how long a result may be reused
+TOOL_DEPENDENCIES = {
+    "weather": {"reads": ["weather"], "writes": [], "ttl_seconds": 600},
+    "customer_database": {"reads": ["customer"], "writes": [], "ttl_seconds": None},
+    "search": {"reads": ["search"], "writes": [], "ttl_seconds": 3600},
+    "billing_update": {"reads": [], "writes": ["customer", "billing"], "ttl_seconds": 0},
+    # Pure functions: results never go stale
+    "calculator": {"reads": [], "writes": [], "ttl_seconds": None},
+}
+
+class SessionToolResultStore:
+    """Per-session cache of tool results with dependency-aware invalidation"""
+
+    def __init__(self, dependencies: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.dependencies = dependencies if dependencies is not None else TOOL_DEPENDENCIES
+        self._sessions: Dict[str, Dict[tuple, Dict[str, Any]]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._snapshot: Optional[SnapshotReader] = None
+        self._pending: Dict[str, int] = {}  # Restored sessions not used yet -> record offset
+
+    @staticmethod
+    def _key(tool_name: str, tool_input: str) -> tuple:
+        return (tool_name, " ".join(str(tool_input).lower().split()))
+
+    def _session_stats(self, thread_id: str) -> Dict[str, int]:
+        return self._stats.setdefault(thread_id, {"hits": 0, "misses": 0, "invalidations": 0})
+
+    def _materialize(self, thread_id: str):
+        """Decode a session restored from a snapshot on its first use (caller holds the lock)"""
+        offset = self._pending.pop(thread_id, None)
+        if offset is None:
+            return
+        now = time.time()
+        self._sessions[thread_id] = {
+            (tool_name, tool_input): {"result": result, "reads": set(reads), "expires_at": expires_at}
+            for tool_name, tool_input, result, reads, expires_at in json.loads(bytes(self._snapshot.read(offset)))
+            if expires_at is None or expires_at > now
+        }
+        if not self._pending:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def get(self, thread_id: str, tool_name: str, tool_input: str) -> Optional[str]:
+        """Return a still-valid cached result, or None"""
+        with self._lock:
+            self._materialize(thread_id)
+            stats = self._session_stats(thread_id)
+            entry = self._sessions.get(thread_id, {}).get(self._key(tool_name, tool_input))
+
+            if entry is not None and entry["expires_at"] is not None and time.time() >= entry["expires_at"]:
+                del self._sessions[thread_id][self._key(tool_name, tool_input)]
+                entry = None
+
+            if entry is None:
+                stats["misses"] += 1
+                return None
+
+            stats["hits"] += 1
+            return entry["result"]
+
+    def put(self, thread_id: str, tool_name: str, tool_input: str, result: str):
+        """Store a tool result, or apply its invalidations if the tool writes data"""
+        deps = self.dependencies.get(tool_name, {"reads": [], "writes": [], "ttl_seconds": 0})
+
+        if deps.get("writes"):
+            self.invalidate(thread_id, *deps["writes"])
+
+        ttl = deps.get("ttl_seconds")
+        if ttl == 0:
+            return
+
+        with self._lock:
+            self._materialize(thread_id)
+            self._sessions.setdefault(thread_id, {})[self._key(tool_name, tool_input)] = {
+                "result": result,
+                "reads": set(deps.get("reads", [])),
+                "expires_at": time.time() + ttl if ttl else None
+            }
+
+    def invalidate(self, thread_id: str, *resources: str) -> int:
+        """Drop every cached result in the session that reads one of `resources`"""
+        resources = set(resources)
+        with self._lock:
+            self._materialize(thread_id)
+            entries = self._sessions.get(thread_id, {})
+            stale = [key for key, entry in entries.items() if entry["reads"] & resources]
+            for key in stale:
+                del entries[key]
+            self._session_stats(thread_id)["invalidations"] += len(stale)
+        return len(stale)
+
+    def call(self, thread_id: str, tool_name: str, tool_input: str, run: Callable[[str], str]) -> str:
+        """Read-through helper: return the cached result or run the tool and store it"""
+        if self.dependencies.get(tool_name, {}).get("ttl_seconds", 0) == 0:
+            # Uncacheable (e.g. write) tools always run, then apply their invalidations
+            result = run(tool_input)
+            self.put(thread_id, tool_name, tool_input, result)
+            return result
+
+        cached = self.get(thread_id, tool_name, tool_input)
+        if cached is not None:
+            return cached
+
+        result = run(tool_input)
+        self.put(thread_id, tool_name, tool_input, result)
+        return result
+
+    def end_session(self, thread_id: str):
+        """Forget everything cached for a finished session"""
+        with self._lock:
+            if self._pending.pop(thread_id, None) is not None and not self._pending:
+                self._snapshot.close()
+                self._snapshot = None
+            self._sessions.pop(thread_id, None)
+            self._stats.pop(thread_id, None)
+
+    def stats(self, thread_id: str) -> Dict[str, Any]:
+        """Hit/miss counts for a session"""
+        with self._lock:
+            self._materialize(thread_id)
+            stats = dict(self._session_stats(thread_id))
+            stats["cached_results"] = len(self._sessions.get(thread_id, {}))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def snapshot(self, writer: SnapshotWriter) -> int:
+        """Add every session's cached results to a snapshot (expiry stays wall-clock time); returns sessions"""
+        with self._lock:
+            writer.begin_section(SNAPSHOT_SECTION, version=SNAPSHOT_VERSION)
+            for thread_id, offset in self._pending.items():
+                writer.add(thread_id, bytes(self._snapshot.read(offset)))
+            for thread_id, entries in self._sessions.items():
+                writer.add(thread_id, json.dumps(
+                    [[tool_name, tool_input, entry["result"], sorted(entry["reads"]), entry["expires_at"]]
+                     for (tool_name, tool_input), entry in entries.items()], separators=(",", ":")).encode("utf-8"))
+            return len(self._pending) + len(self._sessions)
+
+    def restore(self, path: str) -> int:
+        """Take over the sessions in a snapshot file; each is decoded when first used. Returns sessions
+
+        The store owns the reader it opens: it is closed once every session has been decoded, or when
+        a later restore() replaces it.
+        """
+        reader = SnapshotReader(path)
+        if SNAPSHOT_SECTION not in reader.sections() or reader.meta(SNAPSHOT_SECTION)["version"] > SNAPSHOT_VERSION:
+            reader.close()
+            return 0
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.close()
+            self._snapshot = reader
+            self._pending = {thread_id: offset for thread_id, offset in reader.index(SNAPSHOT_SECTION).items()
+                             if thread_id not in self._sessions}
+            if not self._pending:
+                self._snapshot.close()
+                self._snapshot = None
+            return len(self._pending)
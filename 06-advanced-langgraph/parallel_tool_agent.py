@@ -0,0 +1,229 @@
+"""
+Example 6: Parallel Multi-tool-call Agent
+
+The ReAct agents in Example 4 call one tool per LLM round trip, so a question like
+"weather in Miami, shipping cost for 3kg and my order history" costs three full LLM
+turns in sequence. This example builds the agent loop as a LangGraph graph instead:
+
+    planner ──(tool calls?)──► tools ──► planner ──(no calls)──► END
+
+- The planner emits *all* independent tool calls it needs in one JSON response
+- The tools node runs them concurrently and feeds every result back as one observation
+- The planner then answers (or asks for another batch of calls)
+
+A scripted local chat model is included so the graph can be run and tested offline;
+the live run uses the shared model factory, so LLM_BACKEND=fake runs it offline too.
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, TypedDict, Annotated, Optional
+from dotenv import load_dotenv
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import HumanMessage, AIMessage, SystemMessage, ChatResult, ChatGeneration
+from langchain.tools import BaseTool
+from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
+
+from advanced_langgraph import WeatherTool, CalculatorTool, CustomerDatabaseTool, ShippingCalculatorTool
+from llm_clients import get_chat_model, using_fake_llm, print_client_stats
+
+# Load environment variables
+load_dotenv()
+
+# State for the parallel tool-calling agent
+class ParallelToolAgentState(TypedDict):
+    messages: Annotated[List[HumanMessage | AIMessage], add_messages]
+    pending_tool_calls: List[Dict[str, Any]]
+    tool_results: List[Dict[str, Any]]
+    llm_turns: int
+    max_turns: int
+    final_answer: str
+    workflow_status: str
+
+PLANNER_PROMPT = """You are a customer service agent that can call tools.
+
+Available tools:
+{tool_descriptions}
+
+Request ALL tool calls you need at once; they run in parallel. Reply with JSON only:
+{{"tool_calls": [{{"tool": "<name>", "input": "<text input>"}}, {{"tool": "<name>", "args": {{"<arg>": "<value>"}}}}]}}
+
+When the observations contain everything you need, reply with:
+{{"final_answer": "<answer for the customer>"}}"""
+
+class ScriptedChatModel(BaseChatModel):
+    """Offline chat model that replays scripted responses in order"""
+
+    responses: List[str]
+    latency_seconds: float = 0.0
+    call_count: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_seconds)
+        content = self.responses[min(self.call_count, len(self.responses) - 1)]
+        self.call_count += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+def parse_planner_output(content: str) -> Dict[str, Any]:
+    """Extract the planner's JSON object; plain text is treated as a final answer"""
+    start = content.find('{')
+    end = content.rfind('}') + 1
+    if start != -1 and end != 0:
+        try:
+            return json.loads(content[start:end])
+        except json.JSONDecodeError:
+            pass
+    return {"final_answer": content.strip()}
+
+def run_tool_call(tools: Dict[str, BaseTool], call: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one tool call and capture its result or error"""
+    start = time.perf_counter()
+    tool = tools.get(call.get("tool", ""))
+    try:
+        if tool is None:
+            output = f"Error: unknown tool '{call.get('tool')}'"
+        elif isinstance(call.get("args"), dict):
+            output = tool._run(**call["args"])
+        else:
+            output = tool._run(call.get("input", ""))
+    except Exception as e:
+        output = f"Error in {call.get('tool')}: {str(e)}"
+    return {**call, "output": output, "duration_ms": (time.perf_counter() - start) * 1000}
+
+def format_observation(results: List[Dict[str, Any]]) -> str:
+    """Combine all tool results of one batch into a single observation"""
+    lines = []
+    for result in results:
+        call_input = json.dumps(result["args"]) if isinstance(result.get("args"), dict) else result.get("input", "")
+        lines.append(f"- {result.get('tool')}({call_input}): {result['output']}")
+    return "Observation:\n" + "\n".join(lines)
+
+def create_parallel_tool_agent(llm: Optional[BaseChatModel] = None, tools: Optional[List[BaseTool]] = None,
+                               max_workers: int = 8):
+    """Create the planner/tools graph"""
+    llm = llm or get_chat_model(temperature=0)
+    tools = tools or [WeatherTool(), CalculatorTool(), CustomerDatabaseTool(), ShippingCalculatorTool()]
+    tools_by_name = {tool.name: tool for tool in tools}
+    tool_descriptions = "\n".join(f"- {tool.name}: {tool.description}" for tool in tools)
+
+    # Nodes return only the keys they change: `messages` is merged by add_messages, so returning
+    # the whole history would append it again on every step
+    def plan(state: ParallelToolAgentState) -> Dict[str, Any]:
+        """Ask the LLM for the next batch of tool calls or the final answer"""
+        print(f"🧠 Planner turn {state['llm_turns'] + 1}...")
+        prompt = [SystemMessage(content=PLANNER_PROMPT.format(tool_descriptions=tool_descriptions))]
+        response = llm.invoke(prompt + list(state["messages"]))
+        decision = parse_planner_output(response.content)
+        llm_turns = state["llm_turns"] + 1
+        tool_calls = decision.get("tool_calls") or []
+
+        if tool_calls and llm_turns < state["max_turns"]:
+            print(f"🛠️  Requested {len(tool_calls)} tool calls")
+            return {"messages": [AIMessage(content=response.content)], "pending_tool_calls": tool_calls,
+                    "llm_turns": llm_turns, "workflow_status": "tools_requested"}
+        if tool_calls:
+            # Out of turns while still asking for tools: the raw request is no answer for the customer
+            final_answer = (f"I couldn't gather everything needed within {state['max_turns']} steps. "
+                            f"Please try again or contact a support agent.")
+            status = "max_turns_reached"
+        else:
+            final_answer = decision.get("final_answer", response.content)
+            status = "completed"
+        return {"messages": [AIMessage(content=final_answer)], "pending_tool_calls": [], "llm_turns": llm_turns,
+                "final_answer": final_answer, "workflow_status": status}
+
+    def run_tools(state: ParallelToolAgentState) -> Dict[str, Any]:
+        """Run every requested tool call concurrently and feed back one observation"""
+        calls = state["pending_tool_calls"]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+            results = list(executor.map(lambda call: run_tool_call(tools_by_name, call), calls))
+        print(f"⚡ Ran {len(results)} tools in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        return {"messages": [HumanMessage(content=format_observation(results))],
+                "tool_results": state["tool_results"] + results, "pending_tool_calls": [],
+                "workflow_status": "tools_completed"}
+
+    def should_run_tools(state: ParallelToolAgentState) -> str:
+        return "tools" if state["pending_tool_calls"] else "end"
+
+    workflow = StateGraph(ParallelToolAgentState)
+    workflow.add_node("planner", plan)
+    workflow.add_node("tools", run_tools)
+    workflow.add_conditional_edges("planner", should_run_tools, {
+        "tools": "tools",
+        "end": END
+    })
+    workflow.add_edge("tools", "planner")
+    workflow.set_entry_point("planner")
+
+    return workflow.compile()
+
+def run_parallel_tool_agent(app, question: str, max_turns: int = 5) -> Dict[str, Any]:
+    """Invoke the graph for one question"""
+    initial_state = {
+        "messages": [HumanMessage(content=question)],
+        "pending_tool_calls": [],
+        "tool_results": [],
+        "llm_turns": 0,
+        "max_turns": max_turns,
+        "final_answer": "",
+        "workflow_status": ""
+    }
+    return app.invoke(initial_state)
+
+def demonstrate_parallel_vs_sequential():
+    """Compare one-call-per-turn with batched parallel tool calls, fully offline"""
+    print("\n⚡ Parallel Multi-tool Agent vs. One Tool per Turn")
+    print("=" * 60)
+
+    question = "What's the weather in Miami, the shipping cost for 3kg to Miami, and my order history? I'm CUST123."
+    calls = [
+        {"tool": "weather", "input": "Miami"},
+        {"tool": "shipping_calculator", "args": {"location": "Miami", "weight": "3kg"}},
+        {"tool": "customer_database", "input": "CUST123"}
+    ]
+    answer = json.dumps({"final_answer": "Miami is sunny at 22°C, standard shipping for 3kg is $15.00 "
+                                         "(express $25.00), and you have 2 orders: ORD001 and ORD002."})
+    llm_latency = 0.8
+
+    scripts = {
+        "One tool per turn (ReAct)": [json.dumps({"tool_calls": [call]}) for call in calls] + [answer],
+        "Parallel tool calls": [json.dumps({"tool_calls": calls}), answer]
+    }
+
+    for name, responses in scripts.items():
+        llm = ScriptedChatModel(responses=responses, latency_seconds=llm_latency)
+        app = create_parallel_tool_agent(llm=llm)
+
+        start = time.perf_counter()
+        result = run_parallel_tool_agent(app, question)
+        elapsed = time.perf_counter() - start
+
+        print(f"\n📊 {name}")
+        print(f"  LLM turns: {result['llm_turns']}")
+        print(f"  Tool calls: {len(result['tool_results'])}")
+        print(f"  Wall time: {elapsed:.2f}s (simulated LLM latency {llm_latency}s/turn)")
+        print(f"  Messages: {len(result['messages'])} (question, {result['llm_turns']} planner replies, "
+              f"{result['llm_turns'] - 1} observations)")
+        print(f"  Answer: {result['final_answer']}")
+
+if __name__ == "__main__":
+    # The comparison uses a scripted model and runs without an API key
+    demonstrate_parallel_vs_sequential()
+
+    if os.getenv("OPENAI_API_KEY") or using_fake_llm():
+        print(f"\n🤖 Live run with the {'fake model' if using_fake_llm() else 'ChatOpenAI'}")
+        result = run_parallel_tool_agent(
+            create_parallel_tool_agent(),
+            "A customer in Miami wants the weather, shipping cost for a 3kg package and their order history (CUST123)."
+        )
+        print(f"LLM turns: {result['llm_turns']}, Answer: {result['final_answer']}")
+        print_client_stats()
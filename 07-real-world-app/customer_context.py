@@ -0,0 +1,421 @@
+"""
+Example 7: Session Context Prefetch for Returning Customers
+
+Before an agent can act for a returning customer it needs their conversation
+history, their CustomerInfo profile, recent tickets and the results earlier agents
+produced in the conversation. Loading them one after another puts four backend
+round trips in front of every reply. Instead:
+
+- As soon as a conversation ID arrives, start_prefetch() submits all four loads to
+  a shared thread pool and returns a SessionContext holding their futures
+- Intent classification and routing run while the loads are in flight
+- Agents call SessionContext.profile()/history()/tickets()/agent_results(), which
+  by then usually return already-resolved futures
+- Each context records how long callers still had to wait, so the saving shows up
+  in the workflow's performance metrics
+- Profile cache: CustomerInfo profiles and OrderInfo records go through one
+  process-wide ProfileCache, so a customer opening five sessions a day is looked
+  up once; entries expire after a TTL, agents that change a record write through
+  the cache, and unknown IDs are cached as misses for a shorter TTL
+- Writes need an explicit request (requests_cancellation()/requests_charge_dispute()
+  ignore negated mentions such as "I don't want to cancel"), and orders are only
+  read or changed for the customer who placed them
+
+The backends are simulated with CUSTOMER_DATA_LATENCY_MS of latency per call
+(in production they are the CRM, ticketing system and conversation store).
+Run `python customer_context.py` to see the profile cache against repeat sessions.
+"""
+
+import os
+import re
+import copy
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+DEFAULT_LATENCY_MS = float(os.getenv("CUSTOMER_DATA_LATENCY_MS", "40"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "8"))
+PREFETCH_TIMEOUT_SECONDS = float(os.getenv("PREFETCH_TIMEOUT_SECONDS", "5"))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+PROFILE_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "10000"))
+
+# Requests that change a record; a negation shortly before the match ("don't want to cancel") cancels it
+CANCEL_REQUEST_PATTERN = re.compile(
+    r"\b(?:please\s+cancel|cancel\s+(?:my|the|this|that|it|order)|(?:want|like|need)\s+to\s+cancel)\b", re.IGNORECASE)
+DISPUTE_REQUEST_PATTERN = re.compile(
+    r"\b(?:dispute\s+(?:(?:my|the|this|that|a)\s+)?(?:charge|payment|transaction)|(?:want|like|need)\s+to\s+dispute"
+    r"|unauthori[sz]ed\s+(?:charge|payment|transaction|purchase)|didn'?t\s+make\s+(?:this|that|the)"
+    r"|don'?t\s+(?:remember|recognize)\s+(?:making|this|that|the))\b", re.IGNORECASE)
+NEGATION_PATTERN = re.compile(r"\b(?:not|no|never|don'?t|do\s+not|didn'?t|won'?t|wouldn'?t|isn'?t|wasn'?t)\b",
+                              re.IGNORECASE)
+NEGATION_WINDOW_WORDS = 4
+
+# Seed records for the simulated CRM and ticketing system
+SEED_PROFILES = {
+    "CUST456": {"name": "Maria Lopez", "email": "maria.lopez@example.com", "loyalty_tier": "gold"},
+    "CUST789": {"name": "James Chen", "email": "james.chen@example.com", "loyalty_tier": "standard"},
+    "CUST123": {"name": "Aisha Khan", "email": "aisha.khan@example.com", "loyalty_tier": "platinum"},
+    "CUST001": {"name": "Tom Becker", "email": "tom.becker@example.com", "loyalty_tier": "standard"},
+    "CUST999": {"name": "Priya Nair", "email": "priya.nair@example.com", "loyalty_tier": "gold"},
+}
+
+SEED_ORDERS = {
+    "ORD-12345": {"customer_id": "CUST456", "status": "in_transit", "items": [{"sku": "HP-200", "quantity": 1}],
+                  "total_amount": 89.99, "shipping_address": "Memphis, TN", "tracking_number": "1Z999AA1234567890",
+                  "estimated_delivery": "2024-01-20", "carrier": "FedEx", "current_location": "Memphis, TN"},
+    "ORD-77812": {"customer_id": "CUST999", "status": "delivered", "items": [{"sku": "SPK-10", "quantity": 2}],
+                  "total_amount": 149.98, "shipping_address": "Austin, TX", "tracking_number": "1Z999AA1098765432",
+                  "estimated_delivery": "2024-01-12", "carrier": "UPS", "current_location": "Austin, TX"},
+}
+
+SEED_TICKETS = {
+    "CUST456": [{"ticket_id": "TCK-3101", "subject": "Order ORD-12345 delayed", "status": "open"}],
+    "CUST789": [{"ticket_id": "TCK-2984", "subject": "Headphones firmware update failed", "status": "resolved"}],
+    "CUST999": [{"ticket_id": "TCK-3056", "subject": "Damaged item in order ORD-77812", "status": "open"},
+                {"ticket_id": "TCK-3060", "subject": "No reply to refund email", "status": "open"}],
+}
+
+class CustomerDataService:
+    """Simulated CRM, ticketing system and conversation store, each call costing one round trip"""
+
+    def __init__(self, latency_ms: float = DEFAULT_LATENCY_MS):
+        self.latency_ms = latency_ms
+        self._lock = threading.Lock()
+        self._profiles = copy.deepcopy(SEED_PROFILES)
+        self._orders = copy.deepcopy(SEED_ORDERS)
+        self._history: Dict[str, List[Dict[str, str]]] = {}
+        self._agent_results: Dict[str, Dict[str, Any]] = {}
+        self.calls = 0
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency_ms / 1000)
+
+    def get_profile(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        """The customer's CustomerInfo fields and billing details, or None for an unknown ID"""
+        self._round_trip()
+        with self._lock:
+            profile = self._profiles.get(customer_id)
+            if profile is None:
+                return None
+            return {"customer_id": customer_id, "loyalty_tier": "standard", "payment_method": "Visa ending in 1234",
+                    "payment_status": "current", "current_balance": 0.0, "auto_pay_enabled": True,
+                    **copy.deepcopy(profile)}
+
+    def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        """The order's OrderInfo fields, or None for an unknown ID"""
+        self._round_trip()
+        with self._lock:
+            order = self._orders.get(order_id)
+            return {"order_id": order_id, **copy.deepcopy(order)} if order is not None else None
+
+    def update_profile(self, customer_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Apply changes to a customer and return the updated profile"""
+        with self._lock:
+            if customer_id not in self._profiles:
+                return None
+            self._profiles[customer_id].update(changes)
+        return self.get_profile(customer_id)
+
+    def update_order(self, order_id: str, changes: Dict[str, Any], customer_id: str) -> Optional[Dict[str, Any]]:
+        """Apply changes to one of the customer's orders and return it; None if unknown or not theirs"""
+        with self._lock:
+            if self._orders.get(order_id, {}).get("customer_id") != customer_id:
+                return None
+            self._orders[order_id].update(changes)
+        return self.get_order(order_id)
+
+    def get_recent_tickets(self, customer_id: str, limit: int = 5) -> List[Dict[str, str]]:
+        """The customer's latest support tickets, newest first"""
+        self._round_trip()
+        return list(SEED_TICKETS.get(customer_id, []))[:limit]
+
+    def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        """Earlier turns of the conversation as {"role", "content"} dicts"""
+        self._round_trip()
+        with self._lock:
+            return list(self._history.get(conversation_id, []))
+
+    def get_agent_results(self, conversation_id: str) -> Dict[str, Any]:
+        """Results earlier agents stored for the conversation (e.g. order_info)"""
+        self._round_trip()
+        with self._lock:
+            return dict(self._agent_results.get(conversation_id, {}))
+
+    def save_turn(self, conversation_id: str, message: str, response: str, agent_results: Dict[str, Any]):
+        """Record a finished turn so the next message in the conversation can resume from it"""
+        with self._lock:
+            self._history.setdefault(conversation_id, []).extend([
+                {"role": "customer", "content": message},
+                {"role": "agent", "content": response}
+            ])
+            self._agent_results.setdefault(conversation_id, {}).update(agent_results)
+
+class ProfileCache:
+    """Process-wide TTL cache of customer profiles and orders with write-through updates"""
+
+    def __init__(self, service: CustomerDataService, ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS,
+                 negative_ttl_seconds: float = PROFILE_CACHE_NEGATIVE_TTL_SECONDS,
+                 max_entries: int = PROFILE_CACHE_MAX_ENTRIES):
+        self.service = service
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # (kind, id) -> (expires_at, record or None)
+        self._loading: Dict[tuple, Future] = {}  # Loads in flight; concurrent misses for one ID share them
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "loads": 0, "expirations": 0,
+                       "writes": 0, "evictions": 0}
+
+    def get_customer(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        """The customer's profile (a copy), or None if the ID is unknown"""
+        return self._get(("customer", customer_id), self.service.get_profile)
+
+    def get_order(self, order_id: str, customer_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The customer's order (a copy), or None if the ID is unknown or belongs to someone else"""
+        order = self._get(("order", order_id), self.service.get_order)
+        return order if order is not None and order["customer_id"] == customer_id else None
+
+    def update_customer(self, customer_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Write changes to the backend, then replace the cached profile with the result"""
+        return self._write(("customer", customer_id), self.service.update_profile(customer_id, changes))
+
+    def update_order(self, order_id: str, changes: Dict[str, Any], customer_id: str) -> Optional[Dict[str, Any]]:
+        """Write changes to one of the customer's orders, then replace the cached order with the result"""
+        order = self.service.update_order(order_id, changes, customer_id)
+        # Nothing was written for an unknown or someone else's order, so leave the cache alone
+        return self._write(("order", order_id), order) if order is not None else None
+
+    def invalidate(self, kind: str, record_id: str):
+        """Drop a cached record (e.g. after it changed outside this process)"""
+        with self._lock:
+            self._entries.pop((kind, record_id), None)
+            self._loading.pop((kind, record_id), None)
+
+    def _get(self, key: tuple, load) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats["hits" if entry[1] is not None else "negative_hits"] += 1
+                    return copy.deepcopy(entry[1])
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            future = self._loading.get(key)
+            loader = future is None
+            if loader:
+                future = self._loading[key] = Future()
+        if not loader:
+            return copy.deepcopy(future.result(timeout=PREFETCH_TIMEOUT_SECONDS))
+
+        try:
+            record = load(key[1])
+        except Exception as e:
+            with self._lock:
+                if self._loading.get(key) is future:
+                    del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._stats["loads"] += 1
+            # A write during the load replaced the entry and the in-flight marker; keep the newer record
+            if self._loading.get(key) is future:
+                del self._loading[key]
+                self._store(key, record)
+        future.set_result(record)
+        return copy.deepcopy(record)
+
+    def _write(self, key: tuple, record: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._loading.pop(key, None)
+            self._store(key, record)
+            self._stats["writes"] += 1
+        return copy.deepcopy(record)
+
+    def _store(self, key: tuple, record: Optional[Dict[str, Any]]):
+        ttl = self.ttl_seconds if record is not None else self.negative_ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, record)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def report(self) -> Dict[str, Any]:
+        """Hit rate and backend loads so far"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["negative_hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": (self._stats["hits"] + self._stats["negative_hits"]) / lookups if lookups else 0.0
+            }
+
+class SessionContext:
+    """Futures for one conversation's history, profile, tickets and prior agent results"""
+
+    def __init__(self, conversation_id: str, customer_id: Optional[str], service: CustomerDataService,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.conversation_id = conversation_id
+        self.customer_id = customer_id
+        self.started_at = time.perf_counter()
+        self.wait_ms = 0.0  # Time callers spent blocked on loads that had not finished
+        loads = {
+            "profile": (get_profile_cache().get_customer, customer_id, None),
+            "tickets": (service.get_recent_tickets, customer_id, []),
+            "history": (service.get_history, conversation_id, []),
+            "agent_results": (service.get_agent_results, conversation_id, {}),
+        }
+        self._futures: Dict[str, Future] = {}
+        for name, (load, key, missing) in loads.items():
+            if key is None:
+                # An anonymous session has no profile or tickets; never load someone else's in their place
+                future = Future()
+                future.set_result(missing)
+                self._futures[name] = future
+            elif executor is not None:
+                self._futures[name] = executor.submit(load, key)
+            else:
+                # Serial loading, as before prefetch (used for comparison)
+                future = Future()
+                future.set_result(load(key))
+                self._futures[name] = future
+
+    def _result(self, name: str, timeout: Optional[float]):
+        future = self._futures[name]
+        if future.done():
+            return future.result()
+        start = time.perf_counter()
+        try:
+            return future.result(timeout=PREFETCH_TIMEOUT_SECONDS if timeout is None else timeout)
+        finally:
+            self.wait_ms += (time.perf_counter() - start) * 1000
+
+    def profile(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        return self._result("profile", timeout)
+
+    def tickets(self, timeout: Optional[float] = None) -> List[Dict[str, str]]:
+        return self._result("tickets", timeout)
+
+    def history(self, timeout: Optional[float] = None) -> List[Dict[str, str]]:
+        return self._result("history", timeout)
+
+    def agent_results(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self._result("agent_results", timeout)
+
+    def ready(self) -> bool:
+        """Whether every load has finished"""
+        return all(future.done() for future in self._futures.values())
+
+# One pool and one service per process, shared by every workflow run
+_executor: Optional[ThreadPoolExecutor] = None
+_service: Optional[CustomerDataService] = None
+_profile_cache: Optional[ProfileCache] = None
+_contexts: Dict[str, SessionContext] = {}
+_contexts_lock = threading.Lock()
+
+def get_customer_data_service() -> CustomerDataService:
+    """Return the process-wide customer data service"""
+    global _service
+    if _service is None:
+        _service = CustomerDataService()
+    return _service
+
+def get_profile_cache() -> ProfileCache:
+    """Return the process-wide profile cache (over the process-wide data service)"""
+    global _profile_cache
+    if _profile_cache is None:
+        _profile_cache = ProfileCache(get_customer_data_service())
+    return _profile_cache
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """Return the process-wide prefetch pool"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+    return _executor
+
+def start_prefetch(conversation_id: str, customer_id: Optional[str], concurrent: bool = True) -> SessionContext:
+    """Start loading the conversation's context (no profile or tickets without a customer ID)"""
+    context = SessionContext(conversation_id, customer_id, get_customer_data_service(),
+                             get_prefetch_executor() if concurrent else None)
+    with _contexts_lock:
+        _contexts[conversation_id] = context
+    return context
+
+def get_session_context(conversation_id: str) -> Optional[SessionContext]:
+    """The context started for the conversation, if any"""
+    with _contexts_lock:
+        return _contexts.get(conversation_id)
+
+def release_session_context(conversation_id: str) -> Optional[SessionContext]:
+    """Forget the conversation's context once its turn is finished"""
+    with _contexts_lock:
+        return _contexts.pop(conversation_id, None)
+
+def _explicitly_requested(pattern: "re.Pattern", message: str) -> bool:
+    for match in pattern.finditer(message):
+        # Only the words just before the request, within its own clause, can negate it
+        clause = re.split(r"[.!?;,]|\bbut\b", message[:match.start()])[-1]
+        if not NEGATION_PATTERN.search(" ".join(clause.split()[-NEGATION_WINDOW_WORDS:])):
+            return True
+    return False
+
+def requests_cancellation(message: str) -> bool:
+    """Whether the customer explicitly asks to cancel an order"""
+    return _explicitly_requested(CANCEL_REQUEST_PATTERN, message)
+
+def requests_charge_dispute(message: str) -> bool:
+    """Whether the customer explicitly disputes a charge"""
+    return _explicitly_requested(DISPUTE_REQUEST_PATTERN, message)
+
+def print_profile_cache_stats():
+    """Print how the profile cache is doing"""
+    report = get_profile_cache().report()
+    print(f"🗂️  Profile cache: {report['entries']} entries, {report['hit_rate']:.0%} hit rate "
+          f"({report['hits']} hits, {report['negative_hits']} cached unknown IDs, {report['loads']} backend loads, "
+          f"{report['writes']} write-throughs, {report['expirations']} expired)")
+
+def demonstrate_profile_cache(customers: int = 50, sessions_per_customer: int = 5, latency_ms: float = 5):
+    """Profile lookups for customers opening several sessions, with and without the cache"""
+    print("\n🗂️  Profile Cache Demo")
+    print("=" * 40)
+    customer_ids = list(SEED_PROFILES) + [f"CUST-UNKNOWN-{i}" for i in range(customers - len(SEED_PROFILES))]
+    lookups = [customer_id for _ in range(sessions_per_customer) for customer_id in customer_ids]
+    print(f"{customers} customers x {sessions_per_customer} sessions, {latency_ms:.0f}ms per backend call\n")
+
+    service = CustomerDataService(latency_ms=latency_ms)
+    start = time.perf_counter()
+    for customer_id in lookups:
+        service.get_profile(customer_id)
+    print(f"Without cache: {service.calls} backend calls, {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    service = CustomerDataService(latency_ms=latency_ms)
+    cache = ProfileCache(service)
+    start = time.perf_counter()
+    for customer_id in lookups:
+        cache.get_customer(customer_id)
+    print(f"With cache:    {service.calls} backend calls, {(time.perf_counter() - start) * 1000:.0f}ms "
+          f"({cache.report()['hit_rate']:.0%} hit rate, unknown IDs cached as misses)")
+
+    # A billing change writes through, so the next session sees it without another lookup
+    cache.update_customer("CUST123", {"payment_status": "charge_under_review"})
+    calls = service.calls
+    print(f"After a billing update: payment_status={cache.get_customer('CUST123')['payment_status']} "
+          f"({service.calls - calls} extra backend reads)")
+
+    # Only an explicit, non-negated request from the order's owner changes it
+    for customer_id, message in (("CUST456", "I don't want to cancel order ORD-12345"),
+                                 ("CUST999", "Please cancel order ORD-12345"),
+                                 ("CUST456", "Please cancel order ORD-12345")):
+        order = (cache.update_order("ORD-12345", {"status": "cancellation_requested"}, customer_id)
+                 if requests_cancellation(message) else cache.get_order("ORD-12345", customer_id))
+        print(f"{customer_id}: {message!r} -> {order['status'] if order else 'order not found'}")
+
+if __name__ == "__main__":
+    demonstrate_profile_cache()
@@ -6,12 +6,15 @@ with multiple specialized agents working together.
 """
 
 import os
+import io
 import json
 import time
 from datetime import datetime
 from typing import Dict, List, Any, TypedDict, Annotated, Optional
 from enum import Enum
-from dataclasses import dataclass
+from functools import partial
+from contextlib import redirect_stdout
+from dataclasses import dataclass, fields
 from dotenv import load_dotenv
 
 # LangChain imports
@@ -20,6 +23,11 @@ from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import MemorySaver
 
+from knowledge_base import lookup_technical_solution
+from customer_context import (start_prefetch, get_session_context, release_session_context,
+                              get_customer_data_service, get_profile_cache, print_profile_cache_stats,
+                              requests_cancellation, requests_charge_dispute)
+
 # Load environment variables
 load_dotenv()
 
@@ -72,6 +80,21 @@ class CustomerSupportState(TypedDict):
     performance_metrics: Dict[str, Any]
 
 # Node functions for customer support workflow
+def prefetch_session_context(state: CustomerSupportState, concurrent: bool = True) -> CustomerSupportState:
+    """Start loading the customer's history, profile and tickets while the intent is classified"""
+    print("⚡ Prefetching session context...")
+    
+    try:
+        customer_info = state.get("customer_info")
+        customer_id = customer_info.customer_id if customer_info else None
+        start_prefetch(state["conversation_id"], customer_id, concurrent=concurrent)
+        
+    except Exception as e:
+        state["error_log"].append(f"Error starting context prefetch: {str(e)}")
+        print(f"❌ Context prefetch error: {e}")
+    
+    return state
+
 def classify_customer_intent(state: CustomerSupportState) -> CustomerSupportState:
     """Classify customer intent and determine priority"""
     print("🔍 Classifying customer intent...")
@@ -167,6 +190,44 @@ def route_to_specialized_agent(state: CustomerSupportState) -> CustomerSupportSt
     
     return state
 
+def attach_session_context(state: CustomerSupportState) -> CustomerSupportState:
+    """Await the prefetched context and add it to the state before the agent runs"""
+    print("📥 Attaching session context...")
+    
+    try:
+        context = get_session_context(state["conversation_id"])
+        if context is None:
+            customer_info = state.get("customer_info")
+            context = start_prefetch(state["conversation_id"], customer_info.customer_id if customer_info else None)
+        
+        # An anonymous session stays anonymous: without a customer ID there is no profile to attach
+        if context.customer_id is not None:
+            profile = context.profile() or {"customer_id": context.customer_id, "name": "Customer",
+                                            "email": "customer@example.com"}
+            state["customer_info"] = CustomerInfo(**{field.name: profile[field.name]
+                                                     for field in fields(CustomerInfo) if field.name in profile})
+        state["agent_results"]["recent_tickets"] = context.tickets()
+        state["agent_results"]["conversation_history"] = context.history()
+        # Earlier agents' results (e.g. the order looked up last turn) unless this turn already has them
+        for key, value in context.agent_results().items():
+            state["agent_results"].setdefault(key, value)
+        
+        state["performance_metrics"]["context_wait_ms"] = context.wait_ms
+        # From the moment the conversation ID arrived (the prefetch node) to the agent being ready
+        state["performance_metrics"]["time_to_agent_ms"] = (time.perf_counter() - context.started_at) * 1000
+        
+        customer_info = state.get("customer_info")
+        customer = f"{customer_info.name} ({customer_info.loyalty_tier})" if customer_info else "Anonymous customer"
+        print(f"👤 {customer}, "
+              f"{len(state['agent_results']['conversation_history'])} earlier messages, "
+              f"{len(state['agent_results']['recent_tickets'])} recent tickets, waited {context.wait_ms:.0f}ms")
+        
+    except Exception as e:
+        state["error_log"].append(f"Error attaching session context: {str(e)}")
+        print(f"❌ Session context error: {e}")
+    
+    return state
+
 def execute_order_agent(state: CustomerSupportState) -> CustomerSupportState:
     """Handle order-related inquiries"""
     print("📦 Executing order agent...")
@@ -175,21 +236,29 @@ def execute_order_agent(state: CustomerSupportState) -> CustomerSupportState:
         messages = state["messages"]
         latest_message = messages[-1].content if hasattr(messages[-1], 'content') else str(messages[-1])
         
-        # Simulate order tracking
+        # Order tracking
         import re
-        order_match = re.search(r'order[:\s]*([A-Z0-9-]+)', latest_message, re.IGNORECASE)
-        
-        if order_match:
-            order_id = order_match.group(1)
-            order_data = {
-                "order_id": order_id,
-                "status": "in_transit",
-                "tracking_number": "1Z999AA1234567890",
-                "estimated_delivery": "2024-01-20",
-                "carrier": "FedEx",
-                "current_location": "Memphis, TN"
-            }
-            state["agent_results"]["order_info"] = json.dumps(order_data)
+        order_match = re.search(r'order[:\s#]*([A-Z0-9-]*\d[A-Z0-9-]*)', latest_message, re.IGNORECASE)
+        # A follow-up without an order number refers to the order looked up earlier in the conversation
+        order_id = (order_match.group(1) if order_match
+                    else json.loads(state["agent_results"].get("order_info", "{}")).get("order_id"))
+        
+        if order_id:
+            # Orders come from the process-wide profile cache; an explicit cancellation writes through it.
+            # Only the session customer's own orders are visible, so nobody can read or cancel someone else's
+            customer_info = state.get("customer_info")
+            customer_id = customer_info.customer_id if customer_info else None
+            cache = get_profile_cache()
+            if customer_id and requests_cancellation(latest_message):
+                order = cache.update_order(order_id, {"status": "cancellation_requested"}, customer_id)
+            else:
+                order = cache.get_order(order_id, customer_id)
+            if order is not None:
+                order_data = {key: order[key] for key in ("order_id", "status", "tracking_number",
+                                                          "estimated_delivery", "carrier", "current_location")}
+                state["agent_results"]["order_info"] = json.dumps(order_data)
+            else:
+                state["agent_results"].pop("order_info", None)
         
         # Generate response
         response_parts = []
@@ -198,6 +267,8 @@ def execute_order_agent(state: CustomerSupportState) -> CustomerSupportState:
             response_parts.append(f"Order Status: {order_data['status']}")
             response_parts.append(f"Tracking: {order_data['tracking_number']}")
             response_parts.append(f"Estimated Delivery: {order_data['estimated_delivery']}")
+        elif order_id:
+            response_parts.append(f"I couldn't find order {order_id}. Please check the order number and try again.")
         else:
             response_parts.append("I can help you with order inquiries. Please provide your order number.")
         
@@ -221,18 +292,8 @@ def execute_technical_agent(state: CustomerSupportState) -> CustomerSupportState
         messages = state["messages"]
         latest_message = messages[-1].content if hasattr(messages[-1], 'content') else str(messages[-1])
         
-        # Simulate technical support
-        tech_data = {
-            "issue_type": "product_setup",
-            "severity": "medium",
-            "solution": "Please restart your device and try the setup process again. If the issue persists, try resetting to factory settings.",
-            "estimated_resolution_time": "15 minutes",
-            "escalation_required": False,
-            "knowledge_base_articles": [
-                "KB-001: Device Setup Guide",
-                "KB-015: Troubleshooting Common Issues"
-            ]
-        }
+        # Resolve product/issue keywords against the memory-mapped knowledge base
+        tech_data = lookup_technical_solution(latest_message)
         
         state["agent_results"]["technical_support"] = json.dumps(tech_data)
         
@@ -260,26 +321,43 @@ def execute_billing_agent(state: CustomerSupportState) -> CustomerSupportState:
     print("💰 Executing billing agent...")
     
     try:
-        customer_id = state.get("customer_info", {}).get("customer_id", "CUST123")
+        customer_info = state.get("customer_info")
+        customer_id = customer_info.customer_id if customer_info else None
+        messages = state["messages"]
+        message_lower = (messages[-1].content if hasattr(messages[-1], 'content') else str(messages[-1])).lower()
+        
+        # Billing details come from the process-wide profile cache; explicitly disputing a charge writes
+        # through it, and only for the customer this session belongs to
+        cache = get_profile_cache()
+        if customer_id is None:
+            profile = {}
+        elif requests_charge_dispute(message_lower):
+            profile = cache.update_customer(customer_id, {"payment_status": "charge_under_review"})
+        else:
+            profile = cache.get_customer(customer_id)
+        profile = profile or {}
         
-        # Simulate billing lookup
         billing_data = {
             "customer_id": customer_id,
-            "current_balance": 0.00,
-            "payment_method": "Visa ending in 1234",
+            "current_balance": profile.get("current_balance", 0.0),
+            "payment_method": profile.get("payment_method", "No payment method on file"),
             "last_payment": "2024-01-10",
-            "payment_status": "current",
-            "auto_pay_enabled": True
+            "payment_status": profile.get("payment_status", "unknown"),
+            "auto_pay_enabled": profile.get("auto_pay_enabled", False)
         }
         
         state["agent_results"]["billing_info"] = json.dumps(billing_data)
         
         # Generate response
         response_parts = []
-        response_parts.append(f"Payment Status: {billing_data['payment_status']}")
-        response_parts.append(f"Current Balance: ${billing_data['current_balance']:.2f}")
-        response_parts.append(f"Payment Method: {billing_data['payment_method']}")
-        response_parts.append(f"Auto-Pay: {'Enabled' if billing_data['auto_pay_enabled'] else 'Disabled'}")
+        if customer_id is None:
+            response_parts.append("I can't see account details for this session. Please sign in or share your "
+                                  "customer ID and I'll look into your billing question.")
+        else:
+            response_parts.append(f"Payment Status: {billing_data['payment_status']}")
+            response_parts.append(f"Current Balance: ${billing_data['current_balance']:.2f}")
+            response_parts.append(f"Payment Method: {billing_data['payment_method']}")
+            response_parts.append(f"Auto-Pay: {'Enabled' if billing_data['auto_pay_enabled'] else 'Disabled'}")
         
         final_response = " | ".join(response_parts)
         state["messages"].append(AIMessage(content=final_response))
@@ -370,6 +448,11 @@ def execute_escalation_agent(state: CustomerSupportState) -> CustomerSupportStat
         if sentiment < -0.5:
             escalation_reasons.append("Negative customer sentiment")
         
+        open_tickets = [ticket["ticket_id"] for ticket in state["agent_results"].get("recent_tickets", [])
+                        if ticket["status"] == "open"]
+        if open_tickets:
+            escalation_reasons.append(f"Open tickets: {', '.join(open_tickets)}")
+        
         # Generate escalation response
         response_parts = []
         response_parts.append("🚨 This issue requires immediate attention from our senior support team.")
@@ -396,7 +479,7 @@ def generate_final_response(state: CustomerSupportState) -> CustomerSupportState
     try:
         # Add performance metrics
         session_duration = (datetime.now() - state["session_start_time"]).total_seconds()
-        state["performance_metrics"] = {
+        state["performance_metrics"].update({
             "session_duration_seconds": session_duration,
             "response_time_ms": state.get("response_time_ms", 0),
             "agent_used": state.get("current_agent", "unknown").value,
@@ -405,7 +488,17 @@ def generate_final_response(state: CustomerSupportState) -> CustomerSupportState
             "sentiment_score": state.get("sentiment_score", 0.0),
             "errors_count": len(state.get("error_log", [])),
             "follow_up_required": state.get("follow_up_required", False)
-        }
+        })
+        
+        # Save the turn so the next message in this conversation resumes from it
+        customer_message = next(message.content for message in reversed(state["messages"])
+                                if isinstance(message, HumanMessage))
+        get_customer_data_service().save_turn(
+            state["conversation_id"], customer_message, state["messages"][-1].content,
+            {key: value for key, value in state["agent_results"].items()
+             if key not in ("recent_tickets", "conversation_history")}
+        )
+        release_session_context(state["conversation_id"])
         
         # Add satisfaction survey prompt
         satisfaction_message = "⭐ How would you rate your experience today? (1-5 stars)"
@@ -446,15 +539,17 @@ def should_continue(state: CustomerSupportState) -> str:
     else:
         return "continue"
 
-def create_customer_support_workflow():
-    """Create the complete customer support workflow"""
+def create_customer_support_workflow(prefetch: bool = True):
+    """Create the complete customer support workflow (prefetch=False loads the session context serially)"""
     
     # Create the state graph
     workflow = StateGraph(CustomerSupportState)
     
     # Add nodes
+    workflow.add_node("prefetch_context", partial(prefetch_session_context, concurrent=prefetch))
     workflow.add_node("classify_intent", classify_customer_intent)
     workflow.add_node("route_agent", route_to_specialized_agent)
+    workflow.add_node("attach_context", attach_session_context)
     workflow.add_node("order_agent", execute_order_agent)
     workflow.add_node("technical_agent", execute_technical_agent)
     workflow.add_node("billing_agent", execute_billing_agent)
@@ -462,11 +557,13 @@ def create_customer_support_workflow():
     workflow.add_node("escalation_agent", execute_escalation_agent)
     workflow.add_node("final_response", generate_final_response)
     
-    # Add edges
+    # Add edges (the context loads while the intent is classified and routed)
+    workflow.add_edge("prefetch_context", "classify_intent")
     workflow.add_edge("classify_intent", "route_agent")
+    workflow.add_edge("route_agent", "attach_context")
     
     # Add conditional edges for agent routing
-    workflow.add_conditional_edges("route_agent", should_continue, {
+    workflow.add_conditional_edges("attach_context", should_continue, {
         "order_agent": "order_agent",
         "technical_agent": "technical_agent",
         "billing_agent": "billing_agent",
@@ -488,7 +585,7 @@ def create_customer_support_workflow():
     })
     
     # Set entry point
-    workflow.set_entry_point("classify_intent")
+    workflow.set_entry_point("prefetch_context")
     
     # Compile the workflow
     app = workflow.compile(checkpointer=MemorySaver())
@@ -529,8 +626,15 @@ def run_customer_support_examples():
             "name": "Complaint Escalation",
             "message": "I'm extremely unhappy with your service! My order was delivered damaged and customer service has been ignoring my emails for days. This is unacceptable!",
             "customer_id": "CUST999"
+        },
+        {
+            "name": "Returning Customer Follow-up",
+            "message": "Hi again, is my order still on track? I really need it by Friday.",
+            "customer_id": "CUST456",
+            "conversation": 1  # Continues scenario 1's conversation
         }
     ]
+    run_id = int(time.time())
     
     for i, scenario in enumerate(scenarios, 1):
         print(f"\n📋 Scenario {i}: {scenario['name']}")
@@ -549,7 +653,7 @@ def run_customer_support_examples():
                 "intent_type": None,
                 "priority_level": None,
                 "current_agent": None,
-                "conversation_id": f"conv_{int(time.time())}_{i}",
+                "conversation_id": f"conv_{run_id}_{scenario.get('conversation', i)}",
                 "session_start_time": datetime.now(),
                 "workflow_status": "",
                 "agent_results": {},
@@ -561,8 +665,8 @@ def run_customer_support_examples():
                 "performance_metrics": {}
             }
             
-            # Run the workflow
-            result = app.invoke(initial_state)
+            # Run the workflow (one checkpointer thread per turn; earlier turns come back through the prefetched context)
+            result = app.invoke(initial_state, config={"configurable": {"thread_id": f"{initial_state['conversation_id']}:{i}"}})
             
             print(f"\n✅ Workflow completed!")
             print(f"Intent: {result['intent_type'].value if result['intent_type'] else 'Unknown'}")
@@ -577,9 +681,55 @@ def run_customer_support_examples():
                 metrics = result["performance_metrics"]
                 print(f"Session Duration: {metrics.get('session_duration_seconds', 0):.2f}s")
                 print(f"Follow-up Required: {metrics.get('follow_up_required', False)}")
+                print(f"Time to Agent: {metrics.get('time_to_agent_ms', 0):.0f}ms "
+                      f"(waited {metrics.get('context_wait_ms', 0):.0f}ms for context)")
             
         except Exception as e:
             print(f"❌ Error: {e}")
+    
+    print()
+    print_profile_cache_stats()
+
+def compare_session_resume(turns: int = 10):
+    """Time to first agent action for returning customers, with and without context prefetch"""
+    print("\n⚡ Session Resume: Serial Loading vs Prefetch")
+    print("=" * 40)
+    
+    latency_ms = get_customer_data_service().latency_ms
+    print(f"Simulated backend latency: {latency_ms:.0f}ms per call (history, profile, tickets, agent results)")
+    
+    for prefetch in (False, True):
+        app = create_customer_support_workflow(prefetch=prefetch)
+        times, waits = [], []
+        for turn in range(turns):
+            conversation_id = f"resume_{'prefetch' if prefetch else 'serial'}_{turn}"
+            for message_index, message in enumerate(("Where is my order ORD-12345?",
+                                                     "Is my order still on track for Friday?")):
+                state = {
+                    "messages": [HumanMessage(content=message)],
+                    "customer_info": CustomerInfo(customer_id="CUST456", name="Customer", email="customer@example.com"),
+                    "intent_type": None,
+                    "priority_level": None,
+                    "current_agent": None,
+                    "conversation_id": conversation_id,
+                    "session_start_time": datetime.now(),
+                    "workflow_status": "",
+                    "agent_results": {},
+                    "escalation_reason": None,
+                    "follow_up_required": False,
+                    "sentiment_score": 0.0,
+                    "response_time_ms": 0,
+                    "error_log": [],
+                    "performance_metrics": {}
+                }
+                with redirect_stdout(io.StringIO()):
+                    result = app.invoke(state, config={"configurable": {"thread_id": f"{conversation_id}:{message_index}"}})
+            # Only the returning turn counts
+            times.append(result["performance_metrics"]["time_to_agent_ms"])
+            waits.append(result["performance_metrics"]["context_wait_ms"])
+        label = "Prefetch (concurrent)" if prefetch else "Serial loading"
+        print(f"{label:<22} time to first agent action: {sum(times) / len(times):6.1f}ms avg "
+              f"(blocked on context {sum(waits) / len(waits):.1f}ms)")
 
 def demonstrate_production_features():
     """Demonstrate production-ready features"""
@@ -614,6 +764,9 @@ if __name__ == "__main__":
     # Run customer support examples
     run_customer_support_examples()
     
+    # Compare session resume with and without prefetch
+    compare_session_resume()
+    
     # Demonstrate production features
     demonstrate_production_features()
     
@@ -0,0 +1,284 @@
+"""
+Example 7: Memory-mapped Knowledge Base for the Technical Agent
+
+The technical agent resolves product/issue keywords to knowledge base articles.
+Articles are packed offline into a single read-only file:
+
+    [header][article bodies (UTF-8)][JSON index]
+
+The header records where the index starts. At runtime the file is opened with
+mmap, only the small index is parsed, and article bodies are sliced straight
+out of the mapping with memoryview (no copy). Every worker process that maps the
+same file shares the same physical pages through the OS page cache.
+
+Run `python knowledge_base.py pack` to (re)build the file from SEED_ARTICLES.
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import struct
+import tempfile
+from typing import Dict, List, Any, Optional
+
+# File layout constants
+KB_MAGIC = b"KBv1"
+KB_HEADER = struct.Struct("<4sIQQ")  # magic, article count, index offset, index length
+DEFAULT_KB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.kb")
+
+# Source articles for the offline packer (in production these come from the CMS)
+SEED_ARTICLES = [
+    {
+        "article_id": "KB-001",
+        "title": "Device Setup Guide",
+        "issue_type": "product_setup",
+        "estimated_resolution_time": "15 minutes",
+        "keywords": ["setup", "install", "configure", "new device", "first time", "activate"],
+        "body": "Please restart your device and try the setup process again. If the issue persists, try resetting to factory settings.\n\n"
+                "1. Charge the device to at least 50%.\n2. Hold the power button for 10 seconds to restart.\n"
+                "3. Open the companion app and choose 'Add device'.\n4. If setup fails twice, reset to factory settings from the device menu."
+    },
+    {
+        "article_id": "KB-015",
+        "title": "Troubleshooting Common Issues",
+        "issue_type": "general_troubleshooting",
+        "estimated_resolution_time": "20 minutes",
+        "keywords": ["not working", "broken", "issue", "problem", "error", "stopped"],
+        "body": "Restart the device, make sure the firmware is up to date and check that the battery is charged.\n\n"
+                "Most issues are resolved by a restart followed by a firmware update. If the problem continues, "
+                "collect the error message shown and contact support with your order number."
+    },
+    {
+        "article_id": "KB-022",
+        "title": "Bluetooth Pairing for Headphones and Speakers",
+        "issue_type": "connectivity",
+        "estimated_resolution_time": "10 minutes",
+        "keywords": ["headphones", "earbuds", "speaker", "bluetooth", "pairing", "not connecting", "connect"],
+        "body": "Remove the device from your phone's Bluetooth list, then hold the pairing button for 7 seconds until the light flashes blue and pair again.\n\n"
+                "Keep the headphones within 1 meter of the phone during pairing and make sure they are not connected to another device. "
+                "If pairing still fails, reset the headphones by holding both volume buttons for 10 seconds."
+    },
+    {
+        "article_id": "KB-031",
+        "title": "Wi-Fi Connection Problems",
+        "issue_type": "connectivity",
+        "estimated_resolution_time": "15 minutes",
+        "keywords": ["wifi", "wi-fi", "wireless network", "router", "internet", "offline"],
+        "body": "Restart your router and the device, then forget the network and reconnect using the 2.4 GHz band.\n\n"
+                "Many smart devices do not support 5 GHz networks. Check that the Wi-Fi password does not contain unsupported special characters."
+    },
+    {
+        "article_id": "KB-040",
+        "title": "Login and Password Reset",
+        "issue_type": "account_access",
+        "estimated_resolution_time": "5 minutes",
+        "keywords": ["login", "log in", "password", "reset", "locked out", "sign in", "account"],
+        "body": "Use 'Forgot password' on the sign-in page and follow the link in the email within 30 minutes.\n\n"
+                "If the email does not arrive, check your spam folder. After five failed attempts the account is locked for 15 minutes."
+    },
+    {
+        "article_id": "KB-052",
+        "title": "App Crashes and Freezes",
+        "issue_type": "app_stability",
+        "estimated_resolution_time": "10 minutes",
+        "keywords": ["app", "crash", "crashing", "freeze", "frozen", "upload"],
+        "body": "Update the app to the latest version, clear its cache and restart your phone.\n\n"
+                "If the app still crashes, uninstall and reinstall it. Your data is stored in your account and will be restored after signing in."
+    },
+    {
+        "article_id": "KB-063",
+        "title": "Battery Drain and Charging",
+        "issue_type": "hardware",
+        "estimated_resolution_time": "30 minutes",
+        "keywords": ["battery", "charging", "charge", "drain", "power", "won't turn on"],
+        "body": "Use the original cable and a 5V/2A adapter, and let the device charge for 30 minutes before turning it on.\n\n"
+                "If the battery drains within a day, disable always-on features and update the firmware."
+    },
+    {
+        "article_id": "KB-077",
+        "title": "Firmware Updates",
+        "issue_type": "software_update",
+        "estimated_resolution_time": "20 minutes",
+        "keywords": ["firmware", "update", "upgrade", "version"],
+        "body": "Open the companion app, go to Settings > Device > Firmware and install the latest version while the device is charging.\n\n"
+                "Do not turn the device off during the update. If the update fails, restart the device and try again."
+    }
+]
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for keyword matching"""
+    return re.findall(r"[a-z0-9'-]+", text.lower())
+
+def pack_knowledge_base(articles: List[Dict[str, Any]], path: str = DEFAULT_KB_PATH) -> str:
+    """
+    Offline packer: write articles into a single read-only KB file.
+
+    The file is written to a temporary name and atomically renamed, so worker
+    processes that already have the old file mapped keep reading a consistent copy.
+    """
+    bodies = bytearray()
+    index = {"articles": {}, "keywords": {}}
+
+    for article in articles:
+        body = article["body"].encode("utf-8")
+        offset = KB_HEADER.size + len(bodies)
+        bodies.extend(body)
+        index["articles"][article["article_id"]] = {
+            "title": article["title"],
+            "issue_type": article.get("issue_type", "general"),
+            "estimated_resolution_time": article.get("estimated_resolution_time", "unknown"),
+            "offset": offset,
+            "length": len(body)
+        }
+        for keyword in article.get("keywords", []):
+            index["keywords"].setdefault(keyword.lower(), []).append(article["article_id"])
+
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    index_offset = KB_HEADER.size + len(bodies)
+    header = KB_HEADER.pack(KB_MAGIC, len(articles), index_offset, len(index_bytes))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(bodies)
+            f.write(index_bytes)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+    return path
+
+class KnowledgeBase:
+    """Read-only, memory-mapped view over a packed KB file"""
+
+    def __init__(self, path: str = DEFAULT_KB_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, article_count, index_offset, index_length = KB_HEADER.unpack_from(self._mmap, 0)
+        if magic != KB_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a knowledge base file (bad magic {magic!r})")
+
+        index = json.loads(bytes(self._view[index_offset:index_offset + index_length]))
+        self.articles: Dict[str, Dict[str, Any]] = index["articles"]
+        self.keywords: Dict[str, List[str]] = index["keywords"]
+        self.article_count = article_count
+
+        # Multi-word keywords ("not connecting") are matched as phrases
+        self._phrases = [keyword for keyword in self.keywords if " " in keyword]
+
+    def body(self, article_id: str) -> memoryview:
+        """Return the raw UTF-8 article body as a zero-copy slice of the mapping"""
+        meta = self.articles[article_id]
+        return self._view[meta["offset"]:meta["offset"] + meta["length"]]
+
+    def text(self, article_id: str) -> str:
+        """Decode the full article body"""
+        return str(self.body(article_id), "utf-8")
+
+    def summary(self, article_id: str) -> str:
+        """Decode only the first paragraph of the article (the suggested solution)"""
+        meta = self.articles[article_id]
+        start, end = meta["offset"], meta["offset"] + meta["length"]
+        split = self._mmap.find(b"\n\n", start, end)
+        return str(self._view[start:split if split != -1 else end], "utf-8")
+
+    def search(self, text: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """Resolve product/issue keywords in `text` to the best matching articles"""
+        text_lower = text.lower()
+        scores: Dict[str, int] = {}
+
+        for token in set(_tokenize(text_lower)):
+            for article_id in self.keywords.get(token, ()):
+                scores[article_id] = scores.get(article_id, 0) + 1
+
+        for phrase in self._phrases:
+            if phrase in text_lower:
+                for article_id in self.keywords[phrase]:
+                    scores[article_id] = scores.get(article_id, 0) + 2
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            {"article_id": article_id, "score": score, **self.articles[article_id]}
+            for article_id, score in ranked
+        ]
+
+    def close(self):
+        """Release the mapping and the underlying file"""
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+# One mapping per process; the pages themselves are shared between processes
+_knowledge_base: Optional[KnowledgeBase] = None
+
+def get_knowledge_base(path: Optional[str] = None) -> KnowledgeBase:
+    """Return the process-wide KB, packing the seed articles on first run"""
+    global _knowledge_base
+    path = path or os.getenv("KNOWLEDGE_BASE_PATH", DEFAULT_KB_PATH)
+
+    if _knowledge_base is None or _knowledge_base.path != path:
+        if not os.path.exists(path):
+            print(f"📚 Knowledge base not found, packing {len(SEED_ARTICLES)} seed articles into {path}")
+            pack_knowledge_base(SEED_ARTICLES, path)
+        _knowledge_base = KnowledgeBase(path)
+
+    return _knowledge_base
+
+def lookup_technical_solution(message: str) -> Dict[str, Any]:
+    """Build the technical agent's result from the best matching KB articles"""
+    kb = get_knowledge_base()
+    matches = kb.search(message)
+
+    if not matches:
+        # Fall back to the generic setup/troubleshooting articles
+        matches = [{"article_id": article_id, "score": 0, **kb.articles[article_id]}
+                   for article_id in ("KB-001", "KB-015") if article_id in kb.articles]
+
+    best = matches[0]
+    return {
+        "issue_type": best["issue_type"],
+        "severity": "medium",
+        "solution": kb.summary(best["article_id"]),
+        "estimated_resolution_time": best["estimated_resolution_time"],
+        "escalation_required": False,
+        "knowledge_base_articles": [f"{match['article_id']}: {match['title']}" for match in matches]
+    }
+
+def demonstrate_knowledge_base():
+    """Show keyword resolution against the memory-mapped KB"""
+    print("\n📚 Memory-mapped Knowledge Base Demo")
+    print("=" * 40)
+
+    kb = get_knowledge_base()
+    print(f"Articles: {kb.article_count}, Keywords: {len(kb.keywords)}, File size: {os.path.getsize(kb.path)} bytes")
+
+    messages = [
+        "My wireless headphones are not connecting to my phone.",
+        "The app keeps crashing every time I try to upload a file.",
+        "I can't log in, the password reset isn't working.",
+        "Something is wrong with my device."
+    ]
+
+    for message in messages:
+        result = lookup_technical_solution(message)
+        print(f"\n📝 Message: '{message}'")
+        print(f"🔧 Issue Type: {result['issue_type']}")
+        print(f"💡 Solution: {result['solution']}")
+        print(f"📖 Articles: {', '.join(result['knowledge_base_articles'])}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "pack":
+        output_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_KB_PATH
+        pack_knowledge_base(SEED_ARTICLES, output_path)
+        print(f"✅ Packed {len(SEED_ARTICLES)} articles into {output_path}")
+    else:
+        demonstrate_knowledge_base()